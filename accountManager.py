@@ -3,6 +3,11 @@
 # EACH USER WILL HAVE TO SET UP A PASSWORD AND FILE LOCATIONS TO START
 # EACH USER WILL THEN BE ABLE TO CREATE, MODIFY, SEARCH, DELETE, BACKUP (TO A .CSV) ALL OF THE ACCOUNTS
 # ACCOUNTS ARE ENCRYPTED AND THEN STORED IN THE DATABASE, AND THEN DECRYPTED WHEN RETRIEVED FROM THE DATABASE
+#
+# RUN WITHOUT ARGUMENTS FOR THE INTERACTIVE LOGIN AND MENU, OR WITH A SUBCOMMAND FOR SCRIPTS:
+#   python accountManager.py [--credentials FILE] {search,show,add,backup,import,tasks,stale,reused,rotate} ...
+# SUBCOMMANDS LOG IN WITH THE CREDENTIALS FILE (USERNAME ON THE FIRST LINE, PASSWORD ON THE SECOND)
+# OR THE ACCOUNT_MANAGER_USER AND ACCOUNT_MANAGER_PASSWORD ENVIRONMENT VARIABLES
 
 # TO DO LIST:
 #   MAKE SURE THIS WORKS CROSS PLATFORM.  DESIGNED ON WINDOWS, WILL TEST ON LINUX
@@ -12,175 +17,432 @@
 #   INCLUDE AN OPTION TO COPY THE PASSWORD OF THE ACCOUNT TO THE CLIPBOARD
 #   FIGURE OUT HOW TO SECURELY ALLOW REMOTE ACCESS, EITHER PUT ON A WEBSITE OR THROUGH A REMOTE CONNECTION
 
+# ONLY WHAT EVERY RUN NEEDS IS IMPORTED HERE, EVERYTHING ELSE IS IMPORTED BY THE FUNCTION THAT USES IT
+# SO SCRIPTS THAT CALL A SUBCOMMAND THOUSANDS OF TIMES DO NOT PAY FOR THE WHOLE PROGRAM ON EVERY START
 import os
 import sys
-import sqlite3
-import csv
-
-from encryption import encrypt, fix_filepath
-from passwords import PasswordAccess, genPass, randPassGen
-from menu import menu
-from database import AccountDatabase
-
-# *********************************************************************************
-# CHANGE THESE TO YOUR LIKING IF YOU ARE GOING TO SET UP ACCOUNTS USING THE PROGRAM
-# *********************************************************************************
-# CHARACTERS USED FOR ENCRYPTION
-EncryptChars = "A2HQuNq{XEgo/PwhLt)BI=a6cz43*VkSDl`KxU%F.Y\\~\"p ?!;j>dGrOZ}<T0$v,n-ye5Wm]i^7&:('9M[8+J|fb@Rs_C#1"
-# HOW FAR TO SHIFT EACH CHARACTER DURING ENCRYPTION
-EncryptShift = 10
-
-
-# PASSWORD ACCESS TO SYSTEM WITH MULTIPLE USER SUPPORT
-userDB = sqlite3.connect("users.db")
-userData = userDB.cursor()
-userData.execute("CREATE TABLE IF NOT EXISTS users"
-                 "(ID INTEGER PRIMARY KEY UNIQUE NOT NULL,"
-                 "USERNAME TEXT,"
-                 "PASSWORD TEXT,"
-                 "DATABASE_PATH TEXT,"
-                 "BACKUP_LOCATION TEXT"
-                 ")")
-
-action = "getuser"
-while action == "getuser":
-
-    # GET THE USER INPUT FOR USERNAME
-    user = raw_input("username: ").lower()
-    userEncrypt = encrypt(user, EncryptChars, EncryptShift, "")
-
-    # SELECT THE INFORMATION FOR THAT USER
-    userData.execute("SELECT USERNAME, PASSWORD, DATABASE_PATH, BACKUP_LOCATION "
-                     "FROM users WHERE USERNAME=?", (userEncrypt,))
-    row = userData.fetchone()
-
-    # USER CHOSE THE QUIT APPLICATION
-    if user == "" or user == "exit" or user == "quit" or user == "leave":
-        action = "login failed"
-
-    # ASKS THE USER TO CREATE AN ACCOUNT IF THE USERNAME DOES NOT MATCH ANY
-    elif row is None:
-        createUser = raw_input("No username matched.  Create user '%s'? (y/n): " % user).lower()
-        if createUser == "y" or createUser == "yes":
-            print("Please enter some information below. All file paths should not contain file names.")
-            password = raw_input("password: ")
-            passwordEncrypt = encrypt(password, EncryptChars, EncryptShift, "")
-            databasePath = raw_input("Data base path: ")
-            databasePathEncrypt = encrypt(databasePath, EncryptChars, EncryptShift, "")
-            while not os.path.isdir(databasePath):
-                print("'%s' is not a working directory on you computer." % databasePath)
-                databasePath = raw_input("Data base folder: ")
-                databasePathEncrypt = encrypt(databasePath, EncryptChars, EncryptShift, "")
-            backupPath = raw_input("Account backup folder: ")
-            backupPathEncrypt = encrypt(backupPath, EncryptChars, EncryptShift, "")
-            while not os.path.isdir(backupPath):
-                print("'%s' is not a working directory on you computer." % backupPath)
-                backupPath = raw_input("Data base path: ")
-                backupPath = encrypt(backupPath, EncryptChars, EncryptShift, "")
-            userData.execute("INSERT INTO users (USERNAME, PASSWORD, DATABASE_PATH, BACKUP_LOCATION)"
-                             "VALUES (?,?,?,?)", (userEncrypt, passwordEncrypt, databasePathEncrypt, backupPathEncrypt))
-            userDB.commit()
-
-            wait = raw_input("Thanks for registering.  Please press enter and then login at the main screen.")
-
-        os.system('cls' if os.name == 'nt' else 'clear')
-        action = "getuser"
-
-    # GETS THE PASSWORD FOR THE USER AND ATTEMPTS TO GET INTO ACCOUNT
-    else:
-        # GET THE INFORMATION FROM THE USERS DATABASE AND DECRYPT IT
-        user = encrypt(row[0], EncryptChars, -EncryptShift, "")
-        password = encrypt(row[1], EncryptChars, -EncryptShift, "")
-        databasePath = encrypt(row[2], EncryptChars, -EncryptShift, "")
-        backupPath = encrypt(row[3], EncryptChars, -EncryptShift, "")
-
-        # ALLOWS USER TO ATTEMPT TO ENTER CORRECT PASSWORD
-        access = PasswordAccess(password, maxTries=3, attempts=0)
-        if access:
-            # CONNECT TO THE USERS DB
-            databaseFile = fix_filepath(databasePath + ("/%s.db" % user))
-            backupFile = fix_filepath(backupPath + ("/%sAccountBackup.csv" % user))
-            Database1 = AccountDatabase(user, databaseFile, backupFile, EncryptChars, EncryptShift)
-            action = "enter"
-        else:
-            action = "login failed"
 
-        os.system('cls' if os.name == 'nt' else 'clear')
+from config import EncryptChars, EncryptShift, UsersFile, user_files
+from config import AutoBackupInterval, AutoBackupKeep, AutoBackupWrites
+from menu import menu, clear_screen
+
+
+def open_database(user, databasePath, backupPath):
+    """opens the account database of a user
+        @param user (string) - the name of the user
+        @param databasePath (string) - folder that holds the user's database
+        @param backupPath (string) - folder that holds the user's backup
+        @return (AccountDatabase) - the user's database
+    """
 
+    from database import AccountDatabase
 
-# INITIALIZATIONS FOR THE MAIN PROGRAM LOOP
-options = ['Search Accounts', 'Modify Account', 'Create Account', 'Show Uncompleted Tasks', 'Delete An Account',
-           'Backup All Accounts', 'Help', 'Quit']
+    databaseFile, backupFile = user_files(user, databasePath, backupPath)
+    return AccountDatabase(user, databaseFile, backupFile, EncryptChars, EncryptShift)
 
-# MAIN LOOP FOR PROGRAM - ALLOWS USER TO READ, MODIFY, DELETE, BACKUP, ETC... ON ACCOUNTS
-while action != "exit" and action != "login failed":
 
-    # DISPLAYS A MENU OF OPTIONS AND GATHERS USER INPUT
-    action = menu(options).lower()
+def login():
+    """asks for a username and password until the user logs in, registers or quits
+        @return (AccountDatabase) - the database of the user that logged in, None if they did not
+    """
 
-    # *******************************************************
-    # INCLUDE OPTION HERE FOR USER TO CHANGE ACCOUNT SETTINGS
-    # INCLUDE OPTION HERE TO SEE ACCOUNTS WHOSE PASSWORDS HAVE NOT BEEN CHANGED RECENTLY
-    # *******************************************************
+    from passwords import PasswordAccess
+    from users import UserDirectory
 
-    # QUERY DATABASE FOR A SEARCH TERM
-    if action == '1':
-        found = Database1.search()
-        Database1.displayAccount(found)
+    # PASSWORD ACCESS TO SYSTEM WITH MULTIPLE USER SUPPORT
+    directory = UserDirectory(UsersFile)
+    Database1 = None
 
-        wait = raw_input("")
+    # USERS REMOVED WHILE BRINGING users.db UP TO DATE, SHOWN SO THEIR FILES CAN BE FOUND
+    report = directory.duplicate_report()
+    if report:
+        print("\n".join(report))
+        wait = raw_input("Please press enter to continue.")
 
-    # MODIFY AN EXISTING ACCOUNT IN THE DATABASE
-    elif action == '2':
-        # FIND THE ACCOUNT WE WANT TO MODIFY
-        accountToUpdate = Database1.search("Account to modify: ")
-        confirmModify = raw_input("Are you sure you want to modify '%s'? " % Database1.decode(accountToUpdate)).lower()
-        if accountToUpdate != "" and confirmModify == "y" or confirmModify == "yes":
-            Database1.modify(accountToUpdate)
-        wait = raw_input("")
+    action = "getuser"
+    while action == "getuser":
 
-    # CREATE A NEW ACCOUNT AND ADD IT TO THE DATABASE
-    elif action == '3':
-        Database1.insert()
+        # GET THE USER INPUT FOR USERNAME
+        user = raw_input("username: ").lower()
 
-    # SHOWS THE ACCOUNTS THAT HAVE TASKS PENDING
-    elif action == '4':
-        Database1.get_tasks()
-        wait = raw_input("")
+        # SELECT THE INFORMATION FOR THAT USER
+        record = directory.get(user)
 
-    # DELETES AN ACCOUNT BASED ON NAME
-    elif action == '5':
-        accountToDelete = Database1.search(prompt="account to delete: ")
-        confirmDelete = raw_input("Are you sure you want to delete '%s'?" % Database1.decode(accountToDelete)).lower()
-        if accountToDelete != "" and (confirmDelete == "y" or confirmDelete == "yes"):
-            Database1.remove(accountToDelete)
+        # USER CHOSE THE QUIT APPLICATION
+        if user == "" or user == "exit" or user == "quit" or user == "leave":
+            action = "login failed"
+
+        # ASKS THE USER TO CREATE AN ACCOUNT IF THE USERNAME DOES NOT MATCH ANY
+        elif record is None:
+            createUser = raw_input("No username matched.  Create user '%s'? (y/n): " % user).lower()
+            if createUser == "y" or createUser == "yes":
+                print("Please enter some information below. All file paths should not contain file names.")
+                password = raw_input("password: ")
+                databasePath = raw_input("Data base path: ")
+                while not os.path.isdir(databasePath):
+                    print("'%s' is not a working directory on you computer." % databasePath)
+                    databasePath = raw_input("Data base folder: ")
+                backupPath = raw_input("Account backup folder: ")
+                while not os.path.isdir(backupPath):
+                    print("'%s' is not a working directory on you computer." % backupPath)
+                    backupPath = raw_input("Data base path: ")
+                directory.add(user, password, databasePath, backupPath)
+
+                wait = raw_input("Thanks for registering.  Please press enter and then login at the main screen.")
+
+            clear_screen()
+            action = "getuser"
+
+        # GETS THE PASSWORD FOR THE USER AND ATTEMPTS TO GET INTO ACCOUNT
         else:
-            print("'%s' not deleted" % accountToDelete)
-        wait = raw_input("")
-
-    # BACKUP THE ACCOUNTS FOR THE USER TO THE BACKUP FILE
-    elif action == '6':
-        Database1.backup()
-
-    # DISPLAYS THE HELP MESSAGE FOR THE PROGRAM
-    elif action == '7':
-        os.system('cls' if os.name == 'nt' else 'clear')
-        g = open('help.txt', 'r')
-        helpMessage = g.read()
-        g.close()
-        print(helpMessage)
-        wait = raw_input("")
-
-    # EXITS THE PROGRAM
-    elif action == '8':
-        action = 'exit'
-
-    # THE USER INPUT WAS NOT RECOGNIZED, GO BACK TO MAIN MENU
+            # ALLOWS USER TO ATTEMPT TO ENTER CORRECT PASSWORD
+            access = PasswordAccess(record.password, maxTries=3, attempts=0)
+            if access:
+                # CONNECT TO THE USERS DB
+                Database1 = open_database(record.name, record.databasePath, record.backupPath)
+                Database1.load_name_index()  # SO PICKING AN ACCOUNT BY NAME NEVER WAITS ON THE DATABASE
+                action = "enter"
+            else:
+                action = "login failed"
+
+            clear_screen()
+
+    directory.close()
+    return Database1
+
+
+def main_menu(Database1):
+    """displays the main menu and carries out the user's choices until they quit
+        @param Database1 (AccountDatabase) - the database of the user that logged in
+    """
+
+    # BACKS UP THE DATABASE IN THE BACKGROUND WHILE THE MENU IS OPEN, SEE scheduler.py
+    scheduler = None
+    if AutoBackupInterval or AutoBackupWrites:
+        from scheduler import BackupScheduler
+        scheduler = BackupScheduler(Database1.dbFile, os.path.splitext(Database1.backupFile)[0], AutoBackupInterval,
+                                    AutoBackupWrites, AutoBackupKeep)
+        Database1.writeListeners.append(scheduler.record_writes)
+        scheduler.start()
+
+    # INITIALIZATIONS FOR THE MAIN PROGRAM LOOP
+    action = "enter"
+    options = ['Search Accounts', 'Modify Account', 'Create Account', 'Show Uncompleted Tasks', 'Delete An Account',
+               'Backup All Accounts', 'Show Accounts Not Changed Recently', 'Show Reused Passwords', 'Help', 'Quit']
+
+    # MAIN LOOP FOR PROGRAM - ALLOWS USER TO READ, MODIFY, DELETE, BACKUP, ETC... ON ACCOUNTS
+    while action != "exit" and action != "login failed":
+
+        # DISPLAYS A MENU OF OPTIONS AND GATHERS USER INPUT
+        action = menu(options).lower()
+
+        # *******************************************************
+        # INCLUDE OPTION HERE FOR USER TO CHANGE ACCOUNT SETTINGS
+        # *******************************************************
+
+        # QUERY DATABASE FOR A SEARCH TERM
+        if action == '1':
+            found = Database1.search()
+            Database1.displayAccount(found)
+
+            wait = raw_input("")
+
+        # MODIFY AN EXISTING ACCOUNT IN THE DATABASE
+        elif action == '2':
+            # FIND THE ACCOUNT WE WANT TO MODIFY
+            accountToUpdate = Database1.search("Account to modify: ")
+            confirmModify = raw_input("Are you sure you want to modify '%s'? " % Database1.decode(accountToUpdate)).lower()
+            if accountToUpdate != "" and confirmModify == "y" or confirmModify == "yes":
+                Database1.modify(accountToUpdate)
+            wait = raw_input("")
+
+        # CREATE A NEW ACCOUNT AND ADD IT TO THE DATABASE
+        elif action == '3':
+            # LEAVES THE MESSAGE ON THE SCREEN IF THE ACCOUNT WAS NOT ADDED
+            if Database1.insert() == "":
+                wait = raw_input("")
+
+        # SHOWS THE ACCOUNTS THAT HAVE TASKS PENDING
+        elif action == '4':
+            Database1.get_tasks()
+            wait = raw_input("")
+
+        # DELETES AN ACCOUNT BASED ON NAME
+        elif action == '5':
+            accountToDelete = Database1.search(prompt="account to delete: ")
+            confirmDelete = raw_input("Are you sure you want to delete '%s'?" % Database1.decode(accountToDelete)).lower()
+            if accountToDelete != "" and (confirmDelete == "y" or confirmDelete == "yes"):
+                Database1.remove(accountToDelete)
+            else:
+                print("'%s' not deleted" % accountToDelete)
+            wait = raw_input("")
+
+        # BACKUP THE ACCOUNTS FOR THE USER TO THE BACKUP FILE
+        elif action == '6':
+            Database1.backup()
+            if scheduler is not None:
+                status = scheduler.status()
+                if status["runs"]:
+                    print("Automatic backups so far: %(runs)d, the last one took %(seconds).2f seconds: %(file)s" %
+                          status)
+                if status["status"] not in (None, "ok"):
+                    print("The last automatic backup failed: %s" % status["status"])
+            wait = raw_input("")
+
+        # SHOWS THE ACCOUNTS WHOSE INFORMATION (AND SO PASSWORD) HAS NOT BEEN CHANGED RECENTLY
+        elif action == '7':
+            days = raw_input("Show accounts not changed in how many days? (365): ")
+            days = int(days) if days.isdigit() else 365
+            for name, dateModified in Database1.stale_accounts(days):
+                print("%s: last changed %s" % (name, dateModified))
+            wait = raw_input("")
+
+        # SHOWS THE GROUPS OF ACCOUNTS THAT SHARE A PASSWORD
+        elif action == '8':
+            groups = Database1.reused_passwords()
+            for names in groups:
+                print("%d accounts share a password: %s" % (len(names), ", ".join(names)))
+            if not groups:
+                print("No passwords are reused.")
+            wait = raw_input("")
+
+        # DISPLAYS THE HELP MESSAGE FOR THE PROGRAM
+        elif action == '9':
+            clear_screen()
+            g = open('help.txt', 'r')
+            helpMessage = g.read()
+            g.close()
+            print(helpMessage)
+            wait = raw_input("")
+
+        # EXITS THE PROGRAM
+        elif action == '10':
+            action = 'exit'
+
+        # THE USER INPUT WAS NOT RECOGNIZED, GO BACK TO MAIN MENU
+        else:
+            clear_screen()
+            print('did not recognize: \'%s\'' % action)
+
+    # BACKS UP ANY CHANGES NOT BACKED UP YET AND CLOSES THE DATABASE
+    if scheduler is not None:
+        scheduler.stop()
+    Database1.close()
+
+
+def credentials(credentialsFile=None):
+    """gets the username and password for a subcommand, without prompting
+        @param credentialsFile (string) - file with the username on the first line and the password on the second,
+            if None the ACCOUNT_MANAGER_USER and ACCOUNT_MANAGER_PASSWORD environment variables are used
+        @return (string, string) - the username and password
+    """
+
+    if credentialsFile is not None:
+        with open(credentialsFile, "r") as f:
+            lines = f.read().splitlines()
+        if len(lines) < 2:
+            raise SystemExit("'%s' should have the username on the first line and the password on the second"
+                             % credentialsFile)
+        return lines[0], lines[1]
+
+    user = os.environ.get("ACCOUNT_MANAGER_USER")
+    password = os.environ.get("ACCOUNT_MANAGER_PASSWORD")
+    if user is None or password is None:
+        raise SystemExit("set ACCOUNT_MANAGER_USER and ACCOUNT_MANAGER_PASSWORD or pass --credentials")
+    return user, password
+
+
+def authenticate(credentialsFile=None):
+    """logs in for a subcommand
+        @param credentialsFile (string) - file with the username and password, see credentials
+        @return (AccountDatabase) - the database of the user
+    """
+
+    from users import UserDirectory
+
+    user, password = credentials(credentialsFile)
+
+    directory = UserDirectory(UsersFile)
+    try:
+        for line in directory.duplicate_report():
+            sys.stderr.write(line + "\n")
+        record = directory.authenticate(user, password)
+    finally:
+        directory.close()
+
+    if record is None:
+        raise SystemExit("wrong username or password")
+    return open_database(record.name, record.databasePath, record.backupPath)
+
+
+def command_search(database, args):
+    """prints the name of every account matching the search term"""
+
+    for name in database.iter_matches(database.encode(args.term)):
+        print(name)
+
+
+def command_show(database, args):
+    """prints every piece of information of an account"""
+
+    account = database.get_account(database.encode(args.name))
+    if account is None:
+        raise SystemExit("no account named '%s'" % args.name)
+    for column in database.backupColumns:
+        print("%s\t%s" % (column, account[column]))
+
+
+def command_add(database, args):
+    """creates an account out of COLUMN=VALUE arguments"""
+
+    account = {}
+    for field in args.fields:
+        if "=" not in field:
+            raise SystemExit("'%s' should look like COLUMN=VALUE" % field)
+        column, value = field.split("=", 1)
+        account[column] = value
+
+    import sqlite3
+
+    try:
+        database.add_accounts([account])
+    except sqlite3.IntegrityError:
+        raise SystemExit("an account named '%s' already exists" % account["NAME"])
+    except ValueError as error:
+        raise SystemExit(str(error))
+
+
+def command_backup(database, args):
+    """backs up the accounts to the user's backup file"""
+
+    print("%d accounts backed up to '%s'" % (database.backup(incremental=args.incremental), database.backupFile))
+
+
+def command_import(database, args):
+    """restores accounts from a backup file"""
+
+    counts = database.import_csv(args.file, conflict=args.conflict)
+    print("%(inserted)d inserted, %(updated)d updated, %(renamed)d renamed, %(skipped)d skipped" % counts)
+
+
+def command_stale(database, args):
+    """prints the name and date of every account not changed in a number of days, oldest first"""
+
+    for name, dateModified in database.stale_accounts(args.days):
+        print("%s\t%s" % (name, dateModified))
+
+
+def command_reused(database, args):
+    """prints each group of accounts that share a password, one tab separated line per group"""
+
+    for names in database.reused_passwords():
+        print("\t".join(names))
+
+
+def command_rotate(database, args):
+    """gives new random passwords to the accounts matching a search term, tag and/or age"""
+
+    from rotation import PasswordPolicy, rotate_passwords
+
+    try:
+        policy = PasswordPolicy(args.length)
+        result = rotate_passwords(database, args.term, args.tag, args.older_than, policy, args.dry_run, args.report)
+    except ValueError as error:
+        raise SystemExit(str(error))
+
+    if args.dry_run:
+        print("%(selected)d passwords would be rotated" % result)
     else:
-        os.system('cls' if os.name == 'nt' else 'clear')
-        print('did not recognize: \'%s\'' % action)
+        print("%(rotated)d passwords rotated in %(seconds).2f seconds" % result)
+
+
+def command_tasks(database, args):
+    """prints the name and tasks of every account with pending tasks"""
+
+    for name, tasks in database.iter_tasks():
+        print("%s\t%s" % (name, tasks))
+
+
+def main(argv=None):
+    """runs a subcommand, or the interactive program if there is none
+        @param argv (string[]) - command line arguments, sys.argv if None
+        @return (int) - exit status
+    """
+
+    if argv is None:
+        argv = sys.argv[1:]
+
+    # OPT-IN PROFILING, SEE instrumentation.py
+    if os.environ.get("ACCOUNT_MANAGER_PROFILE"):
+        import instrumentation
+        instrumentation.enable_from_environment()
+
+    if not argv:
+        Database1 = login()
+        if Database1 is not None:
+            main_menu(Database1)
+        return 0
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Store and search encrypted account information.")
+    parser.add_argument("--credentials", default=None,
+                        help="file with the username on the first line and the password on the second")
+    commands = parser.add_subparsers(dest="command")
+
+    search = commands.add_parser("search", help="list the accounts matching a search term ('all' for every account)")
+    search.add_argument("term")
+    search.set_defaults(run=command_search)
+
+    show = commands.add_parser("show", help="show the information of an account")
+    show.add_argument("name")
+    show.set_defaults(run=command_show)
+
+    add = commands.add_parser("add", help="create an account, for example: add NAME=bank PASSWORD=secret")
+    add.add_argument("fields", nargs="+", metavar="COLUMN=VALUE")
+    add.set_defaults(run=command_add)
+
+    backup = commands.add_parser("backup", help="back up the accounts to the backup file")
+    backup.add_argument("--incremental", action="store_true", help="only append accounts changed since the last backup")
+    backup.set_defaults(run=command_backup)
+
+    restore = commands.add_parser("import", help="restore accounts from a backup file")
+    restore.add_argument("file")
+    restore.add_argument("--conflict", choices=["skip", "overwrite", "rename"], default="skip",
+                         help="what to do with an account whose name is already taken")
+    restore.set_defaults(run=command_import)
+
+    tasks = commands.add_parser("tasks", help="list the accounts with pending tasks")
+    tasks.set_defaults(run=command_tasks)
+
+    stale = commands.add_parser("stale", help="list the accounts not changed in a number of days, oldest first")
+    stale.add_argument("--days", type=float, default=365, help="days since the account was changed")
+    stale.set_defaults(run=command_stale)
+
+    reused = commands.add_parser("reused", help="list the groups of accounts that share a password")
+    reused.set_defaults(run=command_reused)
+
+    rotate = commands.add_parser("rotate", help="give new random passwords to many accounts at once")
+    rotate.add_argument("--term", default=None, help="accounts matching this search term ('all' for every account)")
+    rotate.add_argument("--tag", default=None, help="accounts with this search tag")
+    rotate.add_argument("--older-than", type=int, default=None, metavar="DAYS",
+                        help="accounts not modified in this many days")
+    rotate.add_argument("--length", type=int, default=16, help="length of the new passwords")
+    rotate.add_argument("--report", default=None, metavar="FILE", help="write the rotated accounts to this csv file")
+    rotate.add_argument("--dry-run", action="store_true", help="only show how many accounts would be rotated")
+    rotate.set_defaults(run=command_rotate)
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.error("a subcommand is required")
+
+    database = authenticate(args.credentials)
+    try:
+        args.run(database, args)
+    finally:
+        database.close()
+    return 0
 
 
-# CLOSE DATABASE, AS LONG AS IT WAS OPENED
-if action == "exit":
-    Database1.db.close()
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""backs up the account database of every user listed in users.db without logging in
+    usage: python backups.py [--users users.db] [--workers N] [--incremental] [--chunk-size N]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+from config import EncryptChars, EncryptShift, UsersFile
+from database import AccountDatabase
+from users import UserDirectory
+
+
+def read_users(usersFile=UsersFile):
+    """reads every user out of the users database and decrypts their file locations
+        @param usersFile (string) - file path of the users database
+        @return (tuple[]) - (user, database file, backup file) for every user
+    """
+
+    directory = UserDirectory(usersFile)
+    try:
+        for line in directory.duplicate_report():
+            sys.stderr.write(line + "\n")
+        return [(record.name,) + directory.files(record) for record in directory.users()]
+    finally:
+        directory.close()
+
+
+def backup_user(job):
+    """backs up one user's database, runs inside a worker process
+        @param job (tuple) - (user, database file, backup file, incremental, chunk size)
+        @return (dict) - user, seconds taken, accounts written and the error if the backup failed
+    """
+
+    user, databaseFile, backupFile, incremental, chunkSize = job
+    result = {"user": user, "seconds": 0.0, "accounts": 0, "error": None}
+    start = time.time()
+
+    try:
+        # AccountDatabase WOULD CREATE AN EMPTY DATABASE FOR A USER WHOSE FILE IS MISSING
+        if not os.path.isfile(databaseFile):
+            raise IOError("no database at '%s'" % databaseFile)
+
+        database = AccountDatabase(user, databaseFile, backupFile, EncryptChars, EncryptShift)
+        try:
+            result["accounts"] = database.backup(incremental=incremental, chunkSize=chunkSize)
+        finally:
+            database.close()
+    except Exception as error:
+        result["error"] = "%s: %s" % (type(error).__name__, error)
+
+    result["seconds"] = time.time() - start
+    return result
+
+
+def backup_all(usersFile=UsersFile, workers=None, incremental=False, chunkSize=1000):
+    """backs up every user in the users database in parallel
+        @param usersFile (string) - file path of the users database
+        @param workers (int) - number of worker processes, the number of cpus if None
+        @param incremental (bool) - if True, only append the accounts changed since each user's last backup
+        @param chunkSize (int) - number of rows each backup reads and writes at a time
+        @return (dict[]) - the result of every backup, in the order they finished
+    """
+
+    jobs = [user + (incremental, chunkSize) for user in read_users(usersFile)]
+    if not jobs:
+        return []
+
+    pool = multiprocessing.Pool(processes=workers)
+    try:
+        results = list(pool.imap_unordered(backup_user, jobs))
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+
+def print_report(results, seconds):
+    """prints the timing and outcome of every backup and a summary line
+        @param results (dict[]) - results from backup_all
+        @param seconds (float) - time the whole run took
+    """
+
+    failures = [result for result in results if result["error"] is not None]
+
+    for result in sorted(results, key=lambda result: result["user"]):
+        if result["error"] is None:
+            print("%-20s\t%8.3fs\t%d accounts" % (result["user"], result["seconds"], result["accounts"]))
+        else:
+            print("%-20s\t%8.3fs\tFAILED %s" % (result["user"], result["seconds"], result["error"]))
+
+    print("\n%d users backed up, %d failed, %d accounts in %.3fs" %
+          (len(results) - len(failures), len(failures), sum(result["accounts"] for result in results), seconds))
+
+
+def main(argv=None):
+    """command line entry point
+        @param argv (string[]) - command line arguments, sys.argv if None
+        @return (int) - exit status, 1 if any backup failed
+    """
+
+    parser = argparse.ArgumentParser(description="Back up the accounts of every user in the users database.")
+    parser.add_argument("--users", default=UsersFile, help="file path of the users database")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--incremental", action="store_true", help="only append accounts changed since the last backup")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="rows read and written at a time")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    results = backup_all(args.users, args.workers, args.incremental, args.chunk_size)
+    print_report(results, time.time() - start)
+
+    if any(result["error"] is not None for result in results):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""benchmarks for the account manager, run each module with python -m benchmarks.<module>"""
@@ -0,0 +1,86 @@
+"""micro-benchmark comparing the original per-character encrypt loop against the precompiled Cipher
+    usage: python -m benchmarks.cipher [number of fields]
+"""
+
+import random
+import string
+import sys
+import timeit
+
+from config import EncryptChars, EncryptShift
+from encryption import get_cipher
+
+
+
+def legacy_encrypt(sequence, characters, shift, reservedSymbols=string.punctuation):
+    """the encrypt loop as it was before the Cipher tables, kept as the reference implementation
+        @param sequence (string) - the sequence to be encrypted
+        @param characters (string) - the characters involved in the encryption
+        @param shift (int) - the magnitude of the shift
+        @param reservedSymbols (string) - characters that should not be changed when encrypting
+        @return (string) - the encrypted string
+    """
+
+    newSequenceArray = []
+    for i in sequence:
+        if i in reservedSymbols or i not in characters:
+            newSequenceArray.append(i)
+        else:
+            newCharIndex = characters.index(i) + shift
+            while newCharIndex >= len(characters):
+                newCharIndex = newCharIndex - len(characters)
+            while newCharIndex < 0:
+                newCharIndex = newCharIndex + len(characters)
+            newSequenceArray.append(characters[newCharIndex])
+
+    newSequence = ''.join(newSequenceArray)
+    if newSequence != sequence and len(newSequence) == len(sequence) or newSequence == '':
+        return newSequence
+    return sequence
+
+
+def make_fields(count, seed=0):
+    """builds a list of random account fields, similar in length to names, emails and passwords
+        @param count (int) - number of fields to build
+        @param seed (int) - seed for the random generator so runs are comparable
+        @return (string[]) - the fields
+    """
+
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + " @._-"
+    return [''.join(rng.choice(alphabet) for _ in range(rng.randint(4, 32))) for _ in range(count)]
+
+
+def main(count=100000, reservedSymbols=""):
+    """times encrypting and decrypting count fields both ways and checks the outputs are identical
+        @param count (int) - number of fields in the workload
+        @param reservedSymbols (string) - reserved symbols, AccountDatabase uses none
+    """
+
+    fields = make_fields(count)
+    cipher = get_cipher(EncryptChars, EncryptShift, reservedSymbols)
+
+    legacy = [legacy_encrypt(f, EncryptChars, EncryptShift, reservedSymbols) for f in fields]
+    tables = [cipher.encrypt(f) for f in fields]
+    assert legacy == tables, "cipher output differs from the original encrypt"
+    assert [cipher.decrypt(f) for f in tables] == \
+        [legacy_encrypt(f, EncryptChars, -EncryptShift, reservedSymbols) for f in legacy]
+
+    # SQLITE GIVES BACK unicode ON PYTHON 2 (ON PYTHON 3 THIS CHECKS THE SAME str AGAIN)
+    texts = [f.decode("ascii") if isinstance(f, bytes) else f for f in fields]
+    assert [cipher.encrypt(f) for f in texts] == legacy, "cipher output differs for unicode input"
+    assert cipher.encrypt_many(texts) == legacy, "batch cipher output differs for unicode input"
+    assert cipher.decrypt_many(cipher.encrypt_many(texts)) == texts
+
+    legacyTime = min(timeit.repeat(
+        lambda: [legacy_encrypt(f, EncryptChars, EncryptShift, reservedSymbols) for f in fields], number=1, repeat=3))
+    cipherTime = min(timeit.repeat(lambda: [cipher.encrypt(f) for f in fields], number=1, repeat=3))
+
+    print("fields:\t\t%d" % count)
+    print("legacy encrypt:\t%.3fs" % legacyTime)
+    print("cipher tables:\t%.3fs" % cipherTime)
+    print("speedup:\t%.1fx" % (legacyTime / cipherTime))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
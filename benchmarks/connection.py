@@ -0,0 +1,77 @@
+"""before/after benchmark of the sqlite tuning in config.DatabaseSettings
+    times single inserts (one commit each, like the menu), a bulk insert, uncached searches and a full backup
+    on a fresh vault opened with sqlite's defaults and again with the tuned settings
+    usage: python -m benchmarks.connection [number of accounts]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from config import EncryptChars, EncryptShift
+from config import DatabaseSettings
+from database import AccountDatabase
+
+# EVERY SETTING LEFT AT SQLITE'S DEFAULT
+DEFAULTS = dict((key, None) for key in DatabaseSettings)
+
+
+def run(folder, label, settings, count):
+    """builds a vault and times each operation on it
+        @param folder (string) - folder to put the vault and its backup in
+        @param label (string) - name of the settings, used for the file names
+        @param settings (dict) - database settings to open the vault with
+        @param count (int) - number of accounts in the bulk insert
+        @return (dict) - seconds taken by each operation
+    """
+
+    database = AccountDatabase(label, os.path.join(folder, label + ".db"), os.path.join(folder, label + ".csv"),
+                               EncryptChars, EncryptShift, searchCacheSize=0, databaseSettings=settings)
+    times = {}
+
+    start = time.time()
+    for i in range(200):
+        database.add_accounts([{"NAME": "single %d" % i, "PASSWORD": "password%d" % i}])
+    times["insert x200"] = time.time() - start
+
+    start = time.time()
+    database.add_accounts({"NAME": "account %d" % i, "DESCRIPTION": "generated account",
+                           "EMAIL": "user%d@example.com" % i, "PASSWORD": "password%d" % i,
+                           "SEARCH_TAGS": "tag%d" % (i % 50)} for i in range(count))
+    times["bulk insert"] = time.time() - start
+
+    start = time.time()
+    for i in range(200):
+        database.find_page(database.encode("unt %d" % i))
+        database.find_page(database.encode("tag%d" % (i % 50)))
+    times["search x400"] = time.time() - start
+
+    start = time.time()
+    database.backup()
+    times["backup"] = time.time() - start
+
+    database.close()
+    return times
+
+
+def main(count=100000):
+    """runs the benchmark with sqlite's defaults and with the tuned settings and prints both
+        @param count (int) - number of accounts in the bulk insert
+    """
+
+    folder = tempfile.mkdtemp()
+    try:
+        before = run(folder, "defaults", DEFAULTS, count)
+        after = run(folder, "tuned", None, count)
+    finally:
+        shutil.rmtree(folder)
+
+    print("%-14s%12s%12s" % ("", "defaults", "tuned"))
+    for operation in before:
+        print("%-14s%11.3fs%11.3fs" % (operation, before[operation], after[operation]))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
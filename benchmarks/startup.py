@@ -0,0 +1,87 @@
+"""measures how long accountManager.py takes to start and run a subcommand, and checks it against a budget
+    usage: python -m benchmarks.startup [runs]
+    exits with status 1 if the median time of any command is over StartupBudget
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from config import EncryptChars, EncryptShift
+
+# MOST SECONDS A SUBCOMMAND MAY TAKE FROM PROCESS START TO EXIT, INCLUDING THE PYTHON INTERPRETER ITSELF
+StartupBudget = 0.15
+
+Program = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "accountManager.py")
+
+
+def make_user(folder):
+    """registers a user with a few accounts in the users database of the folder
+        @param folder (string) - folder the commands are run in
+    """
+
+    from database import AccountDatabase
+    from users import UserDirectory
+
+    directory = UserDirectory(os.path.join(folder, "users.db"))
+    directory.add("bench", "bench", folder, folder)
+    directory.close()
+
+    database = AccountDatabase("bench", os.path.join(folder, "bench.db"), os.path.join(folder, "bench.csv"),
+                               EncryptChars, EncryptShift)
+    database.add_accounts({"NAME": "account %d" % i, "PENDING_TASKS": "task" if i % 10 == 0 else ""}
+                          for i in range(100))
+    database.close()
+
+
+def time_command(arguments, folder, runs):
+    """runs accountManager.py with the arguments several times
+        @param arguments (string[]) - the command line arguments
+        @param folder (string) - folder to run the command in
+        @param runs (int) - number of times to run it
+        @return (float) - median seconds per run
+    """
+
+    environment = dict(os.environ, ACCOUNT_MANAGER_USER="bench", ACCOUNT_MANAGER_PASSWORD="bench")
+    times = []
+    for _ in range(runs):
+        start = time.time()
+        subprocess.check_call([sys.executable, Program] + arguments, cwd=folder, env=environment,
+                              stdout=open(os.devnull, "w"))
+        times.append(time.time() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def main(runs=20):
+    """times the interpreter alone and each subcommand, and compares them with the budget
+        @param runs (int) - number of times each command is run
+        @return (int) - exit status, 1 if a command is over budget
+    """
+
+    folder = tempfile.mkdtemp()
+    try:
+        make_user(folder)
+
+        start = time.time()
+        for _ in range(runs):
+            subprocess.check_call([sys.executable, "-c", "pass"])
+        interpreter = (time.time() - start) / runs
+        print("%-24s%8.3fs" % ("python -c pass", interpreter))
+
+        overBudget = False
+        for arguments in [["--help"], ["search", "unt 1"], ["show", "account 5"], ["tasks"]]:
+            seconds = time_command(arguments, folder, runs)
+            overBudget = overBudget or seconds > StartupBudget
+            print("%-24s%8.3fs" % (" ".join(arguments), seconds))
+    finally:
+        shutil.rmtree(folder)
+
+    print("budget %.3fs: %s" % (StartupBudget, "OVER" if overBudget else "ok"))
+    return 1 if overBudget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20))
@@ -0,0 +1,177 @@
+"""times the hot paths of the account manager on generated vaults and writes the results as JSON
+    usage: python -m benchmarks.suite [--sizes 1000,100000,1000000] [--output results.json]
+           python -m benchmarks.suite --compare before.json after.json
+    run it on two commits and compare the two files to judge a change by numbers
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.vault import generate_vault, make_accounts, make_users
+from config import EncryptChars, EncryptShift
+from encryption import encrypt
+from users import UserDirectory
+
+
+@contextlib.contextmanager
+def quiet():
+    """sends everything printed inside the block to devnull, for timing the methods that print"""
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        yield
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def timed(function, iterations=1):
+    """runs a function several times
+        @param function (function) - takes no arguments
+        @param iterations (int) - number of times to run it
+        @return (float) - total seconds taken
+    """
+
+    start = time.time()
+    for _ in range(iterations):
+        function()
+    return time.time() - start
+
+
+def login_lookup(usersFile, user):
+    """looks a user up and decrypts their information, the same work as logging in at the terminal
+        @param usersFile (string) - file path of the users database
+        @param user (string) - the name of the user
+    """
+
+    directory = UserDirectory(usersFile)
+    directory.get(user)
+    directory.close()
+
+
+def run_size(folder, size):
+    """generates a vault and times every hot path on it
+        @param folder (string) - empty folder for the vault
+        @param size (int) - number of accounts in the vault
+        @return (dict[]) - operation, size, iterations, total seconds and seconds per iteration of each timing
+    """
+
+    results = []
+
+    def record(operation, seconds, iterations=1):
+        results.append({"operation": operation, "size": size, "iterations": iterations, "seconds": seconds,
+                        "perIteration": seconds / iterations})
+        sys.stderr.write("%-10d%-22s%10.4fs%14.6fs" % (size, operation, seconds, seconds / iterations) + "\n")
+
+    start = time.time()
+    database = generate_vault(folder, size)
+    record("generate", time.time() - start)
+    database.searchCache.maxSize = 0
+
+    fields = [account["NAME"] for account in make_accounts(min(size, 100000), seed=1)]
+    record("encrypt", timed(lambda: [encrypt(field, EncryptChars, EncryptShift, "") for field in fields]),
+           len(fields))
+
+    hits = ["Bank Online", "Mail", "finance", "%d" % (size // 2)]
+    record("search hit", timed(lambda: [database.find_page(database.encode(term)) for term in hits], 25),
+           25 * len(hits))
+    misses = ["zzzz", "no such account", "qq"]
+    record("search miss", timed(lambda: [database.find_page(database.encode(term)) for term in misses], 25),
+           25 * len(misses))
+
+    with quiet():
+        record("get_tasks", timed(database.get_tasks, 10), 10)
+        names = [database.encode(account["NAME"]) for account in make_accounts(100, seed=0)][:min(size, 100)]
+        record("displayAccount", timed(lambda: [database.displayAccount(name) for name in names]), len(names))
+
+    record("backup", timed(database.backup))
+
+    count = min(size, 10000)
+    start = time.time()
+    database.add_accounts({"NAME": "bulk %d" % i, "PASSWORD": "password%d" % i} for i in range(count))
+    record("bulk insert", time.time() - start, count)
+    database.close()
+
+    usersFile = os.path.join(folder, "users.db")
+    make_users(usersFile, min(size, 100000), folder)
+    users = ["user%d" % i for i in range(0, min(size, 100000), max(1, min(size, 100000) // 100))]
+    record("login lookup", timed(lambda: [login_lookup(usersFile, user) for user in users]), len(users))
+
+    return results
+
+
+def git_commit():
+    """returns the commit the benchmark is running on, None outside of git"""
+
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.STDOUT,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(beforeFile, afterFile):
+    """prints how the time per iteration of each operation changed between two result files
+        @param beforeFile (string) - results of the earlier run
+        @param afterFile (string) - results of the later run
+    """
+
+    with open(beforeFile) as f:
+        before = dict(((result["operation"], result["size"]), result) for result in json.load(f)["results"])
+    with open(afterFile) as f:
+        after = json.load(f)["results"]
+
+    print("%-10s%-22s%14s%14s%10s" % ("size", "operation", "before", "after", "change"))
+    for result in after:
+        old = before.get((result["operation"], result["size"]))
+        if old is None:
+            continue
+        print("%-10d%-22s%13.6fs%13.6fs%9.2fx" % (result["size"], result["operation"], old["perIteration"],
+                                                   result["perIteration"],
+                                                   old["perIteration"] / max(result["perIteration"], 1e-9)))
+
+
+def main(argv=None):
+    """command line entry point
+        @param argv (string[]) - command line arguments, sys.argv if None
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark the account manager on generated vaults.")
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="comma separated numbers of accounts")
+    parser.add_argument("--output", default=None, help="file to write the JSON results to, stdout if not given")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two result files")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = []
+    for size in [int(size) for size in args.sizes.split(",")]:
+        folder = tempfile.mkdtemp()
+        try:
+            results.extend(run_size(folder, size))
+        finally:
+            shutil.rmtree(folder)
+
+    report = {"commit": git_commit(), "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+              "platform": platform.platform(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""generates realistic encrypted vaults for benchmarking
+    usage: python -m benchmarks.vault FOLDER NUMBER_OF_ACCOUNTS
+"""
+
+import os
+import random
+import sys
+
+from config import EncryptChars, EncryptShift
+from database import AccountDatabase
+from passwords import randPassGen
+from users import UserDirectory
+
+Services = ["Bank", "Mail", "Shop", "Cloud", "Forum", "News", "Games", "Travel", "Phone", "Insurance",
+            "Streaming", "Social", "Work", "School", "Energy", "Water", "Gym", "Library", "Airline", "Hotel"]
+Domains = ["example.com", "mail.example.org", "example.net", "corp.example.com"]
+Tags = ["finance", "personal", "work", "shopping", "travel", "utilities", "social", "entertainment"]
+
+
+def make_accounts(count, seed=0):
+    """lazily builds decrypted accounts that look like the ones people keep
+        @param count (int) - number of accounts
+        @param seed (int) - seed for the random generator, the same seed gives the same accounts
+        @return (generator) - dicts of account information keyed by column name
+    """
+
+    rng = random.Random(seed)
+    for i in range(count):
+        service = rng.choice(Services)
+        name = "%s %s %d" % (service, rng.choice(["Online", "Plus", "Account", "Portal"]), i)
+        username = "user%d" % rng.randint(1, count)
+        yield {
+            "NAME": name,
+            "DESCRIPTION": "%s account for %s" % (service.lower(), rng.choice(Tags)),
+            "EMAIL": "%s@%s" % (username, rng.choice(Domains)),
+            "USERNAME": username,
+            "PASSWORD": randPassGen(length=rng.randint(8, 20)),
+            "ACCESS_CODE": "%04d" % rng.randint(0, 9999) if rng.random() < 0.2 else "",
+            "WEBSITE": "www.%s%d.example.com" % (service.lower(), i),
+            "ADDRESS": "%d Main Street" % rng.randint(1, 999) if rng.random() < 0.1 else "",
+            "PHONE_NUMBER": "555-%04d" % rng.randint(0, 9999) if rng.random() < 0.1 else "",
+            "MISCELLANEOUS_INFO": "security question: pet name" if rng.random() < 0.3 else "",
+            "PENDING_TASKS": "change password" if rng.random() < 0.001 else "",
+            "SEARCH_TAGS": " ".join(rng.sample(Tags, rng.randint(1, 3))),
+        }
+
+
+def make_users(usersFile, count, folder):
+    """fills a users database the way registering at the login screen does
+        @param usersFile (string) - file path of the users database
+        @param count (int) - number of users, named user0, user1, ...
+        @param folder (string) - database and backup folder of every user
+    """
+
+    directory = UserDirectory(usersFile)
+    directory.add_many(("user%d" % i, "password%d" % i, folder, folder) for i in range(count))
+    directory.close()
+
+
+def generate_vault(folder, count, seed=0, user="bench"):
+    """creates a vault of generated accounts through AccountDatabase
+        @param folder (string) - folder to create the database and backup file in
+        @param count (int) - number of accounts
+        @param seed (int) - seed for the random generator
+        @param user (string) - name of the vault's user, used for the file names
+        @return (AccountDatabase) - the open vault
+    """
+
+    database = AccountDatabase(user, os.path.join(folder, "%s.db" % user),
+                               os.path.join(folder, "%sAccountBackup.csv" % user), EncryptChars, EncryptShift)
+    database.add_accounts(make_accounts(count, seed), batchSize=5000)
+    return database
+
+
+if __name__ == "__main__":
+    generate_vault(sys.argv[1], int(sys.argv[2])).close()
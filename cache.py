@@ -0,0 +1,70 @@
+from collections import OrderedDict
+
+
+class SearchCache:
+    """least recently used cache of search results, keyed by the encrypted search term and page"""
+
+    def __init__(self, maxSize=128):
+        """creates an empty cache
+            @param maxSize (int) - most results kept at once, 0 turns the cache off
+        """
+
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """looks up a cached result and marks it as the most recently used
+            @param key (string) - the key of the result
+            @return - the cached result, None if it is not cached
+        """
+
+        result = self.entries.pop(key, None)
+        if result is None:
+            self.misses += 1
+            return None
+
+        self.entries[key] = result
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        """caches a result, dropping the least recently used result if the cache is full
+            @param key (string) - the key of the result
+            @param result - the result to cache, should not be changed afterwards
+        """
+
+        if self.maxSize <= 0:
+            return
+
+        self.entries.pop(key, None)
+        self.entries[key] = result
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, stale):
+        """drops every cached result whose key is stale
+            @param stale (function) - takes a key and returns True if its result may have changed
+        """
+
+        for key in [key for key in self.entries if stale(key)]:
+            del self.entries[key]
+            self.invalidations += 1
+
+    def clear(self):
+        """drops every cached result"""
+
+        self.invalidations += len(self.entries)
+        self.entries.clear()
+
+    def info(self):
+        """returns the statistics of the cache
+            @return (dict) - hits, misses, evictions, invalidations, current size and maximum size
+        """
+
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "invalidations": self.invalidations, "size": len(self.entries), "maxSize": self.maxSize}
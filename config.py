@@ -0,0 +1,47 @@
+# SETTINGS SHARED BY THE ACCOUNT MANAGER AND ITS COMMAND LINE TOOLS
+
+from encryption import fix_filepath
+
+# *********************************************************************************
+# CHANGE THESE TO YOUR LIKING IF YOU ARE GOING TO SET UP ACCOUNTS USING THE PROGRAM
+# *********************************************************************************
+# CHARACTERS USED FOR ENCRYPTION
+EncryptChars = "A2HQuNq{XEgo/PwhLt)BI=a6cz43*VkSDl`KxU%F.Y\\~\"p ?!;j>dGrOZ}<T0$v,n-ye5Wm]i^7&:('9M[8+J|fb@Rs_C#1"
+# HOW FAR TO SHIFT EACH CHARACTER DURING ENCRYPTION
+EncryptShift = 10
+
+# DATABASE OF EVERY USER AND WHERE THEIR FILES ARE KEPT
+UsersFile = "users.db"
+
+# WHILE THE MENU IS OPEN, A COPY OF THE USER'S DATABASE IS MADE IN THE BACKGROUND NEXT TO THEIR BACKUP FILE
+# EVERY AutoBackupInterval SECONDS, OR AS SOON AS AutoBackupWrites ACCOUNTS HAVE BEEN CHANGED (0 TURNS EITHER OFF),
+# AND THE NEWEST AutoBackupKeep COPIES ARE KEPT
+AutoBackupInterval = 3600
+AutoBackupWrites = 100
+AutoBackupKeep = 5
+
+
+def user_files(user, databasePath, backupPath):
+    """returns the database file and backup file of a user
+        @param user (string) - the name of the user
+        @param databasePath (string) - folder that holds the user's database
+        @param backupPath (string) - folder that holds the user's backup
+        @return (string, string) - file path of the database, file path of the backup
+    """
+
+    databaseFile = fix_filepath(databasePath + ("/%s.db" % user))
+    backupFile = fix_filepath(backupPath + ("/%sAccountBackup.csv" % user))
+    return databaseFile, backupFile
+
+# SQLITE TUNING FOR EVERY DATABASE THE PROGRAM OPENS, A VALUE OF None LEAVES SQLITE'S DEFAULT
+# ANY OF THESE CAN BE OVERRIDDEN FOR A DEPLOYMENT WITH THE ACCOUNT_MANAGER_SQLITE ENVIRONMENT VARIABLE,
+# FOR EXAMPLE ACCOUNT_MANAGER_SQLITE="synchronous=FULL;mmap_size=0"
+DatabaseSettings = {
+    "journal_mode": "WAL",  # readers do not block the writer and commits do not rewrite the journal
+    "synchronous": "NORMAL",  # safe with WAL, only a power loss can undo the most recent commits
+    "cache_size": -16000,  # page cache size, negative values are in KiB
+    "mmap_size": 268435456,  # bytes of the database file read through memory mapping
+    "temp_store": "MEMORY",  # temporary tables and indexes (sorting) are kept in memory
+    "busy_timeout": 5000,  # milliseconds to wait for another connection's lock before failing
+    "cached_statements": 256,  # number of prepared statements kept by each connection
+}
@@ -0,0 +1,64 @@
+import os
+import sqlite3
+
+from config import DatabaseSettings
+
+# SETTINGS THAT ARE APPLIED WITH A PRAGMA, IN THE ORDER THEY ARE APPLIED
+PRAGMAS = ["busy_timeout", "journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store"]
+
+# sqlite3.Connection SUBCLASS USED FOR NEW CONNECTIONS, SET BY instrumentation.enable
+connectionFactory = None
+
+
+def database_settings(settings=None):
+    """combines the default sqlite settings, the ACCOUNT_MANAGER_SQLITE environment variable and any overrides
+        @param settings (dict) - settings that take priority over the others
+        @return (dict) - the settings to use
+    """
+
+    combined = dict(DatabaseSettings)
+
+    for setting in os.environ.get("ACCOUNT_MANAGER_SQLITE", "").split(";"):
+        if "=" in setting:
+            key, value = setting.split("=", 1)
+            value = value.strip()
+            combined[key.strip()] = int(value) if value.lstrip("-").isdigit() else value
+
+    if settings:
+        combined.update(settings)
+
+    for key in combined:
+        if key not in PRAGMAS and key != "cached_statements":
+            raise ValueError("'%s' is not a database setting" % key)
+
+    return combined
+
+
+def connect(path, settings=None, **kwargs):
+    """opens a connection to an sqlite database with the deployment's tuning applied
+        @param path (string) - file path of the database
+        @param settings (dict) - overrides of the settings in config.DatabaseSettings, None values leave sqlite's default
+        @param kwargs - passed on to sqlite3.connect
+        @return (sqlite3.Connection) - the open connection
+    """
+
+    settings = database_settings(settings)
+
+    if settings.get("cached_statements") is not None:
+        kwargs.setdefault("cached_statements", settings["cached_statements"])
+    if settings.get("busy_timeout") is not None:
+        kwargs.setdefault("timeout", settings["busy_timeout"] / 1000.0)
+
+    if connectionFactory is not None:
+        kwargs.setdefault("factory", connectionFactory)
+
+    connection = sqlite3.connect(path, **kwargs)
+
+    for pragma in PRAGMAS:
+        value = settings.get(pragma)
+        if value is not None:
+            if not str(value).lstrip("-").isalnum():
+                raise ValueError("'%s' is not a valid value for %s" % (value, pragma))
+            connection.execute("PRAGMA %s = %s;" % (pragma, value))
+
+    return connection
@@ -1,16 +1,85 @@
 import sqlite3
 import os
+import sys
 import csv
 import datetime
-from encryption import encrypt
-import passwords
-import locale
-from functools import cmp_to_key
+import time
+import hmac
+import hashlib
+import binascii
+from encryption import get_cipher
+from cache import SearchCache
+from nameindex import NameIndex
+from records import record_factory
+from connection import connect
+
+def open_csv(path, mode="r", buffering=-1):
+    """opens a file the way the csv module expects it on both python 2 and python 3
+        @param path (string) - file path of the .csv file
+        @param mode (string) - "r", "w" or "a"
+        @param buffering (int) - buffer size in bytes, -1 for the default
+        @return (file) - the opened file
+    """
+
+    if sys.version_info[0] < 3:
+        return open(path, mode + "b", buffering)
+    return open(path, mode, buffering, newline="")
+
+
+# TEXT FROM sqlite3 IS unicode ON PYTHON 2 AND str ON PYTHON 3, basestring ALSO COVERS A PYTHON 2 str
+try:
+    _stringTypes = basestring
+except NameError:
+    _stringTypes = str
+
+
+def translate_rows(rows, columns, translate):
+    """applies a batch translate function to the selected columns of every row.
+        values that are not strings (ID, NULL) are left as they are
+        @param rows (tuple[]) - the rows to be translated
+        @param columns (int[]) - indexes of the columns to translate, all columns if None
+        @param translate (function) - takes a list of strings and returns the translated list
+        @return (tuple[]) - the translated rows
+    """
+
+    rows = list(rows)
+    if not rows:
+        return []
+
+    # SWAP TO ONE LIST PER COLUMN SO EACH COLUMN IS TRANSLATED IN ONE CALL
+    table = [list(column) for column in zip(*rows)]
+    if columns is None:
+        columns = range(len(table))
+
+    for column in columns:
+        values = table[column]
+        text = [index for index, value in enumerate(values) if isinstance(value, _stringTypes)]
+        if len(text) == len(values):
+            table[column] = translate(values)
+        elif text:
+            for index, value in zip(text, translate([values[index] for index in text])):
+                values[index] = value
+
+    return list(zip(*table))
+
+
+def date_timestamp(date):
+    """converts a decrypted DATE_MODIFIED to a timestamp, for accounts written before DATE_MODIFIED_TS existed
+        @param date (string) - date like "Jan 02, 2020"
+        @return (int) - seconds since the epoch at the start of the day, 0 if it is blank or not a date
+    """
+
+    try:
+        return int(time.mktime(datetime.datetime.strptime(date, "%b %d, %Y").timetuple()))
+    except (TypeError, ValueError, OverflowError):
+        return 0
+
 
 class AccountDatabase:
     """class to contain a database and relevant function"""
 
-    def __init__(self, dbName, dbFile, backupFile, encryptChars, encryptShift, reservedSymbols=""):
+    def __init__(self, dbName, dbFile, backupFile, encryptChars, encryptShift, reservedSymbols="", searchCacheSize=128,
+                 databaseSettings=None, checkSameThread=True, searchCountFlushSize=100, searchCountFlushInterval=60.0):
         """initializes an account database with certain information
             @param dbName (string) - name to use for database
             @param dbFile (string) - file path of the database
@@ -18,6 +87,12 @@ class AccountDatabase:
             @param encryptChars (string) - characters used in encryption
             @param encryptShift (int) - amount of shift to be applied for encryption
             @param reservedSymbols (string) - symbols that are not changed during encryption
+            @param searchCacheSize (int) - number of pages of search results to keep in memory, 0 to turn it off
+            @param databaseSettings (dict) - sqlite settings that override the ones in config.DatabaseSettings
+            @param checkSameThread (bool) - if False, the database can be used from a thread other than the one
+                that opened it, as long as only one thread uses it at a time
+            @param searchCountFlushSize (int) - number of account uses kept in memory before they are written
+            @param searchCountFlushInterval (float) - most seconds an account use is kept in memory before it is written
         """
 
         self.dbFile = dbFile
@@ -27,11 +102,35 @@ class AccountDatabase:
         self.encryptChars = encryptChars
         self.encryptShift = encryptShift
         self.reservedSymbols = reservedSymbols
+        self.cipher = get_cipher(encryptChars, encryptShift, reservedSymbols)
+        self.searchCache = SearchCache(searchCacheSize)
+
+        # DECRYPTED ACCOUNT NAMES FOR TYPEAHEAD, None UNTIL load_name_index IS CALLED
+        self.nameIndex = None
+
+        # FUNCTIONS CALLED WITH THE NUMBER OF ACCOUNTS CHANGED AFTER EVERY COMMITTED WRITE, LIKE
+        # scheduler.BackupScheduler.record_writes
+        self.writeListeners = []
+
+        # USES OF EACH ACCOUNT (ENCRYPTED NAME -> COUNT) THAT HAVE NOT BEEN ADDED TO SEARCH_COUNT YET
+        self.searchCounts = {}
+        self.pendingSearchCounts = 0
+        self.searchCountFlushSize = searchCountFlushSize
+        self.searchCountFlushInterval = searchCountFlushInterval
+        self.lastSearchCountFlush = time.time()
         self.categories = ["ID", "NAME", "DESCRIPTION", "EMAIL", "USERNAME", "PASSWORD", "ACCESS_CODE", "WEBSITE",
                            "MISCELLANEOUS_INFO", "PENDING_TASKS", "SEARCH_TAGS", "DATE_MODIFIED", "SEARCH_COUNT"]
 
+        # COLUMNS OF AN ACCOUNT THAT ARE WRITTEN TO AND READ BACK FROM THE BACKUP FILE, AND THEIR HEADINGS
+        self.backupColumns = ["NAME", "DESCRIPTION", "EMAIL", "USERNAME", "PASSWORD", "ACCESS_CODE", "WEBSITE",
+                              "ADDRESS", "PHONE_NUMBER", "MISCELLANEOUS_INFO", "PENDING_TASKS", "SEARCH_TAGS",
+                              "DATE_MODIFIED"]
+        self.backupHeader = ["NAME", "DESCRIPTION", "EMAIL", "USERNAME", "PASSWORD", "CODE", "WEBSITE",
+                             "ADDRESS", "PHONE NUMBER", "MISCELLANEOUS INFO", "PENDING TASKS", "SEARCH TAGS",
+                             "DATE MODIFIED"]
+
         # CONNECTS TO THE DATABASE
-        self.dataBase = sqlite3.connect(self.dbFile)
+        self.dataBase = connect(self.dbFile, databaseSettings, check_same_thread=checkSameThread)
         self.db = self.dataBase.cursor()
 
         # CREATES A TABLE WITH THE FOLLOWING PROPERTIES IF IT DOES NOT ALREADY EXIST
@@ -50,19 +149,225 @@ class AccountDatabase:
                         "MISCELLANEOUS_INFO TEXT,"  # more information about the account
                         "PENDING_TASKS TEXT,"  # things that I want to do with this account
                         "SEARCH_TAGS TEXT,"  # identifiers for searching
-                        "DATE_MODIFIED TEXT"  # updated when the entry is modified (month, day, year)
+                        "DATE_MODIFIED TEXT,"  # updated when the entry is modified (month, day, year)
+                        "CHANGE_ID INTEGER NOT NULL DEFAULT 0,"  # change counter value of the last insert or update
+                        "SEARCH_COUNT INTEGER NOT NULL DEFAULT 0,"  # times the account was picked or looked up
+                        "DATE_MODIFIED_TS INTEGER,"  # DATE_MODIFIED as seconds since the epoch, so it can be range queried
+                        "PASSWORD_FINGERPRINT TEXT"  # keyed hash of the password, so reused passwords can be grouped
                         ");")
 
+        # KEY/VALUE STORE FOR SETTINGS OF THE DATABASE ITSELF, LIKE THE BACKUP HIGH WATER MARK
+        self.db.execute("CREATE TABLE IF NOT EXISTS settings"
+                        "("
+                        "KEY TEXT PRIMARY KEY NOT NULL,"
+                        "VALUE"
+                        ");")
+
+        # BRINGS DATABASES CREATED BY OLDER VERSIONS UP TO DATE
+        self.add_column("CHANGE_ID", "INTEGER NOT NULL DEFAULT 0")
+        self.add_column("SEARCH_COUNT", "INTEGER NOT NULL DEFAULT 0")
+        self.add_column("DATE_MODIFIED_TS", "INTEGER")
+        self.add_column("PASSWORD_FINGERPRINT", "TEXT")
+
+        # EVERY INSERT OR UPDATE OF AN ACCOUNT TAKES THE NEXT VALUE OF THE CHANGE COUNTER
+        # SO INCREMENTAL BACKUPS CAN FIND THE ROWS CHANGED SINCE THE LAST BACKUP WITH AN INDEX RANGE SCAN
+        self.db.execute("INSERT OR IGNORE INTO settings (KEY, VALUE) "
+                        "SELECT 'change_counter', IFNULL(MAX(CHANGE_ID), 0) FROM accounts;")
+        self.db.execute("CREATE INDEX IF NOT EXISTS accounts_change_id ON accounts (CHANGE_ID);")
+        self.db.execute("CREATE TRIGGER IF NOT EXISTS accounts_change_insert AFTER INSERT ON accounts BEGIN "
+                        "UPDATE settings SET VALUE = VALUE + 1 WHERE KEY = 'change_counter'; "
+                        "UPDATE accounts SET CHANGE_ID = (SELECT VALUE FROM settings WHERE KEY = 'change_counter') "
+                        "WHERE ID = new.ID; "
+                        "END;")
+        self.db.execute("CREATE TRIGGER IF NOT EXISTS accounts_change_update "
+                        "AFTER UPDATE OF NAME, DESCRIPTION, EMAIL, USERNAME, PASSWORD, ACCESS_CODE, WEBSITE, ADDRESS, "
+                        "PHONE_NUMBER, MISCELLANEOUS_INFO, PENDING_TASKS, SEARCH_TAGS, DATE_MODIFIED ON accounts BEGIN "
+                        "UPDATE settings SET VALUE = VALUE + 1 WHERE KEY = 'change_counter'; "
+                        "UPDATE accounts SET CHANGE_ID = (SELECT VALUE FROM settings WHERE KEY = 'change_counter') "
+                        "WHERE ID = new.ID; "
+                        "END;")
+
+        # PARTIAL INDEX OF ONLY THE ACCOUNTS WITH PENDING TASKS, SO LISTING TASKS NEVER SCANS THE WHOLE TABLE
+        self.db.execute("CREATE INDEX IF NOT EXISTS accounts_pending_tasks ON accounts (PENDING_TASKS, NAME) "
+                        "WHERE PENDING_TASKS != '';")
+
+        # SEARCH RESULTS ARE LISTED MOST USED FIRST, THE INDEX GIVES LISTING EVERY ACCOUNT THAT ORDER WITHOUT A SORT
+        self.db.execute("CREATE INDEX IF NOT EXISTS accounts_search_count ON accounts (SEARCH_COUNT DESC, NAME);")
+
+        # FINDING THE ACCOUNTS THAT HAVE NOT BEEN CHANGED IN A WHILE IS A RANGE OF THIS INDEX.
+        # THE TIMESTAMP IS SET BY THE WRITES THEMSELVES, NOT A TRIGGER, SO RE-ENCRYPTING A DATABASE KEEPS IT
+        self.db.execute("CREATE INDEX IF NOT EXISTS accounts_date_modified ON accounts (DATE_MODIFIED_TS);")
+        self.backfill_timestamps()
+
+        # ACCOUNTS WITH THE SAME PASSWORD HAVE THE SAME FINGERPRINT, SO FINDING REUSED PASSWORDS IS A GROUP BY OF
+        # THIS INDEX. THE HASH IS KEYED WITH A RANDOM SECRET OF THIS DATABASE, SO FINGERPRINTS CANNOT BE LOOKED UP
+        # IN A TABLE OF HASHED COMMON PASSWORDS OR MATCHED ACROSS DATABASES
+        self.db.execute("INSERT OR IGNORE INTO settings (KEY, VALUE) VALUES ('fingerprint_key', ?);",
+                        (binascii.hexlify(os.urandom(32)).decode("ascii"),))
+        self.load_fingerprint_key()
+        self.db.execute("CREATE INDEX IF NOT EXISTS accounts_password_fingerprint ON accounts (PASSWORD_FINGERPRINT);")
+        self.backfill_fingerprints()
+
+        # FULL TEXT INDEX OVER THE ENCRYPTED FIELDS THAT ARE SEARCHED, FALSE IF SQLITE WAS BUILT WITHOUT FTS5
+        self.searchIndex = self.create_search_index()
+
         # COMMITS CHANGES TO THE DATABASE SO THEY ARE SAVED
         self.dataBase.commit()
 
+    def add_column(self, column, definition):
+        """adds a column to the accounts table if it is not already there
+            @param column (string) - name of the column
+            @param definition (string) - type and constraints of the column
+            @return (bool) - True if the column was added, False if it already existed
+        """
+
+        self.db.execute("PRAGMA table_info(accounts);")
+        if column in [row[1] for row in self.db.fetchall()]:
+            return False
+
+        self.db.execute("ALTER TABLE accounts ADD COLUMN %s %s;" % (column, definition))
+        return True
+
+    def backfill_timestamps(self, chunkSize=1000):
+        """fills in DATE_MODIFIED_TS from DATE_MODIFIED for accounts written before it existed,
+            or by an older version of the program. accounts without a readable date get 0
+            @param chunkSize (int) - number of accounts read and updated at a time
+            @return (int) - number of accounts filled in
+        """
+
+        count = 0
+        while True:
+            self.db.execute("SELECT ID, DATE_MODIFIED FROM accounts WHERE DATE_MODIFIED_TS IS NULL LIMIT ?;",
+                            (chunkSize,))
+            rows = self.decode_rows(self.db.fetchall(), [1])
+            if not rows:
+                return count
+            self.db.executemany("UPDATE accounts SET DATE_MODIFIED_TS = ? WHERE ID = ?;",
+                                [(date_timestamp(date), accountId) for accountId, date in rows])
+            self.dataBase.commit()
+            count += len(rows)
+
+    def backfill_fingerprints(self, chunkSize=1000):
+        """fills in PASSWORD_FINGERPRINT for accounts written before it existed, or by an older version of the
+            program. accounts without a password have no fingerprint
+            @param chunkSize (int) - number of accounts read and updated at a time
+            @return (int) - number of accounts filled in
+        """
+
+        count = 0
+        while True:
+            self.db.execute("SELECT ID, PASSWORD FROM accounts WHERE PASSWORD_FINGERPRINT IS NULL AND PASSWORD != '' "
+                            "LIMIT ?;", (chunkSize,))
+            rows = self.decode_rows(self.db.fetchall(), [1])
+            if not rows:
+                return count
+            self.db.executemany("UPDATE accounts SET PASSWORD_FINGERPRINT = ? WHERE ID = ?;",
+                                [(self.password_fingerprint(password), accountId) for accountId, password in rows])
+            self.dataBase.commit()
+            count += len(rows)
+
+    def load_fingerprint_key(self):
+        """reads the key of PASSWORD_FINGERPRINT from the settings table, again if it has been changed"""
+
+        # KEYED ONCE, EACH FINGERPRINT STARTS FROM A COPY
+        self.fingerprintHash = hmac.new(binascii.unhexlify(self.get_setting("fingerprint_key")),
+                                        digestmod=hashlib.sha256)
+
+    def password_fingerprint(self, password):
+        """hashes a password with the key of this database
+            @param password (string) - the decrypted password
+            @return (string) - hex HMAC-SHA256 of the password, None if there is no password
+        """
+
+        if not password:
+            return None
+        fingerprint = self.fingerprintHash.copy()
+        fingerprint.update(password.encode("utf-8"))
+        return fingerprint.hexdigest()
+
+    def get_setting(self, key, default=None):
+        """reads a value from the settings table
+            @param key (string) - name of the setting
+            @param default - value returned if the setting has never been set
+            @return - the value of the setting
+        """
+
+        self.db.execute("SELECT VALUE FROM settings WHERE KEY = ?;", (key,))
+        row = self.db.fetchone()
+        if row is None:
+            return default
+        return row[0]
+
+    def set_setting(self, key, value):
+        """writes a value to the settings table, the caller commits
+            @param key (string) - name of the setting
+            @param value - value of the setting
+        """
+
+        self.db.execute("INSERT OR REPLACE INTO settings (KEY, VALUE) VALUES (?,?);", (key, value))
+
+    def create_search_index(self):
+        """creates the trigram full text index used by search, if it does not already exist.
+            the cipher is deterministic per character, so the index is built over the encrypted text
+            and an encrypted search term matches it directly.
+            triggers keep the index in step with every insert, update and delete on the accounts table.
+            a database created before the index existed is indexed once, the first time it is opened.
+            @return (bool) - True if the index is available, False if this sqlite has no fts5 trigram support
+        """
+
+        self.db.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'accounts_search';")
+        if self.db.fetchone() is not None:
+            return True
+
+        try:
+            self.db.execute("CREATE VIRTUAL TABLE accounts_search USING fts5"
+                            "(NAME, DESCRIPTION, SEARCH_TAGS, content='accounts', content_rowid='ID', "
+                            "tokenize='trigram');")
+        except sqlite3.OperationalError:
+            return False
+
+        self.db.execute("CREATE TRIGGER IF NOT EXISTS accounts_search_insert AFTER INSERT ON accounts BEGIN "
+                        "INSERT INTO accounts_search (rowid, NAME, DESCRIPTION, SEARCH_TAGS) "
+                        "VALUES (new.ID, new.NAME, new.DESCRIPTION, new.SEARCH_TAGS); "
+                        "END;")
+        self.db.execute("CREATE TRIGGER IF NOT EXISTS accounts_search_delete AFTER DELETE ON accounts BEGIN "
+                        "INSERT INTO accounts_search (accounts_search, rowid, NAME, DESCRIPTION, SEARCH_TAGS) "
+                        "VALUES ('delete', old.ID, old.NAME, old.DESCRIPTION, old.SEARCH_TAGS); "
+                        "END;")
+        self.db.execute("CREATE TRIGGER IF NOT EXISTS accounts_search_update "
+                        "AFTER UPDATE OF NAME, DESCRIPTION, SEARCH_TAGS ON accounts BEGIN "
+                        "INSERT INTO accounts_search (accounts_search, rowid, NAME, DESCRIPTION, SEARCH_TAGS) "
+                        "VALUES ('delete', old.ID, old.NAME, old.DESCRIPTION, old.SEARCH_TAGS); "
+                        "INSERT INTO accounts_search (rowid, NAME, DESCRIPTION, SEARCH_TAGS) "
+                        "VALUES (new.ID, new.NAME, new.DESCRIPTION, new.SEARCH_TAGS); "
+                        "END;")
+
+        # INDEX THE ACCOUNTS THAT WERE ADDED BEFORE THE INDEX EXISTED
+        self.build_search_index()
+        return True
+
+    def build_search_index(self):
+        """rebuilds the full text index from scratch out of the accounts table"""
+
+        self.db.execute("INSERT INTO accounts_search (accounts_search) VALUES ('rebuild');")
+        self.dataBase.commit()
+
+    def account_cursor(self):
+        """opens a cursor whose rows are records.Account, which decrypt each value the first time it is read
+            @return (sqlite3.Cursor) - the cursor, for the caller to close
+        """
+
+        cursor = self.dataBase.cursor()
+        cursor.row_factory = record_factory(self.backupColumns, self.cipher)
+        return cursor
+
     def encode(self, info):
         """easier implementation of the encryption function
             @param info (string) - the information to be encrypted
             @return (string) - the encrypted version of info
         """
 
-        newInfo = encrypt(info, self.encryptChars, self.encryptShift, reservedSymbols=self.reservedSymbols)
+        newInfo = self.cipher.encrypt(info)
         return newInfo
 
     def decode(self, info):
@@ -71,9 +376,27 @@ class AccountDatabase:
             @return (string) - the information that was decoded
         """
 
-        newInfo = encrypt(info, self.encryptChars, -self.encryptShift, reservedSymbols=self.reservedSymbols)
+        newInfo = self.cipher.decrypt(info)
         return newInfo
 
+    def encode_rows(self, rows, columns=None):
+        """encrypts a whole set of rows at once, one column at a time
+            @param rows (tuple[]) - the rows to be encrypted
+            @param columns (int[]) - indexes of the columns to encrypt, all columns if None
+            @return (tuple[]) - the rows with the selected columns encrypted
+        """
+
+        return translate_rows(rows, columns, self.cipher.encrypt_many)
+
+    def decode_rows(self, rows, columns=None):
+        """decrypts a whole set of rows at once, such as the results of a query, one column at a time
+            @param rows (tuple[]) - the rows to be decrypted
+            @param columns (int[]) - indexes of the columns to decrypt, all columns if None
+            @return (tuple[]) - the rows with the selected columns decrypted
+        """
+
+        return translate_rows(rows, columns, self.cipher.decrypt_many)
+
     def get_input(self, prompt):
         """gets input for the insert function, and enrypts the info
             @param prompt(string) - prompt for the user
@@ -87,6 +410,8 @@ class AccountDatabase:
             @param prompt (string) - the prompt for the user
             @return (string) - the password, encrypted
         """
+        import passwords
+
         password = passwords.genPass()
         return self.encode(password)
 
@@ -102,79 +427,280 @@ class AccountDatabase:
         else:
             return newInfo
 
-    def search(self, prompt="Search for: "):
+    def search(self, prompt="Search for: ", pageSize=20):
         """searches the database for the target.  Searches the name, category, website, tags.
             Prompts the user for the search term.
-            recursively display the results of the search until the search has one match
+            display the results of the search a page at a time until the user picks one,
+            or search again until the search has one match
+            a term ending in "*" picks from the account names that best match it instead, see suggest
             @param prompt (string) - text to prompt for search
+            @param pageSize (int) - number of matches shown at a time
             @return (string) the name of the account that we searched for
         """
 
-        matches = []  # name of search matches
-        decodedMatches = []
-        sortedMatches = []
-        matchCount = 0  # number of search matches
+        searchPrompt = prompt
+        while True:
+            # SEARCH TARGET, ENCRYPTED SO WE DON'T HAVE TO DECRYPT EACH CATEGORY
+            term = raw_input(searchPrompt)
+            searchPrompt = prompt
+
+            # DECIDE WHAT VALUE TO RETURN
+            if term == "":
+                return ""
+
+            # A TERM ENDING IN * ONLY MATCHES ACCOUNT NAMES, AND IS LOOKED UP IN MEMORY
+            if term.endswith("*") and len(term) > 1:
+                term = term[:-1]
+                page, nextKey = self.suggest(term, pageSize), None
+            else:
+                page, nextKey = self.find_page(self.encode(term), limit=pageSize)
+            target = self.encode(term)
+
+            if len(page) == 1 and nextKey is None:
+                return self.count_use(self.encode(page[0]))
+
+            elif not page:
+                searchPrompt = "No matches for search '%s'.\nSearch for: " % self.decode(target)
+                continue
+
+            # PRINTS OUT THE MATCHES A PAGE AT A TIME UNTIL THE USER PICKS ONE OR SEARCHES AGAIN
+            after = None
+            previous = []  # where each of the earlier pages started
+            while True:
+                # PAGES ARE NOT IN ALPHABETICAL ORDER ACROSS EACH OTHER, SEE find_page, SO THE ORDER IS SPELLED OUT
+                order = " (most used first, A to Z within a page)" if nextKey is not None or previous else ""
+                print("Search results for '%s', page %d%s:" % (self.decode(target), len(previous) + 1, order))
+                for account in range(0, len(page)):
+                    print("%d) %s" % (account + 1, page[account]))
+
+                choices = "Number of correct account"
+                if nextKey is not None:
+                    choices += ", 'n' for more results"
+                if previous:
+                    choices += ", 'p' for the previous results"
+                account = raw_input("\n%s or just press enter to search again: " % choices).lower()
+
+                if account.isdigit() and 1 <= int(account) <= len(page):
+                    return self.count_use(self.encode(page[int(account) - 1]))
+                elif account == "n" and nextKey is not None:
+                    previous.append(after)
+                    after = nextKey
+                elif account == "p" and previous:
+                    after = previous.pop()
+                else:
+                    break
+
+                page, nextKey = self.find_page(target, after, pageSize)
+
+    def load_name_index(self, chunkSize=10000):
+        """decrypts every account name into an in-memory index for typeahead. once loaded, the index is kept
+            up to date by the changes made through this object, but not by other connections to the database
+            @param chunkSize (int) - number of names read and decrypted at a time
+            @return (int) - number of names in the index
+        """
+
+        names = []
+        rows = self.dataBase.execute("SELECT NAME FROM accounts;")
+        try:
+            chunk = rows.fetchmany(chunkSize)
+            while chunk:
+                names.extend(row[0] for row in self.decode_rows(chunk))
+                chunk = rows.fetchmany(chunkSize)
+        finally:
+            rows.close()
+
+        self.nameIndex = NameIndex(names)
+        return len(self.nameIndex)
+
+    def suggest(self, term, limit=10):
+        """finds the account names that best match a partial name, without going to the database.
+            names starting with the term come first, then names containing it, then names with its letters in order
+            @param term (string) - decrypted start or part of an account name, in any case
+            @param limit (int) - most names returned
+            @return (string[]) - decrypted names, best match first
+        """
+
+        if self.nameIndex is None:
+            self.load_name_index()
+        return self.nameIndex.rank(term, limit)
+
+    def find_page(self, target, after=None, limit=20):
+        """finds one page of the accounts matching a search term without prompting the user.
+            the most used accounts (SEARCH_COUNT) come first. pages are found with keyset pagination on
+            (SEARCH_COUNT, encrypted NAME), so every page costs the same however many accounts match.
+            results are kept in the search cache until an insert, change, delete or written use could affect them
+            @param target (string) - encrypted search term, "all" (encrypted) lists every account
+            @param after (tuple) - (search count, encrypted name) the page starts after, None for the first page
+            @param limit (int) - most matches on the page
+            @return (tuple, tuple) - decrypted names on the page, most used first and then without regard to case,
+                and the key of the next page (None if this is the last page)
+        """
 
-        # RECURSIVELY SEARCH THE DATABASE FOR A TERM
-        target = self.encode(raw_input(prompt))  # search target, encrypted so we don't have to decrypt each category
+        # BOTH THE INDEX AND LIKE IGNORE CASE, SO TERMS THAT ONLY DIFFER IN CASE SHARE A RESULT
+        if after is not None:
+            after = tuple(after)
+        key = (target.lower(), after, limit)
+        result = self.searchCache.get(key)
+        if result is not None:
+            return result
 
         # ALLOW USER TO LIST ALL ACCOUNTS BY SEARCHING "all"
-        if target.lower() == self.encode("all").lower():
-            # self.db.execute("SELECT NAME, DESCRIPTION, SEARCH_TAGS FROM accounts ORDER BY NAME ASC;")
-            results = self.db.execute("SELECT NAME FROM accounts ORDER BY NAME;")
+        if key[0] == self.encode("all").lower():
+            condition = "1"
+            matchParameters = ()
+
+        # SEARCHES THE FULL TEXT INDEX FOR THE TARGET TERM. TRIGRAMS NEED AT LEAST 3 CHARACTERS
+        elif self.searchIndex and len(target) >= 3:
+            condition = "ID IN (SELECT rowid FROM accounts_search WHERE accounts_search MATCH ?)"
+            matchParameters = ('"%s"' % target.replace('"', '""'),)
 
         # SEARCHES ACCOUNTS FOR THE TARGET TERM
         else:
             searchTerm = "%" + target + "%"
-            results = self.db.execute("SELECT NAME FROM accounts WHERE NAME LIKE ? OR DESCRIPTION LIKE ? "
-                                      "OR SEARCH_TAGS LIKE ? ORDER BY NAME;", (searchTerm, searchTerm, searchTerm))
+            condition = "(NAME LIKE ? OR DESCRIPTION LIKE ? OR SEARCH_TAGS LIKE ?)"
+            matchParameters = (searchTerm, searchTerm, searchTerm)
 
-        results = self.db.fetchall()
-        for row in results:
-            matches.append(row[0])
-            matchCount += 1
+        select = "SELECT NAME, SEARCH_COUNT FROM accounts WHERE %s AND " + condition + " ORDER BY %s LIMIT ?"
+        if after is None:
+            self.db.execute(select % ("1", "SEARCH_COUNT DESC, NAME") + ";", matchParameters + (limit + 1,))
 
-        # DECIDE WHAT VALUE TO RETURN
-        if matchCount == 1:
-            return matches[0]
+        # THE REST OF THE ACCOUNTS WITH THE SAME COUNT, THEN THE ACCOUNTS WITH SMALLER COUNTS,
+        # EACH A RANGE OF THE accounts_search_count INDEX, WHERE ONE CONDITION WITH AN OR WOULD SCAN IT FROM THE START
+        else:
+            self.db.execute("SELECT * FROM (%s) UNION ALL SELECT * FROM (%s) ORDER BY SEARCH_COUNT DESC, NAME LIMIT ?;"
+                            % (select % ("SEARCH_COUNT = ? AND NAME > ?", "NAME"),
+                               select % ("SEARCH_COUNT < ?", "SEARCH_COUNT DESC, NAME")),
+                            after + matchParameters + (limit + 1, after[0]) + matchParameters + (limit + 1, limit + 1))
 
-        elif target == "":
-            return ""
+        # ONE EXTRA ROW IS READ TO KNOW IF THERE IS ANOTHER PAGE
+        rows = self.db.fetchall()
+        nextKey = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            nextKey = (rows[-1][1], rows[-1][0])
 
-        elif matchCount > 1:
-            print("%d search results for '%s':" % (matchCount, self.decode(target)))
+        # SORT THE ACCOUNTS
+        decodedMatches = self.decode_rows(rows, [0])
+        result = (tuple(name for name, count in sorted(decodedMatches, key=lambda row: (-row[1], row[0].lower()))),
+                  nextKey)
 
-            # PRINTS OUT THE MATCHES FOR THE SEARCH TERM
-            decodedMatches = []
-            for account in matches:
-                decodedMatches.append(self.decode(account))
+        self.searchCache.put(key, result)
+        return result
 
-            # SORT THE ACCOUNTS
-            sortedMatches = sorted(decodedMatches, key=str.lower)
+    def iter_matches(self, target, pageSize=100):
+        """lazily finds every account matching a search term, reading a page at a time
+            @param target (string) - encrypted search term, "all" (encrypted) lists every account
+            @param pageSize (int) - number of matches read at a time
+            @return (generator) - decrypted names of the matching accounts
+        """
 
-            for account in range(0, matchCount):
-                print("%d) %s" % (account + 1, sortedMatches[account]))
+        page, nextKey = self.find_page(target, limit=pageSize)
+        while True:
+            for name in page:
+                yield name
+            if nextKey is None:
+                return
+            page, nextKey = self.find_page(target, nextKey, pageSize)
 
-            account = raw_input("\nNumber of correct account or just press enter to search again: ")
-            if account.isdigit() and 1 <= int(account) <= matchCount:
-                return self.encode(sortedMatches[int(account) - 1])
-            else:
-                return self.search(prompt=prompt)
+    def _invalidate_search(self, fields):
+        """drops the cached search results that the changed accounts could be part of.
+            a result is dropped if its term is in the old or new name, description or search tags of an
+            account, if it lists all accounts, or if its term has LIKE wildcards in it
+            @param fields (string[]) - encrypted names, descriptions and search tags before and after the change
+        """
 
-        else:
-            return self.search(prompt=("No matches for search '%s'.\nSearch for: " % self.decode(target)))
+        if not self.searchCache.entries:
+            return
+
+        fields = [field.lower() for field in fields if field]
+        everything = self.encode("all").lower()
+
+        # COMPARING EVERY KEY WITH EVERY FIELD IS SLOWER THAN STARTING OVER FOR LARGE CHANGES
+        if len(fields) > 300:
+            self.searchCache.clear()
+            return
+
+        self.searchCache.invalidate(lambda key: key[0] == everything or "%" in key[0] or "_" in key[0] or
+                                    any(key[0] in field for field in fields))
+
+    def _search_fields(self, names):
+        """reads the searched fields of accounts, for invalidating the search cache before they change
+            @param names (string[]) - encrypted names of the accounts
+            @return (string[]) - name, description and search tags of each account that exists
+        """
+
+        fields = []
+        if not self.searchCache.entries:
+            return fields
+
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            self.db.execute("SELECT NAME, DESCRIPTION, SEARCH_TAGS FROM accounts WHERE NAME IN (%s);" %
+                            ",".join("?" * len(chunk)), chunk)
+            for row in self.db.fetchall():
+                fields.extend(row)
+        return fields
 
     def get_tasks(self):
         """function to search the database for accounts with tasks to be completed.
             this will print out the names and pending tasks of all accounts where the task category is not blank."""
 
-        self.db.execute("SELECT NAME, PENDING_TASKS FROM accounts;")
-        row = self.db.fetchone()
+        for name, tasks in self.iter_tasks():
+            print("Name: %s\nTasks: %s\n" % (name, tasks))
 
-        while row is not None:
-            if row[1] != "":
-                print("Name: %s\nTasks: %s\n" % (self.decode(row[0]), self.decode(row[1])))
-            row = self.db.fetchone()
+    def iter_tasks(self, chunkSize=100):
+        """lazily finds the accounts with tasks to be completed, through the partial index of pending tasks
+            @param chunkSize (int) - number of accounts read and decrypted at a time
+            @return (generator) - (name, pending tasks) of each account, decrypted
+        """
+
+        # A CURSOR OF ITS OWN, SO OTHER QUERIES CAN RUN WHILE THE GENERATOR IS PAUSED
+        rows = self.dataBase.cursor()
+        try:
+            rows.execute("SELECT NAME, PENDING_TASKS FROM accounts WHERE PENDING_TASKS != '';")
+            chunk = rows.fetchmany(chunkSize)
+            while chunk:
+                for row in self.decode_rows(chunk):
+                    yield row
+                chunk = rows.fetchmany(chunkSize)
+        finally:
+            rows.close()
+
+    def stale_accounts(self, olderThan, chunkSize=100):
+        """lazily finds the accounts that have not been changed in a while, oldest first,
+            through a range of the DATE_MODIFIED_TS index. only the accounts found are decrypted
+            @param olderThan (float) - days since the account was last changed
+            @param chunkSize (int) - number of accounts read and decrypted at a time
+            @return (generator) - (name, date modified) of each account, decrypted
+        """
+
+        # A CURSOR OF ITS OWN, SO OTHER QUERIES CAN RUN WHILE THE GENERATOR IS PAUSED
+        rows = self.dataBase.cursor()
+        try:
+            rows.execute("SELECT NAME, DATE_MODIFIED FROM accounts WHERE DATE_MODIFIED_TS < ? "
+                         "ORDER BY DATE_MODIFIED_TS;", (time.time() - olderThan * 86400,))
+            chunk = rows.fetchmany(chunkSize)
+            while chunk:
+                for row in self.decode_rows(chunk):
+                    yield row
+                chunk = rows.fetchmany(chunkSize)
+        finally:
+            rows.close()
+
+    def reused_passwords(self):
+        """finds the accounts that share a password with another account, with one GROUP BY over the fingerprint
+            index instead of decrypting and comparing every password
+            @return (string[][]) - decrypted names of the accounts sharing each password, largest groups first
+        """
+
+        self.db.execute("SELECT PASSWORD_FINGERPRINT, NAME FROM accounts WHERE PASSWORD_FINGERPRINT IN "
+                        "(SELECT PASSWORD_FINGERPRINT FROM accounts WHERE PASSWORD_FINGERPRINT IS NOT NULL "
+                        "GROUP BY PASSWORD_FINGERPRINT HAVING COUNT(*) > 1);")
+        groups = {}
+        for fingerprint, name in self.decode_rows(self.db.fetchall(), [1]):
+            groups.setdefault(fingerprint, []).append(name)
+        return sorted((sorted(names, key=lambda name: name.lower()) for names in groups.values()),
+                      key=lambda names: (-len(names), names[0].lower()))
 
     def modify(self, name):
         """modifies an account based upon the target term.
@@ -183,117 +709,468 @@ class AccountDatabase:
             @return (string) - name of the account that was just changed
         """
 
-        self.displayAccount(name)
+        import passwords
 
-        self.db.execute("SELECT NAME, DESCRIPTION, EMAIL, USERNAME, PASSWORD, ACCESS_CODE, WEBSITE,"
-                        "ADDRESS, PHONE_NUMBER, MISCELLANEOUS_INFO, PENDING_TASKS, SEARCH_TAGS "
-                        "FROM accounts WHERE NAME=?;", (name,))
-        oldInfo = self.db.fetchone()
+        self.displayAccount(name)
 
         # GETS THE USER INPUT FOR THE CATEGORIES TO CHANGE
         print("Please enter new information information for '%s'." % self.decode(name))
-        newName = self.updateInfo(self.get_input("Name: "), oldInfo[0])
-        description = self.updateInfo(self.get_input("Description: "), oldInfo[1])
-        email = self.updateInfo(self.get_input("Email: "), oldInfo[2])
-        username = self.updateInfo(self.get_input("Username: "), oldInfo[3])
-        password = self.updateInfo(self.encode(passwords.genPass()), oldInfo[4])
-        code = self.updateInfo(self.get_input("Access Code: "), oldInfo[5])
-        website = self.updateInfo(self.get_input("Website: "), oldInfo[6])
-        address = self.updateInfo(self.get_input("Address: "), oldInfo[7])
-        phone = self.updateInfo(self.get_input("Phone Number: "), oldInfo[8])
-        info = self.updateInfo(self.get_input("Miscellaneous Info: "), oldInfo[9])
-        tasks = self.updateInfo(self.get_input("Pending tasks: "), oldInfo[10])
-        tags = self.updateInfo(self.get_input("Search tags: "), oldInfo[11])
-        date = self.encode(datetime.date.today().strftime("%b %d, %Y"))
+        changes = {}
+        for column, prompt in [("NAME", "Name: "), ("DESCRIPTION", "Description: "), ("EMAIL", "Email: "),
+                               ("USERNAME", "Username: "), ("PASSWORD", None), ("ACCESS_CODE", "Access Code: "),
+                               ("WEBSITE", "Website: "), ("ADDRESS", "Address: "), ("PHONE_NUMBER", "Phone Number: "),
+                               ("MISCELLANEOUS_INFO", "Miscellaneous Info: "), ("PENDING_TASKS", "Pending tasks: "),
+                               ("SEARCH_TAGS", "Search tags: ")]:
+            changes[column] = passwords.genPass() if prompt is None else raw_input(prompt)
 
         # ACTUALLY UPDATES THE DATA
-        self.db.execute("UPDATE accounts SET NAME = ?, DESCRIPTION = ?, EMAIL = ?, USERNAME = ?, PASSWORD = ?,"
-                        "ACCESS_CODE = ?, WEBSITE = ?, ADDRESS = ?, PHONE_NUMBER = ?, MISCELLANEOUS_INFO = ?, "
-                        "PENDING_TASKS = ?, SEARCH_TAGS = ?, DATE_MODIFIED = ? WHERE NAME = ?;",
-                        (newName, description, email, username, password, code, website,
-                         address, phone, info, tasks, tags, date, name))
-
-        self.dataBase.commit()
+        self.update_accounts({self.decode(name): changes})
         return name
 
     def insert(self):
         """inserts a new account into the database, prompts user for details
-            @return (string) - name of the account that was just inserted
+            @return (string) - name of the account that was just inserted, "" if nothing was inserted
         """
 
+        import passwords
+
         print("Please enter some information about the account.")
-        name = self.get_input("Name: ")
-        description = self.get_input("Description: ")
-        email = self.get_input("Email: ")
-        username = self.get_input("Username: ")
-        password = self.get_password()
-        code = self.get_input("Access Code: ")
-        website = self.get_input("Website: ")
-        address = self.get_input("Address: ")
-        phone = self.get_input("Phone Number: ")
-        info = self.get_input("Misc Info: ")
-        tasks = self.get_input("Pending Tasks: ")
-        tags = self.get_input("Search Tags: ")
-        date = self.encode(datetime.date.today().strftime("%b %d, %Y"))
-
-        # ********************************************************
-        # CHECK TO SEE IF THE NAME ALREADY EXISTS BEFORE INSERTING
-        # ********************************************************
+
+        # THE NAME IS CHECKED BEFORE ASKING FOR THE REST, AN ACCOUNT NEEDS ONE AND IT HAS TO BE UNIQUE
+        name = raw_input("Name: ")
+        if name == "":
+            print("No name was entered, the account was not added.")
+            return ""
+        if self.db.execute("SELECT 1 FROM accounts WHERE NAME = ?;", (self.encode(name),)).fetchone() is not None:
+            print("'%s' already exists, the account was not added." % name)
+            return ""
+
+        account = {"NAME": name}
+        for column, prompt in [("DESCRIPTION", "Description: "), ("EMAIL", "Email: "),
+                               ("USERNAME", "Username: "), ("PASSWORD", None), ("ACCESS_CODE", "Access Code: "),
+                               ("WEBSITE", "Website: "), ("ADDRESS", "Address: "), ("PHONE_NUMBER", "Phone Number: "),
+                               ("MISCELLANEOUS_INFO", "Misc Info: "), ("PENDING_TASKS", "Pending Tasks: "),
+                               ("SEARCH_TAGS", "Search Tags: ")]:
+            account[column] = passwords.genPass() if prompt is None else raw_input(prompt)
 
         # INSERT THE INFORMATION
-        exists = False
-        if not exists:
-            self.db.execute("INSERT INTO accounts "
-                            "(NAME, DESCRIPTION, EMAIL, USERNAME, PASSWORD, ACCESS_CODE, WEBSITE, ADDRESS, PHONE_NUMBER, "
-                            "MISCELLANEOUS_INFO, PENDING_TASKS, SEARCH_TAGS, DATE_MODIFIED) "
-                            "VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?);",
-                            (name, description, email, username, password, code, website,
-                             address, phone, info, tasks, tags, date))
+        try:
+            self.add_accounts([account])
+        except (ValueError, sqlite3.IntegrityError) as error:
+            print("The account was not added: %s" % error)
+            return ""
+        return self.encode(account["NAME"])
+
+    def add_accounts(self, accounts, batchSize=1000):
+        """inserts accounts without prompting the user, all in a single transaction.
+            rows are encrypted in batches and written with one prepared statement through executemany.
+            if any account cannot be inserted (for example its name is taken) none of them are
+            @param accounts (dict iterable) - decrypted information of each account, keyed by column name
+                ("NAME", "PASSWORD", ...). NAME is required, missing columns are left blank.
+                DATE_MODIFIED is set to today
+            @param batchSize (int) - number of accounts encrypted and written at a time
+            @return (int) - number of accounts inserted
+        """
+
+        columns = self.backupColumns
+        insertSql = "INSERT INTO accounts (%s, DATE_MODIFIED_TS, PASSWORD_FINGERPRINT) VALUES (%s);" % (
+            ", ".join(columns), ",".join("?" * (len(columns) + 2)))
+        date = datetime.date.today().strftime("%b %d, %Y")
+        timestamp = int(time.time())
+
+        count = 0
+        names = []  # THE NAME INDEX IS ONLY CHANGED ONCE THE ACCOUNTS ARE COMMITTED
+        try:
+            batch = []
+            for account in accounts:
+                account = self._account_columns(account)
+                if not account.get("NAME"):
+                    raise ValueError("every account needs a NAME")
+                account["DATE_MODIFIED"] = date
+                batch.append(tuple(account.get(column, "") for column in columns))
+                if self.nameIndex is not None:
+                    names.append(account["NAME"])
+
+                if len(batch) >= batchSize:
+                    self._insert_batch(insertSql, batch, timestamp)
+                    count += len(batch)
+                    batch = []
+
+            if batch:
+                self._insert_batch(insertSql, batch, timestamp)
+                count += len(batch)
+
+        except BaseException:
+            self.dataBase.rollback()
+            raise
 
         self.dataBase.commit()
-        return name
+        for name in names:
+            self.nameIndex.add(name)
+        self.notify_writes(count)
+        return count
+
+    def update_accounts(self, changes, batchSize=1000):
+        """changes accounts without prompting the user, all in a single transaction.
+            a column that is missing from the changes, or set to "same" or "keep", keeps its old value,
+            the same as when modifying an account from the menu
+            @param changes (dict) - decrypted name of each account to change -> dict of its new decrypted
+                information, keyed by column name. DATE_MODIFIED is set to today
+            @param batchSize (int) - number of accounts encrypted and written at a time
+            @return (int) - number of accounts that were found and changed
+        """
+
+        columns = self.backupColumns
+
+        # A NULL PARAMETER KEEPS THE OLD VALUE, SO ONE PREPARED STATEMENT COVERS EVERY COMBINATION OF CHANGES
+        # A BLANK PASSWORD GIVES A BLANK FINGERPRINT, WHICH IS STORED AS NULL
+        updateSql = ("UPDATE accounts SET %s, DATE_MODIFIED_TS = ?, "
+                     "PASSWORD_FINGERPRINT = NULLIF(IFNULL(?, PASSWORD_FINGERPRINT), '') WHERE NAME = ?;" %
+                     ", ".join("%s = IFNULL(?, %s)" % (column, column) for column in columns))
+        date = datetime.date.today().strftime("%b %d, %Y")
+        timestamp = int(time.time())
+
+        count = 0
+        renames = []  # (OLD NAME, NEW NAME), APPLIED TO THE NAME INDEX AND USE COUNTS ONCE THE CHANGES ARE COMMITTED
+        try:
+            batch = []
+            for name, account in changes.items():
+                account = self._account_columns(account)
+                account["DATE_MODIFIED"] = date
+                row = []
+                for column in columns:
+                    value = account.get(column)
+                    if value is not None and value.lower() in ("same", "keep"):
+                        value = None
+                    row.append(value)
+                batch.append(tuple(row) + (name,))
+                if row[0] is not None and row[0] != name:
+                    renames.append((name, row[0]))
+
+                if len(batch) >= batchSize:
+                    count += self._update_batch(updateSql, batch, timestamp)
+                    batch = []
+
+            if batch:
+                count += self._update_batch(updateSql, batch, timestamp)
+
+        except BaseException:
+            self.dataBase.rollback()
+            raise
+
+        self.dataBase.commit()
+        for oldName, newName in renames:
+            if self.nameIndex is not None:
+                self.nameIndex.rename(oldName, newName)
+
+            # USES KEPT IN MEMORY ARE WRITTEN BY NAME, SO THEY MOVE TO THE NEW NAME OR THEY WOULD BE LOST
+            oldName, newName = self.cipher.encrypt_many([oldName, newName])
+            uses = self.searchCounts.pop(oldName, 0)
+            if uses:
+                self.searchCounts[newName] = self.searchCounts.get(newName, 0) + uses
+        self.notify_writes(count)
+        return count
+
+    def _insert_batch(self, insertSql, batch, timestamp):
+        """encrypts and inserts a batch of accounts for add_accounts, without committing
+            @param insertSql (string) - statement that inserts a row in backup column order, then DATE_MODIFIED_TS
+                and PASSWORD_FINGERPRINT
+            @param batch (tuple[]) - decrypted rows in backup column order
+            @param timestamp (int) - DATE_MODIFIED_TS of the accounts
+        """
+
+        rows = self.encode_rows(batch)
+        passwordIndex = self.backupColumns.index("PASSWORD")
+        self.db.executemany(insertSql, [row + (timestamp, self.password_fingerprint(plain[passwordIndex]))
+                                        for plain, row in zip(batch, rows)])
+        self._invalidate_search([field for row in rows for field in (row[0], row[1], row[11])])
+
+    def _update_batch(self, updateSql, batch, timestamp):
+        """encrypts and applies a batch of changes for update_accounts, without committing
+            @param updateSql (string) - statement that updates a row by name, then DATE_MODIFIED_TS and the fingerprint
+            @param batch (tuple[]) - decrypted new values in backup column order, None to keep, then the name
+            @param timestamp (int) - DATE_MODIFIED_TS of the accounts
+            @return (int) - number of accounts changed
+        """
+
+        rows = self.encode_rows(batch)
+        fields = self._search_fields([row[-1] for row in rows])
+        passwordIndex = self.backupColumns.index("PASSWORD")
+        fingerprints = [None if plain[passwordIndex] is None else self.password_fingerprint(plain[passwordIndex]) or ""
+                        for plain in batch]
+        self.db.executemany(updateSql, [row[:-1] + (timestamp, fingerprint, row[-1])
+                                        for row, fingerprint in zip(rows, fingerprints)])
+        self._invalidate_search(fields + [field for row in rows for field in (row[0], row[1], row[11])])
+        return self.db.rowcount
+
+    def _account_columns(self, account):
+        """checks the keys of an account dict passed to add_accounts or update_accounts
+            @param account (dict) - information of an account keyed by column name, in any case
+            @return (dict) - copy of the account keyed by upper case column name
+        """
+
+        account = dict((column.upper(), value) for column, value in account.items())
+        for column in account:
+            if column not in self.backupColumns:
+                raise ValueError("'%s' is not a column of an account" % column)
+        return account
 
     def remove(self, name):
         """removes the account with the matching target
             @param name (string) - encrypted name of the account to be deleted. Assumed to already be in table
         """
 
-        self.db.execute("DELETE FROM accounts WHERE NAME = ?;", (name,))
+        self.delete_account(name)
         print("'%s' deleted" % self.decode(name))
+
+    def delete_account(self, name):
+        """removes an account without printing anything
+            @param name (string) - encrypted name of the account to be deleted
+            @return (bool) - True if the account existed and was deleted
+        """
+
+        self._invalidate_search(self._search_fields([name]))
+        self.db.execute("DELETE FROM accounts WHERE NAME = ?;", (name,))
+        deleted = self.db.rowcount > 0
         self.dataBase.commit()
+        if deleted and self.nameIndex is not None:
+            self.nameIndex.remove(self.decode(name))
+        if deleted:
+            # AN ACCOUNT ADDED LATER WITH THE SAME NAME DOES NOT START WITH THE DELETED ONE'S USES
+            self.searchCounts.pop(name, None)
+            self.notify_writes(1)
+        return deleted
 
-    def backup(self):
-        """performs a backup of the database to the backup file .csv"""
+    def backup(self, incremental=False, chunkSize=1000, bufferSize=65536):
+        """performs a backup of the database to the backup file .csv
+            rows are read in chunks with fetchmany and written through a buffered file, so the whole
+            database is never held in memory.
+            an incremental backup appends only the accounts inserted or changed since the last backup,
+            found through the CHANGE_ID high water mark stored in the settings table. deleted accounts
+            are not removed from the file, and later rows for the same name replace earlier ones.
+            if there has never been a backup, or the backup file is missing, a full backup is done instead.
+            @param incremental (bool) - if True, only append the accounts changed since the last backup
+            @param chunkSize (int) - number of rows read and written at a time
+            @param bufferSize (int) - size in bytes of the write buffer
+            @return (int) - number of accounts written to the backup file
+        """
 
-        self.db.execute("SELECT * FROM accounts ORDER BY NAME ASC;")
+        lastBackup = self.get_setting("backup_change_id")
+        if lastBackup is None or not os.path.isfile(self.backupFile):
+            incremental = False
 
-        # ATTEMPTS TO DELETE BACKUP FILE INSTEAD OF ADDING TO IT
-        if os.path.isdir(self.backupFile):
-            os.remove(self.backupFile)
+        # EVERYTHING UP TO THE CURRENT VALUE OF THE COUNTER IS IN THIS BACKUP
+        highWaterMark = self.get_setting("change_counter", 0)
+
+        columns = ", ".join(self.backupColumns)
+        rows = self.dataBase.cursor()
+        if incremental:
+            rows.execute("SELECT %s FROM accounts WHERE CHANGE_ID > ? ORDER BY CHANGE_ID ASC;" % columns,
+                         (lastBackup,))
+        else:
+            rows.execute("SELECT %s FROM accounts ORDER BY NAME ASC;" % columns)
+
+            # DELETES THE OLD BACKUP FILE INSTEAD OF ADDING TO IT
+            if os.path.isfile(self.backupFile):
+                os.remove(self.backupFile)
 
         # OPENS A .CSV FILE IN PYTHON AND WRITES TO IT
-        with open(self.backupFile, 'wb') as csvfile:
+        count = 0
+        with open_csv(self.backupFile, "a" if incremental else "w", bufferSize) as csvfile:
             accountWriter = csv.writer(csvfile)
 
-            newRow = ["NAME", "DESCRIPTION", "EMAIL", "USERNAME", "PASSWORD", "CODE", "WEBSITE",
-                      "ADDRESS", "PHONE NUMBER", "MISCELLANEOUS INFO", "PENDING TASKS", "SEARCH TAGS", "DATE MODIFIED"]
+            if not incremental:
+                accountWriter.writerow(self.backupHeader)
 
-            accountWriter.writerow(newRow)
+            chunk = rows.fetchmany(chunkSize)
+            while chunk:
+                accountWriter.writerows(self.decode_rows(chunk))
+                count += len(chunk)
+                chunk = rows.fetchmany(chunkSize)
 
-            row = self.db.fetchone()
-            while row is not None:
-                newRow = []
-                for column in range(1, len(row)):
-                    element = self.decode(str(row[column]))
-                    newRow.append(element)
-                accountWriter.writerow(newRow)
-                row = self.db.fetchone()
+        rows.close()
 
-        csvfile.close()
+        # REMEMBERS HOW FAR THIS BACKUP GOT FOR THE NEXT INCREMENTAL BACKUP
+        self.set_setting("backup_change_id", highWaterMark)
+        self.dataBase.commit()
 
         # THE FOLLOWING LINE OPENS THE BACKUP FILE THAT WAS JUST CREATED
         # os.system('start %s' % backupFile)
 
+        return count
+
+    def import_csv(self, path, conflict="skip", batchSize=1000):
+        """restores accounts from a .csv file in the format written by backup.
+            rows are read and encrypted in batches and written with executemany in a single transaction,
+            so either the whole file is imported or none of it is.
+            rows of an incremental backup are applied in order, so later rows for a name win with "overwrite"
+            @param path (string) - file path of the .csv file
+            @param conflict (string) - what to do when an account with the same name already exists.
+                "skip" keeps the existing account, "overwrite" replaces its information,
+                "rename" imports the row as "name (2)", "name (3)", ...
+            @param batchSize (int) - number of rows encrypted and written at a time
+            @return (dict) - number of accounts "inserted", "updated", "renamed" and "skipped"
+        """
+
+        if conflict not in ("skip", "overwrite", "rename"):
+            raise ValueError("conflict must be 'skip', 'overwrite' or 'rename', not '%s'" % conflict)
+
+        counts = {"inserted": 0, "updated": 0, "renamed": 0, "skipped": 0}
+        # DATE_MODIFIED_TS COMES FROM THE DATE IN THE FILE, SO RESTORED ACCOUNTS KEEP THEIR AGE
+        columns = self.backupColumns + ["DATE_MODIFIED_TS", "PASSWORD_FINGERPRINT"]
+        insertSql = "INSERT INTO accounts (%s) VALUES (%s);" % (", ".join(columns), ",".join("?" * len(columns)))
+        updateSql = "UPDATE accounts SET %s WHERE NAME = ?;" % ", ".join(
+            "%s = ?" % column for column in columns[1:])
+
+        # ENCRYPTED NAMES ALREADY IN THE DATABASE, PLUS EVERY NAME IMPORTED SO FAR
+        self.db.execute("SELECT NAME FROM accounts;")
+        names = set(row[0] for row in self.db.fetchall())
+
+        try:
+            with open_csv(path, "r") as csvfile:
+                accountReader = csv.reader(csvfile)
+
+                header = next(accountReader, None)
+                if header != self.backupHeader:
+                    raise ValueError("'%s' is not an account backup file" % path)
+
+                batch = []
+                for row in accountReader:
+                    if len(row) != len(self.backupHeader):
+                        raise ValueError("line %d of '%s' has %d columns, expected %d" %
+                                         (accountReader.line_num, path, len(row), len(self.backupHeader)))
+                    batch.append(row)
+                    if len(batch) >= batchSize:
+                        self._import_batch(batch, names, conflict, insertSql, updateSql, counts)
+                        batch = []
+                self._import_batch(batch, names, conflict, insertSql, updateSql, counts)
+
+        except BaseException:
+            self.dataBase.rollback()
+            raise
+
+        finally:
+            # A RESTORE CAN CHANGE ANY NUMBER OF ACCOUNTS, SO THE CACHE STARTS OVER
+            self.searchCache.clear()
+
+        self.dataBase.commit()
+        if self.nameIndex is not None:
+            self.load_name_index()
+        self.notify_writes(counts["inserted"] + counts["updated"] + counts["renamed"])
+        return counts
+
+    def _import_batch(self, batch, names, conflict, insertSql, updateSql, counts):
+        """encrypts a batch of rows from import_csv and writes them without committing
+            @param batch (string[][]) - decrypted rows in backup column order
+            @param names (set) - encrypted names already taken, updated with the names inserted
+            @param conflict (string) - "skip", "overwrite" or "rename"
+            @param insertSql (string) - statement that inserts a row
+            @param updateSql (string) - statement that updates a row by name
+            @param counts (dict) - running totals, updated in place
+        """
+
+        inserts = []
+        updates = []
+        renamed = 0
+        dateIndex = self.backupColumns.index("DATE_MODIFIED")
+        passwordIndex = self.backupColumns.index("PASSWORD")
+        for plain, row in zip(batch, self.encode_rows(batch)):
+            row = row + (date_timestamp(plain[dateIndex]), self.password_fingerprint(plain[passwordIndex]))
+            if row[0] not in names:
+                inserts.append(row)
+            elif conflict == "skip":
+                counts["skipped"] += 1
+                continue
+            elif conflict == "overwrite":
+                updates.append(row[1:] + (row[0],))
+                continue
+            else:
+                copy = 2
+                newName = self.encode("%s (%d)" % (plain[0], copy))
+                while newName in names:
+                    copy += 1
+                    newName = self.encode("%s (%d)" % (plain[0], copy))
+                inserts.append((newName,) + row[1:])
+                renamed += 1
+            names.add(inserts[-1][0])
+
+        # INSERTS FIRST, SO A NAME ADDED AND THEN CHANGED IN THE SAME BATCH ENDS UP WITH THE LATER ROW
+        if inserts:
+            self.db.executemany(insertSql, inserts)
+            counts["inserted"] += len(inserts) - renamed
+            counts["renamed"] += renamed
+        if updates:
+            self.db.executemany(updateSql, updates)
+            counts["updated"] += len(updates)
+
+    def notify_writes(self, count):
+        """tells the write listeners that accounts were changed
+            @param count (int) - number of accounts changed, nothing is called for 0
+        """
+
+        if count:
+            for listener in self.writeListeners:
+                listener(count)
+
+    def count_use(self, name):
+        """counts a use of an account towards its SEARCH_COUNT.
+            uses are kept in memory and written all at once by flush_search_counts when enough of them
+            have built up, when they have been kept for long enough, or when the database is closed
+            @param name (string) - encrypted name of the account
+            @return (string) - the name, so a lookup can be returned through it
+        """
+
+        self.searchCounts[name] = self.searchCounts.get(name, 0) + 1
+        self.pendingSearchCounts += 1
+        if (self.pendingSearchCounts >= self.searchCountFlushSize or
+                time.time() - self.lastSearchCountFlush >= self.searchCountFlushInterval):
+            self.flush_search_counts()
+        return name
+
+    def flush_search_counts(self):
+        """adds the uses kept in memory to SEARCH_COUNT with one batched UPDATE.
+            the order of search results changes with the counts, so the search cache is cleared
+            @return (int) - number of accounts whose count was written
+        """
+
+        self.lastSearchCountFlush = time.time()
+        if not self.searchCounts:
+            return 0
+
+        counts = self.searchCounts
+        self.searchCounts = {}
+        self.pendingSearchCounts = 0
+        self.db.executemany("UPDATE accounts SET SEARCH_COUNT = SEARCH_COUNT + ? WHERE NAME = ?;",
+                            [(count, name) for name, count in counts.items()])
+        self.dataBase.commit()
+        self.searchCache.clear()
+        return len(counts)
+
+    def close(self):
+        """writes the uses kept in memory, commits anything outstanding and disconnects from the database"""
+
+        self.flush_search_counts()
+        self.dataBase.commit()
+        self.db.close()
+        self.dataBase.close()
+
+    def get_account(self, name):
+        """reads all of the information of an account without printing anything
+            @param name (string) - encrypted name of the account
+            @return (dict) - decrypted information keyed by column name, None if there is no such account
+        """
+
+        cursor = self.account_cursor()
+        try:
+            account = cursor.execute("SELECT %s FROM accounts WHERE NAME = ?;" % ", ".join(self.backupColumns),
+                                     (name,)).fetchone()
+        finally:
+            cursor.close()
+        if account is None:
+            return None
+        self.count_use(name)
+        return account.to_dict()
+
     def displayAccount(self, name):
         """displays the desired information from the account
             @param name (string) - encrypted name of the account to be displayed
@@ -304,21 +1181,26 @@ class AccountDatabase:
         # INCLUDE OPTION HERE TO COPY THE PASSWORD TO CLIPBOARD
         # *******************************************************
 
-        accountInfo = ""
-        if name != "":
-            self.db.execute("SELECT NAME, DESCRIPTION, EMAIL, USERNAME, PASSWORD, ACCESS_CODE, WEBSITE, "
-                            "ADDRESS, PHONE_NUMBER, MISCELLANEOUS_INFO, PENDING_TASKS, DATE_MODIFIED "
-                            "FROM accounts WHERE NAME = ?;", (name,))
-            accountInfo = self.db.fetchone()
+        if name == "":
+            return
 
-        # GET THE CATEGORIES TO DISPLAY
-        displayCategories = ["NAME", "DESCRIPTION", "EMAIL", "USERNAME", "PASSWORD", "CODE", "WEBSITE",
-                             "ADDRESS", "PHONE NUMBER", "MISC INFO", "PENDING TASKS", "DATE MODIFIED"]
+        # THE COLUMNS TO DISPLAY AND THEIR HEADINGS
+        displayCategories = [("NAME", "NAME"), ("DESCRIPTION", "DESCRIPTION"), ("EMAIL", "EMAIL"),
+                             ("USERNAME", "USERNAME"), ("PASSWORD", "PASSWORD"), ("ACCESS_CODE", "CODE"),
+                             ("WEBSITE", "WEBSITE"), ("ADDRESS", "ADDRESS"), ("PHONE_NUMBER", "PHONE NUMBER"),
+                             ("MISCELLANEOUS_INFO", "MISC INFO"), ("PENDING_TASKS", "PENDING TASKS"),
+                             ("DATE_MODIFIED", "DATE MODIFIED")]
 
-        count = 0
-        for info in accountInfo:
-            if info != "" and count == 0 or count == 2 or count == 5:
-                print("%s:\t\t%s" % (displayCategories[count], self.decode(info)))
-            elif info != "":
-                print("%s:\t%s" % (displayCategories[count], self.decode(info)))
-            count += 1
+        cursor = self.account_cursor()
+        try:
+            account = cursor.execute("SELECT %s FROM accounts WHERE NAME = ?;" %
+                                     ", ".join(column for column, heading in displayCategories), (name,)).fetchone()
+        finally:
+            cursor.close()
+        if account is None:
+            return
+
+        # BLANK INFORMATION IS LEFT OUT, SHORT HEADINGS GET A SECOND TAB SO THE INFORMATION LINES UP
+        for column, heading in displayCategories:
+            if account[column]:
+                print("%s:%s%s" % (heading, "\t\t" if len(heading) < 7 else "\t", account[column]))
@@ -1,50 +1,176 @@
-import string
 import os
 
-def encrypt(sequence, characters, shift, reservedSymbols = string.punctuation):
+# TEXT IS TRANSLATED WITH A DICT OF ORDINALS, WHICH WORKS FOR str ON PYTHON 3 AND FOR unicode ON PYTHON 2 (WHAT
+# sqlite3 RETURNS THERE). A PYTHON 2 str (WHAT raw_input RETURNS) NEEDS A 256 CHARACTER TABLE FROM string.maketrans
+try:
+    _text = unicode
+    from string import maketrans as _maketrans
+except NameError:
+    _text = str
+    _maketrans = None
+
+# THE SAME CHARACTERS AS string.punctuation, WRITTEN OUT SO STARTING THE PROGRAM DOES NOT IMPORT string (AND re)
+punctuation = '!"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~'
+
+# CIPHERS THAT HAVE ALREADY BEEN BUILT, KEYED BY (characters, shift, reservedSymbols)
+_ciphers = {}
+
+
+class Cipher:
+    """shift cipher with precomputed translation tables, built once per set of encryption settings"""
+
+    def __init__(self, characters, shift, reservedSymbols=punctuation):
+        """builds the forward and inverse translation tables for the cipher
+            @param characters (string) - the characters involved in the encryption
+                @invariant - no duplicate characters
+            @param shift (int) - the magnitude of the shift
+            @param reservedSymbols (string) - characters that should not be changed when encrypting
+        """
+
+        self.characters = characters
+        self.shift = shift
+        self.reservedSymbols = reservedSymbols
+
+        # THE INVERSE TABLE IS A SHIFT IN THE OTHER DIRECTION, THE SAME AS CALLING encrypt WITH -shift
+        self.forward = self._table(shift)
+        self.inverse = self._table(-shift)
+        self.forwardBytes = self._byte_table(self.forward)
+        self.inverseBytes = self._byte_table(self.inverse)
+
+        # A CHARACTER THE TABLES NEVER CHANGE, USED TO JOIN MANY STRINGS INTO ONE FOR BATCH TRANSLATION
+        self.separator = '\x00'
+        while self.separator in characters:
+            self.separator = chr(ord(self.separator) + 1)
+
+    def _table(self, shift):
+        """maps every character that can be shifted to its shifted character
+            only the first occurrence of a character counts, the same as characters.index()
+            @param shift (int) - the magnitude of the shift
+            @return (dict) - ordinal to ordinal translation table to pass to translate()
+        """
+
+        table = {}
+        for index, char in enumerate(self.characters):
+            if char in self.reservedSymbols or ord(char) in table:
+                continue
+            table[ord(char)] = ord(self.characters[(index + shift) % len(self.characters)])
+
+        return table
+
+    def _byte_table(self, table):
+        """turns a translation table into the one a python 2 str needs
+            @param table (dict) - ordinal to ordinal translation table
+            @return (dict or string) - the 256 character table on python 2, the same table on python 3
+        """
+
+        if _maketrans is None:
+            return table
+
+        plain = [source for source in sorted(table) if source < 256 and table[source] < 256]
+        return _maketrans(''.join(chr(source) for source in plain), ''.join(chr(table[source]) for source in plain))
+
+    def _tables(self, sequence, forward):
+        """@param sequence (string) - a string to translate
+            @param forward (bool) - True to encrypt, False to decrypt
+            @return (dict or string) - the translation table for the type of the string
+        """
+
+        if isinstance(sequence, _text):
+            return self.forward if forward else self.inverse
+        return self.forwardBytes if forward else self.inverseBytes
+
+    def encrypt(self, sequence):
+        """encrypts a string in a single pass through the translation table
+            @param sequence (string) - the sequence to be encrypted
+            @return (string) - the encrypted string
+        """
+
+        return self._check(sequence, sequence.translate(self._tables(sequence, True)))
+
+    def decrypt(self, sequence):
+        """decrypts a string previously encrypted with this cipher
+            @param sequence (string) - the sequence to be decrypted
+            @return (string) - the decrypted string
+        """
+
+        return self._check(sequence, sequence.translate(self._tables(sequence, False)))
+
+    def encrypt_many(self, sequences):
+        """encrypts a list of strings with a single pass through the translation table
+            unlike encrypt, no warning is printed for strings that are not changed
+            @param sequences (string[]) - the sequences to be encrypted
+            @return (string[]) - the encrypted strings, in the same order
+        """
+
+        return self._translate_many(sequences, True)
+
+    def decrypt_many(self, sequences):
+        """decrypts a list of strings with a single pass through the translation table
+            @param sequences (string[]) - the sequences to be decrypted
+            @return (string[]) - the decrypted strings, in the same order
+        """
+
+        return self._translate_many(sequences, False)
+
+    def _translate_many(self, sequences, forward):
+        """joins the strings on the separator, translates them all at once and splits them back up
+            @param sequences (string[]) - the sequences to translate
+            @param forward (bool) - True to encrypt, False to decrypt
+            @return (string[]) - the translated strings
+        """
+
+        if not sequences:
+            return []
+
+        joined = self.separator.join(sequences)
+
+        # FALL BACK TO ONE STRING AT A TIME IF A STRING ALREADY CONTAINS THE SEPARATOR, OR (ON PYTHON 2) IF JOINING
+        # MIXED str AND unicode STRINGS GAVE A TYPE THAT NOT EVERY STRING HAS
+        if joined.count(self.separator) != len(sequences) - 1 or \
+                _maketrans is not None and any(type(sequence) is not type(joined) for sequence in sequences):
+            return [sequence.translate(self._tables(sequence, forward)) for sequence in sequences]
+
+        return joined.translate(self._tables(joined, forward)).split(self.separator)
+
+    def _check(self, sequence, newSequence):
+        """same simple error check as encrypt, warns when nothing in the sequence was changed
+            @param sequence (string) - the original sequence
+            @param newSequence (string) - the translated sequence
+            @return (string) - the translated sequence
+        """
+
+        if newSequence == sequence and newSequence != '':
+            print('\'%s\' has not been encrypted. Please edit!' % sequence)
+        return newSequence
+
+
+def get_cipher(characters, shift, reservedSymbols=punctuation):
+    """returns the cipher for a set of encryption settings, only building it the first time it is asked for
+        @param characters (string) - the characters involved in the encryption
+        @param shift (int) - the magnitude of the shift
+        @param reservedSymbols (string) - characters that should not be changed when encrypting
+        @return (Cipher) - the cipher for those settings
+    """
+
+    key = (characters, shift, reservedSymbols)
+    cipher = _ciphers.get(key)
+    if cipher is None:
+        cipher = Cipher(characters, shift, reservedSymbols)
+        _ciphers[key] = cipher
+    return cipher
+
+
+def encrypt(sequence, characters, shift, reservedSymbols = punctuation):
     """function to encrypt a set of characters
         @param sequence (string) - the sequence to be encrypted
         @param characters (string) - the characters involved in the encryption
             @invariant - no duplicate characters
-        @param shift (int) - the magnitude of the shift
+        @param shift (int) - the magnitude of the shift, negative to decrypt
         @param reservedSymbols (string) - characters that should not be changed when encrypting
         @return (string) - the encrypted string
     """
 
-    newSequenceArray=[]  # gets populated with the new characters after being shifted
-    
-    # POPULATE NEW SEQUENCY WITH THE SHIFTED CHARACTERS
-    for i in sequence:
-
-        if i in reservedSymbols or i not in characters:
-            newSequenceArray.append(i)
-
-        else:
-            # FIND THE INDEX OF THE CHARACTER FROM THE SEQUENCE IN THE LIST OF CHARACTERS
-            charIndex = characters.index(i)
-
-            # APPLIES THE SHIFT TO FIND THE NEW CHARACTER
-            newCharIndex = charIndex + shift
-            # CHECKS TO MAKE SURE THE NEW INDEX IS WITHIN THE STRING BOUNDS
-            # CAN THIS BE DONE WITH THE MODULO OPERATOR?????
-            while newCharIndex >= len(characters):
-                newCharIndex = newCharIndex - len(characters)
-            while newCharIndex < 0:
-                newCharIndex = newCharIndex + len(characters)
-
-            # ADDS THE NEW CHARACTER TO THE ARRAY OF NEW CHARACTERS
-            newSequenceArray.append(characters[newCharIndex])
-            
-    # CREATES ARRAY OF NEW CHARACTERS
-    newSequence = ''.join(newSequenceArray)
-
-    # CHECKS TO SEE IF THE NEW PASSWORD IS THE SAME LENGTH AS THE ORIGINAL SEQUENCE.  SIMPLE ERROR CHECK
-    if newSequence != sequence and len(newSequence) == len(sequence) or newSequence == '':
-        return newSequence
-    # ELSE THERE WAS AN ERROR IN ENCRYPTION
-    else:
-        print('\'%s\' has not been encrypted. Please edit!' % sequence)
-        return sequence
+    return get_cipher(characters, shift, reservedSymbols).encrypt(sequence)
 
 
 def fix_filepath(path):
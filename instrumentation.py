@@ -0,0 +1,310 @@
+"""opt-in profiling of the account manager.
+    once enabled, it keeps call counts and latency histograms for
+        every public method of AccountDatabase
+        every sql statement run through a connection from connection.connect, with its fetches
+        every call to the cipher (encrypt, decrypt and their batch versions)
+    it also counts the statements sqlite runs (including the ones inside triggers) with a trace callback
+    (python 3 only, python 2's sqlite3 module has no trace callback)
+    and the work sqlite's virtual machine does with a progress handler, and logs statements slower than
+    a threshold through the "accountManager.sql" logger.
+    set ACCOUNT_MANAGER_PROFILE=1 to print the report to stderr when the program exits,
+    or ACCOUNT_MANAGER_PROFILE=path to write it to a file. ACCOUNT_MANAGER_SLOW_QUERY_MS sets the threshold.
+    from code, call enable() and then report() whenever the numbers are wanted
+"""
+
+import atexit
+import functools
+import inspect
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import connection
+from database import AccountDatabase
+from encryption import Cipher
+
+# SQLITE VIRTUAL MACHINE INSTRUCTIONS BETWEEN CALLS OF THE PROGRESS HANDLER
+ProgressSteps = 1000
+
+slowQueryLog = logging.getLogger("accountManager.sql")
+
+
+class Histogram:
+    """latency histogram with power of two buckets, in microseconds"""
+
+    def __init__(self):
+        """creates an empty histogram"""
+
+        self.buckets = [0] * 40  # bucket i counts latencies under 2**i microseconds
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """adds a latency to the histogram
+            @param seconds (float) - the latency
+        """
+
+        microseconds = int(seconds * 1000000)
+        self.buckets[min(microseconds.bit_length(), len(self.buckets) - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent):
+        """returns an upper bound of a percentile of the latencies
+            @param percent (float) - the percentile, 0 to 100
+            @return (float) - seconds, the top of the bucket the percentile falls in
+        """
+
+        target = self.count * percent / 100.0
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= target:
+                return min(2 ** bucket / 1000000.0, self.max)
+        return self.max
+
+
+class Profiler:
+    """thread safe collection of counters and latency histograms"""
+
+    def __init__(self):
+        """creates an empty profiler"""
+
+        self.lock = threading.Lock()
+        self.histograms = {}  # (category, name) -> Histogram
+        self.counters = {}  # name -> count
+
+    def record(self, category, name, seconds):
+        """adds the latency of one call
+            @param category (string) - what was called ("method", "sql", "cipher")
+            @param name (string) - the method or statement
+            @param seconds (float) - how long the call took
+        """
+
+        with self.lock:
+            histogram = self.histograms.get((category, name))
+            if histogram is None:
+                histogram = self.histograms[(category, name)] = Histogram()
+            histogram.record(seconds)
+
+    def count(self, name, amount=1):
+        """adds to a counter
+            @param name (string) - name of the counter
+            @param amount (int) - how much to add
+        """
+
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        """forgets everything recorded so far"""
+
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def report(self):
+        """formats everything recorded so far, slowest total time first within each category
+            @return (string) - the report
+        """
+
+        with self.lock:
+            histograms = sorted(self.histograms.items(), key=lambda item: (item[0][0], -item[1].total))
+            counters = sorted(self.counters.items())
+
+        lines = ["%-8s %10s %12s %10s %10s %10s %10s  %s" %
+                 ("", "calls", "total ms", "mean us", "p50 us", "p99 us", "max us", "name")]
+        for (category, name), histogram in histograms:
+            lines.append("%-8s %10d %12.3f %10.1f %10.1f %10.1f %10.1f  %s" % (
+                category, histogram.count, histogram.total * 1000, histogram.total / histogram.count * 1000000,
+                histogram.percentile(50) * 1000000, histogram.percentile(99) * 1000000, histogram.max * 1000000,
+                " ".join(name.split())[:100]))
+        for name, count in counters:
+            lines.append("%-8s %10d  %s" % ("counter", count, name))
+        return "\n".join(lines)
+
+
+profiler = Profiler()
+slowQuerySeconds = 0.1
+_originals = {}  # (class, attribute) -> the function before it was wrapped
+
+
+def _statement_done(sql, seconds):
+    """records a finished statement and logs it if it was slow"""
+
+    profiler.record("sql", sql, seconds)
+    if seconds >= slowQuerySeconds:
+        slowQueryLog.warning("slow query (%.1f ms): %s", seconds * 1000, " ".join(sql.split()))
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """cursor that times its statements and fetches"""
+
+    def execute(self, sql, parameters=()):
+        start = time.time()
+        try:
+            return sqlite3.Cursor.execute(self, sql, parameters)
+        finally:
+            self.lastStatement = sql
+            _statement_done(sql, time.time() - start)
+
+    def executemany(self, sql, parameters):
+        start = time.time()
+        try:
+            return sqlite3.Cursor.executemany(self, sql, parameters)
+        finally:
+            self.lastStatement = sql
+            _statement_done(sql, time.time() - start)
+
+    def _fetch(self, fetch, *arguments):
+        start = time.time()
+        try:
+            return fetch(self, *arguments)
+        finally:
+            profiler.record("fetch", getattr(self, "lastStatement", "?"), time.time() - start)
+
+    def fetchone(self):
+        return self._fetch(sqlite3.Cursor.fetchone)
+
+    def fetchmany(self, *arguments):
+        return self._fetch(sqlite3.Cursor.fetchmany, *arguments)
+
+    def fetchall(self):
+        return self._fetch(sqlite3.Cursor.fetchall)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """connection whose cursors are timed, with a trace callback and progress handler that count sqlite's work"""
+
+    def __init__(self, *arguments, **kwargs):
+        sqlite3.Connection.__init__(self, *arguments, **kwargs)
+        if hasattr(self, "set_trace_callback"):  # PYTHON 3.3 AND LATER ONLY
+            self.set_trace_callback(lambda statement: profiler.count("statements run by sqlite"))
+        self.set_progress_handler(self._progress, ProgressSteps)
+
+    def _progress(self):
+        profiler.count("sqlite vm steps (x%d)" % ProgressSteps)
+        return 0
+
+    def cursor(self, factory=InstrumentedCursor):
+        return sqlite3.Connection.cursor(self, factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self.cursor().executemany(sql, parameters)
+
+
+def _timed(category, name, function):
+    """wraps a function so every call is recorded, generators are timed over their whole iteration
+        @param category (string) - category to record the calls under
+        @param name (string) - name to record the calls under
+        @param function (function) - the function to wrap
+        @return (function) - the wrapped function
+    """
+
+    if inspect.isgeneratorfunction(function):
+        @functools.wraps(function)
+        def timedGenerator(*arguments, **kwargs):
+            elapsed = 0.0
+            generator = function(*arguments, **kwargs)
+            try:
+                while True:
+                    start = time.time()
+                    try:
+                        value = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        elapsed += time.time() - start
+                    yield value
+            finally:
+                generator.close()
+                profiler.record(category, name, elapsed)
+        return timedGenerator
+
+    @functools.wraps(function)
+    def timedFunction(*arguments, **kwargs):
+        start = time.time()
+        try:
+            return function(*arguments, **kwargs)
+        finally:
+            profiler.record(category, name, time.time() - start)
+    return timedFunction
+
+
+def _wrap(cls, attribute, category, name):
+    """replaces a method of a class with a timed version, remembering the original"""
+
+    if (cls, attribute) not in _originals:
+        _originals[(cls, attribute)] = cls.__dict__[attribute]
+        setattr(cls, attribute, _timed(category, name, cls.__dict__[attribute]))
+
+
+def enable(slowQueryMs=None, reportFile=None, reportOnExit=True):
+    """starts profiling. only connections opened afterwards have their sql timed
+        @param slowQueryMs (float) - statements slower than this are logged, ACCOUNT_MANAGER_SLOW_QUERY_MS
+            or 100 if None
+        @param reportFile (string) - file to write the report to at exit, stderr if None
+        @param reportOnExit (bool) - if True, the report is written when the program exits
+    """
+
+    global slowQuerySeconds
+
+    if slowQueryMs is None:
+        slowQueryMs = float(os.environ.get("ACCOUNT_MANAGER_SLOW_QUERY_MS", 100))
+    slowQuerySeconds = slowQueryMs / 1000.0
+
+    for attribute, value in list(AccountDatabase.__dict__.items()):
+        if not attribute.startswith("_") and inspect.isfunction(value):
+            _wrap(AccountDatabase, attribute, "method", "AccountDatabase." + attribute)
+    for attribute in ["encrypt", "decrypt", "encrypt_many", "decrypt_many"]:
+        _wrap(Cipher, attribute, "cipher", "Cipher." + attribute)
+
+    connection.connectionFactory = InstrumentedConnection
+
+    if reportOnExit:
+        atexit.register(dump, reportFile)
+
+
+def enable_from_environment():
+    """enables profiling if the ACCOUNT_MANAGER_PROFILE environment variable is set"""
+
+    setting = os.environ.get("ACCOUNT_MANAGER_PROFILE")
+    if setting:
+        enable(reportFile=None if setting == "1" else setting)
+
+
+def disable():
+    """stops profiling and puts back the original methods, keeps what was recorded"""
+
+    for (cls, attribute), function in _originals.items():
+        setattr(cls, attribute, function)
+    _originals.clear()
+    connection.connectionFactory = None
+
+
+def report():
+    """returns the report of everything recorded so far
+        @return (string) - the report
+    """
+
+    return profiler.report()
+
+
+def dump(reportFile=None):
+    """writes the report
+        @param reportFile (string) - file to write it to, stderr if None
+    """
+
+    if reportFile is None:
+        sys.stderr.write(report() + "\n")
+    else:
+        with open(reportFile, "w") as f:
+            f.write(report() + "\n")
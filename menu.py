@@ -1,4 +1,45 @@
 import os
+import sys
+
+# WHETHER THE TERMINAL UNDERSTANDS ANSI ESCAPE SEQUENCES, None UNTIL THE SCREEN IS FIRST CLEARED
+_ansi = None
+
+
+def enable_ansi():
+    """checks that escape sequences can be used to clear the screen. windows consoles only understand them once
+        virtual terminal processing is turned on, and older ones cannot turn it on at all
+        @return (bool) - True if escape sequences can be used
+    """
+
+    if os.name != "nt":
+        return True
+
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+        mode = ctypes.c_ulong()
+        if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            return False
+        return bool(kernel32.SetConsoleMode(handle, mode.value | 0x0004))  # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+    except (ImportError, AttributeError, OSError):
+        return False
+
+
+def clear_screen():
+    """clears the terminal with an escape sequence instead of starting a cls/clear process,
+        falling back to cls on windows consoles that do not understand escape sequences
+    """
+
+    global _ansi
+    if _ansi is None:
+        _ansi = enable_ansi()
+
+    if _ansi:
+        sys.stdout.write("\033[2J\033[H")
+        sys.stdout.flush()
+    else:
+        os.system("cls")
 
 
 def menu(options, whatToDo="Enter the number of the corresponding option.", clearScreenBefore = True, clearScreenAfter = True):
@@ -11,7 +52,7 @@ def menu(options, whatToDo="Enter the number of the corresponding option.", clea
     """
 
     if clearScreenBefore:
-        os.system('cls' if os.name == 'nt' else 'clear')
+        clear_screen()
 
     # DISPLAYS THE MENU OPTIONS
     print(whatToDo)
@@ -22,6 +63,6 @@ def menu(options, whatToDo="Enter the number of the corresponding option.", clea
     action = raw_input("\n> ")
 
     if clearScreenAfter:
-        os.system('cls' if os.name == 'nt' else 'clear')
+        clear_screen()
 
     return action
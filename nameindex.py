@@ -0,0 +1,108 @@
+import bisect
+import heapq
+import re
+
+
+class NameIndex:
+    """sorted in-memory index of decrypted account names, for typeahead without going to the database.
+        names are kept sorted without regard to case, so the names starting with a prefix are found with a
+        binary search
+    """
+
+    def __init__(self, names=()):
+        """builds the index
+            @param names (string iterable) - decrypted names of the accounts
+        """
+
+        # (LOWER CASE NAME, NAME) PAIRS, THE NAME ITSELF BREAKS TIES BETWEEN NAMES THAT ONLY DIFFER IN CASE
+        self.entries = sorted((name.lower(), name) for name in names)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        index = bisect.bisect_left(self.entries, (name.lower(), name))
+        return index < len(self.entries) and self.entries[index][1] == name
+
+    def add(self, name):
+        """adds a name to the index
+            @param name (string) - decrypted name of the account
+        """
+
+        if name not in self:
+            bisect.insort(self.entries, (name.lower(), name))
+
+    def remove(self, name):
+        """removes a name from the index
+            @param name (string) - decrypted name of the account
+            @return (bool) - True if the name was in the index
+        """
+
+        index = bisect.bisect_left(self.entries, (name.lower(), name))
+        if index < len(self.entries) and self.entries[index][1] == name:
+            del self.entries[index]
+            return True
+        return False
+
+    def rename(self, oldName, newName):
+        """changes a name in the index, if the old name is in it
+            @param oldName (string) - decrypted name before the change
+            @param newName (string) - decrypted name after the change
+        """
+
+        if self.remove(oldName):
+            self.add(newName)
+
+    def prefix(self, prefix, limit=None):
+        """finds the names that start with a prefix, ignoring case
+            @param prefix (string) - start of the names
+            @param limit (int) - most names returned, None for all of them
+            @return (string[]) - the names, sorted without regard to case
+        """
+
+        prefix = prefix.lower()
+        index = bisect.bisect_left(self.entries, (prefix,))
+        names = []
+        while index < len(self.entries) and self.entries[index][0].startswith(prefix):
+            if limit is not None and len(names) >= limit:
+                break
+            names.append(self.entries[index][1])
+            index += 1
+        return names
+
+    def rank(self, term, limit=10):
+        """finds the names that best match what has been typed so far, ignoring case. names that start with the
+            term come first, then names with a word that starts with it, then names with it anywhere in them,
+            then names with its letters in the same order
+            @param term (string) - what has been typed
+            @param limit (int) - most names returned
+            @return (string[]) - the names, best match first
+        """
+
+        term = term.lower()
+        names = self.prefix(term, limit)
+        if len(names) >= limit:
+            return names
+        found = set(names)
+
+        # THE TERM INSIDE THE NAME, AT THE START OF A WORD FIRST, THEN THE EARLIER AND SHORTER NAMES
+        matches = []
+        for key, name in self.entries:
+            position = key.find(term)
+            if position > 0:
+                matches.append((key[position - 1].isalnum(), position, len(key), key, name))
+        for match in heapq.nsmallest(limit - len(names), matches):
+            names.append(match[-1])
+            found.add(match[-1])
+        if len(names) >= limit:
+            return names
+
+        # THE LETTERS OF THE TERM IN ORDER WITH OTHERS BETWEEN THEM, THE CLOSER TOGETHER THE BETTER
+        pattern = re.compile(".*?".join(re.escape(letter) for letter in term))
+        matches = []
+        for key, name in self.entries:
+            match = pattern.search(key)
+            if match is not None and name not in found:
+                matches.append((match.end() - match.start(), len(key), key, name))
+        names.extend(match[-1] for match in heapq.nsmallest(limit - len(names), matches))
+        return names
@@ -26,10 +26,11 @@ def PasswordAccess(password, maxTries=3, attempts=0):
     return access
 
 
-def randPassGen(length=8, characters=(string.ascii_letters + string.digits)):
+def randPassGen(length=8, characters=(string.ascii_letters + string.digits), rng=random):
     """generates a random password from a string of possible characters
         @param length (int) - the length of the password
         @param characters (string) - characters that can be included in password
+        @param rng (random.Random) - source of randomness, random.SystemRandom() for passwords that are really used
         @return (string) - randomly generated password
     """
 
@@ -37,7 +38,7 @@ def randPassGen(length=8, characters=(string.ascii_letters + string.digits)):
 
     # POPULATES THE PASSWORD ARRAY WITH CHARACTERS
     for i in range(0, length):
-        passwordArray.append(random.choice(characters))
+        passwordArray.append(rng.choice(characters))
 
     # CONVERT PASSWORD ARRAY FROM ARRAY TO STRING
     passwordString = ''.join(passwordArray)
@@ -64,7 +65,7 @@ def genPass():
             # USER WANTS A RANDOM PASSWORD
             if str(passType) == '1' or passType.lower() == 'random':
                 lengthOfPass = int(raw_input('length of password: '))
-                password = randPassGen(length=lengthOfPass)
+                password = randPassGen(length=lengthOfPass, rng=random.SystemRandom())
 
                 # CHECK TO MAKE SURE THE USER WANTS TO USE THE PASSWORD
                 use = (raw_input('use \'%s\'? (y/n) ' % password)).lower()
@@ -0,0 +1,130 @@
+"""rows of the accounts table that decrypt each field the first time it is read"""
+
+
+class RecordLayout:
+    """the columns of the rows returned by one query, shared by every row so each row only holds its values"""
+
+    __slots__ = ("columns", "positions", "encrypted", "cipher")
+
+    def __init__(self, columns, encryptedColumns, cipher):
+        """describes the rows of a query
+            @param columns (string[]) - names of the columns, in the order they were selected
+            @param encryptedColumns (string[]) - the columns whose values are encrypted
+            @param cipher (Cipher) - decrypts the encrypted values
+        """
+
+        self.columns = tuple(columns)
+        self.positions = dict((column, position) for position, column in enumerate(self.columns))
+        self.encrypted = tuple(column in encryptedColumns for column in self.columns)
+        self.cipher = cipher
+
+
+class Account:
+    """one row of the accounts table. values are kept encrypted and each one is decrypted the first time it is read,
+        so reading one or two columns of many accounts does not pay for decrypting the rest.
+        values are read by column name, like account["PASSWORD"]
+    """
+
+    __slots__ = ("layout", "values", "decoded")
+
+    def __init__(self, layout, values):
+        """wraps a row
+            @param layout (RecordLayout) - the columns of the row
+            @param values (tuple) - the row as it was read from the database
+        """
+
+        self.layout = layout
+        self.values = values
+        self.decoded = None  # POSITION -> DECRYPTED VALUE, None UNTIL THE FIRST ONE IS DECRYPTED
+
+    def __getitem__(self, column):
+        """reads a value
+            @param column (string) - name of the column
+            @return - the decrypted value, non-string values (ID, NULL, ...) as they are
+            @raise KeyError - if the column was not selected
+        """
+
+        layout = self.layout
+        position = layout.positions[column]
+        value = self.values[position]
+        if not value or not layout.encrypted[position]:
+            return value
+
+        decoded = self.decoded
+        if decoded is None:
+            decoded = self.decoded = {}
+        elif position in decoded:
+            return decoded[position]
+
+        value = decoded[position] = layout.cipher.decrypt(value)
+        return value
+
+    def __contains__(self, column):
+        return column in self.layout.positions
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, column, default=None):
+        """reads a value, like dict.get
+            @param column (string) - name of the column
+            @param default - returned if the column was not selected
+            @return - the decrypted value
+        """
+
+        if column not in self.layout.positions:
+            return default
+        return self[column]
+
+    def raw(self, column):
+        """reads a value without decrypting it
+            @param column (string) - name of the column
+            @return - the value as it is stored in the database
+        """
+
+        return self.values[self.layout.positions[column]]
+
+    def keys(self):
+        """@return (string tuple) - names of the columns, in the order they were selected"""
+
+        return self.layout.columns
+
+    def to_dict(self, columns=None):
+        """decrypts several values at once, the ones not read yet in a single batch
+            @param columns (string[]) - names of the columns, all of them if None
+            @return (dict) - decrypted values keyed by column name
+        """
+
+        if columns is None:
+            columns = self.layout.columns
+
+        if self.decoded is None:
+            self.decoded = {}
+        positions = [self.layout.positions[column] for column in columns]
+        missing = [position for position in positions if self.values[position] and self.layout.encrypted[position]
+                   and position not in self.decoded]
+        if missing:
+            values = self.layout.cipher.decrypt_many([self.values[position] for position in missing])
+            self.decoded.update(zip(missing, values))
+
+        return dict((column, self.decoded.get(position, self.values[position]))
+                    for column, position in zip(columns, positions))
+
+
+def record_factory(encryptedColumns, cipher):
+    """makes a sqlite row factory that returns Account records, for cursor.row_factory
+        @param encryptedColumns (string[]) - the columns whose values are encrypted
+        @param cipher (Cipher) - decrypts the encrypted values
+        @return (function) - the row factory
+    """
+
+    # THE LAYOUT ONLY CHANGES WHEN THE CURSOR RUNS ANOTHER QUERY, WHICH GIVES IT A NEW DESCRIPTION
+    last = [None, None]
+
+    def account_row(cursor, row):
+        if cursor.description is not last[0]:
+            last[0] = cursor.description
+            last[1] = RecordLayout([column[0] for column in cursor.description], encryptedColumns, cipher)
+        return Account(last[1], row)
+
+    return account_row
@@ -0,0 +1,331 @@
+"""re-encrypts every account database listed in users.db, and users.db itself, with new encryption settings
+    usage: python rekey.py --shift N [--characters CHARS] [--old-shift N] [--old-characters CHARS]
+                           [--users users.db] [--workers N] [--chunk-size N]
+    the old settings default to the ones in config.py. once it finishes, put the new settings in config.py.
+
+    each table is copied into a shadow table a chunk at a time, the rows are decrypted and encrypted again by a pool of
+    worker processes, and every chunk is committed together with a checkpoint, so an interrupted run picks up where it
+    stopped when it is started again with the same settings. the program can keep using a database while it is being
+    copied; accounts changed (CHANGE_ID), added or deleted in the meantime, and every SEARCH_COUNT, are caught up when
+    the shadow table replaces the real one, in a single short transaction.
+    every session of the program has to be closed before that swap, so before the run ends: a session still open
+    after it keeps reading and writing with the old settings, and the accounts it adds or changes are then stored
+    encrypted with the old settings. sqlite cannot tell whether another program has the database open, so this is
+    not checked.
+"""
+
+import argparse
+import hashlib
+import multiprocessing
+import os
+import sys
+import time
+
+from config import EncryptChars, EncryptShift, UsersFile, user_files
+from connection import connect
+from database import translate_rows
+from encryption import get_cipher
+
+# ENCRYPTED COLUMNS OF EACH TABLE, EVERY OTHER COLUMN (ID, CHANGE_ID, ...) IS COPIED AS IT IS
+AccountColumns = ["NAME", "DESCRIPTION", "EMAIL", "USERNAME", "PASSWORD", "ACCESS_CODE", "WEBSITE", "ADDRESS",
+                  "PHONE_NUMBER", "MISCELLANEOUS_INFO", "PENDING_TASKS", "SEARCH_TAGS", "DATE_MODIFIED"]
+UserColumns = ["USERNAME", "PASSWORD", "DATABASE_PATH", "BACKUP_LOCATION"]
+
+# THE REKEY OF THE WORKER PROCESS, SET BY _start_worker
+_worker = None
+
+
+class Rekey:
+    """decrypts with one set of encryption settings and encrypts with another"""
+
+    def __init__(self, oldCharacters, oldShift, newCharacters, newShift):
+        """builds the ciphers of both settings
+            @param oldCharacters (string) - characters the data is encrypted with now
+            @param oldShift (int) - shift the data is encrypted with now
+            @param newCharacters (string) - characters to encrypt the data with
+            @param newShift (int) - shift to encrypt the data with
+        """
+
+        if len(set(newCharacters)) != len(newCharacters):
+            raise ValueError("the new encryption characters have duplicates in them")
+
+        self.settings = (oldCharacters, oldShift, newCharacters, newShift)
+        self.old = get_cipher(oldCharacters, oldShift, "")
+        self.new = get_cipher(newCharacters, newShift, "")
+
+        # IDENTIFIES THE RUN, A CHECKPOINT IS ONLY RESUMED BY A RUN WITH THE SAME SETTINGS
+        self.target = hashlib.sha256(repr(self.settings).encode("utf-8")).hexdigest()
+
+    def translate(self, values):
+        """re-encrypts a list of strings
+            @param values (string[]) - strings encrypted with the old settings
+            @return (string[]) - the same strings encrypted with the new settings
+        """
+
+        return self.new.encrypt_many(self.old.decrypt_many(values))
+
+    def rows(self, rows, columns):
+        """re-encrypts the selected columns of rows
+            @param rows (tuple[]) - rows of a table
+            @param columns (int[]) - indexes of the encrypted columns
+            @return (tuple[]) - the re-encrypted rows
+        """
+
+        return translate_rows(rows, columns, self.translate)
+
+
+def _start_worker(settings):
+    """builds the rekey of a worker process once, instead of pickling it with every chunk"""
+
+    global _worker
+    _worker = Rekey(*settings)
+
+
+def _rekey_chunk(job):
+    """re-encrypts one chunk of rows inside a worker process
+        @param job (tuple) - (rows, indexes of the encrypted columns)
+        @return (tuple[]) - the re-encrypted rows
+    """
+
+    rows, columns = job
+    return _worker.rows(rows, columns)
+
+
+def get_setting(database, key):
+    """reads a value out of the settings table of a database
+        @param database (sqlite3.Connection) - the database
+        @param key (string) - the name of the setting
+        @return - the value, None if it is not set
+    """
+
+    row = database.execute("SELECT VALUE FROM settings WHERE KEY = ?;", (key,)).fetchone()
+    return None if row is None else row[0]
+
+
+def rekey_table(database, table, encryptedColumns, rekey, pool=None, chunkSize=1000, windowSize=None):
+    """re-encrypts a table, resuming from its checkpoint if an earlier run with the same settings was interrupted
+        @param database (sqlite3.Connection) - the database, opened with isolation_level=None
+        @param table (string) - the name of the table
+        @param encryptedColumns (string[]) - columns of the table that are encrypted
+        @param rekey (Rekey) - the old and new encryption settings
+        @param pool (multiprocessing.Pool) - workers that re-encrypt the chunks, None to do it in this process
+        @param chunkSize (int) - number of rows committed at a time
+        @param windowSize (int) - number of rows read and handed to the pool at a time, chunkSize if None
+        @return (int) - number of rows re-encrypted, None if the table was already re-encrypted with these settings
+    """
+
+    shadow = table + "_rekey"
+    database.execute("CREATE TABLE IF NOT EXISTS settings(KEY TEXT PRIMARY KEY NOT NULL,VALUE);")
+    if get_setting(database, "rekey_completed") == rekey.target:
+        return None
+
+    columns = [row[1] for row in database.execute("PRAGMA table_info(%s);" % table)]
+    encrypted = [index for index, column in enumerate(columns) if column in encryptedColumns]
+    idIndex = columns.index("ID")
+    selectSql = "SELECT %s FROM %s" % (", ".join(columns), table)
+    insertSql = "INSERT INTO %s (%s) VALUES (%s);" % (shadow, ", ".join(columns), ",".join("?" * len(columns)))
+
+    # A SHADOW TABLE LEFT BY A RUN WITH OTHER SETTINGS IS THROWN AWAY
+    shadowExists = database.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?;",
+                                    (shadow,)).fetchone() is not None
+    if not shadowExists or get_setting(database, "rekey_target") != rekey.target:
+        createSql = database.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?;",
+                                     (table,)).fetchone()[0]
+        database.execute("BEGIN IMMEDIATE;")
+        database.execute("DROP TABLE IF EXISTS %s;" % shadow)
+        database.execute(createSql.replace(table, shadow, 1))
+        database.execute("INSERT OR REPLACE INTO settings (KEY, VALUE) VALUES ('rekey_target', ?);", (rekey.target,))
+        database.execute("INSERT OR REPLACE INTO settings (KEY, VALUE) VALUES ('rekey_checkpoint', 0);")
+        database.execute("COMMIT;")
+
+    windowSize = windowSize or chunkSize
+    count = 0
+    while True:
+        checkpoint = get_setting(database, "rekey_checkpoint")
+        rows = database.execute(selectSql + " WHERE ID > ? ORDER BY ID LIMIT ?;", (checkpoint, windowSize)).fetchall()
+        if not rows:
+            break
+
+        jobs = [(rows[start:start + chunkSize], encrypted) for start in range(0, len(rows), chunkSize)]
+        chunks = pool.map(_rekey_chunk, jobs) if pool is not None else [rekey.rows(*job) for job in jobs]
+
+        for chunk in chunks:
+            database.execute("BEGIN IMMEDIATE;")
+            database.executemany(insertSql, chunk)
+            database.execute("UPDATE settings SET VALUE = ? WHERE KEY = 'rekey_checkpoint';", (chunk[-1][idIndex],))
+            database.execute("COMMIT;")
+            count += len(chunk)
+
+    _swap_table(database, table, shadow, columns, encrypted, rekey, selectSql, insertSql)
+    return count
+
+
+def _swap_table(database, table, shadow, columns, encrypted, rekey, selectSql, insertSql):
+    """catches the shadow table up with changes made while it was being copied and puts it in place of the table,
+        with the indexes, triggers and full text index of the table, all in one transaction
+    """
+
+    database.execute("BEGIN IMMEDIATE;")
+    try:
+        # ROWS CHANGED OR DELETED SINCE THEY WERE COPIED ARE DROPPED FROM THE SHADOW AND COPIED AGAIN,
+        # A TABLE WITHOUT A CHANGE_ID (users) IS SMALL ENOUGH TO BE COPIED AGAIN COMPLETELY
+        if "CHANGE_ID" in columns:
+            database.execute("DELETE FROM %s WHERE ID NOT IN (SELECT ID FROM %s) OR ID IN "
+                             "(SELECT new.ID FROM %s new JOIN %s old ON old.ID = new.ID "
+                             "WHERE old.CHANGE_ID != new.CHANGE_ID);" % (shadow, table, shadow, table))
+        else:
+            database.execute("DELETE FROM %s;" % shadow)
+
+        # USES ARE WRITTEN WITHOUT A NEW CHANGE_ID, SO THE COUNT OF EVERY ROW STILL IN THE SHADOW IS COPIED AGAIN
+        if "SEARCH_COUNT" in columns:
+            database.execute("UPDATE %s SET SEARCH_COUNT = (SELECT SEARCH_COUNT FROM %s old WHERE old.ID = %s.ID);"
+                             % (shadow, table, shadow))
+        rows = database.execute(selectSql + " WHERE ID NOT IN (SELECT ID FROM %s);" % shadow).fetchall()
+        database.executemany(insertSql, rekey.rows(rows, encrypted))
+
+        # EVERYTHING THAT BELONGS TO THE TABLE IS DROPPED WITH IT, SO IT IS CREATED AGAIN ON THE SHADOW
+        objects = database.execute("SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') "
+                                   "AND sql IS NOT NULL;", (table,)).fetchall()
+        searchTables = database.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' AND sql LIKE ?;",
+                                        ("CREATE VIRTUAL TABLE %%content='%s'%%" % table,)).fetchall()
+
+        for name, sql in searchTables:
+            database.execute("DROP TABLE %s;" % name)
+        database.execute("DROP TABLE %s;" % table)
+        database.execute("ALTER TABLE %s RENAME TO %s;" % (shadow, table))
+        for name, sql in searchTables:
+            database.execute(sql)
+            database.execute("INSERT INTO %s (%s) VALUES ('rebuild');" % (name, name))
+        for sql, in objects:
+            database.execute(sql)
+
+        database.execute("DELETE FROM settings WHERE KEY IN ('rekey_target', 'rekey_checkpoint');")
+        database.execute("INSERT OR REPLACE INTO settings (KEY, VALUE) VALUES ('rekey_completed', ?);",
+                         (rekey.target,))
+        database.execute("COMMIT;")
+    except BaseException:
+        database.execute("ROLLBACK;")
+        raise
+
+
+def rekey_file(path, table, encryptedColumns, rekey, pool=None, chunkSize=1000, windowSize=None):
+    """re-encrypts a table of a database file
+        @param path (string) - file path of the database
+        @return (dict) - file, seconds taken, rows re-encrypted (None if it already was) and the error if it failed
+        see rekey_table for the other parameters
+    """
+
+    result = {"file": path, "seconds": 0.0, "rows": 0, "error": None}
+    start = time.time()
+
+    try:
+        if not os.path.isfile(path):
+            raise IOError("no database at '%s'" % path)
+
+        database = connect(path, isolation_level=None)
+        try:
+            result["rows"] = rekey_table(database, table, encryptedColumns, rekey, pool, chunkSize, windowSize)
+        finally:
+            database.close()
+    except Exception as error:
+        result["error"] = "%s: %s" % (type(error).__name__, error)
+
+    result["seconds"] = time.time() - start
+    return result
+
+
+def rekey_all(usersFile, rekey, workers=None, chunkSize=1000):
+    """re-encrypts the account database of every user, then the users database.
+        the users database is only re-encrypted once every account database has been, so a failed run can be
+        started again and still find the account databases
+        @param usersFile (string) - file path of the users database
+        @param rekey (Rekey) - the old and new encryption settings
+        @param workers (int) - number of worker processes, the number of cpus if None, 1 for no worker processes
+        @param chunkSize (int) - number of rows committed at a time
+        @return (dict[]) - result of every file, see rekey_file
+    """
+
+    # AN INTERRUPTED RUN MAY HAVE FINISHED users.db ALREADY, THE PATHS ARE THEN ENCRYPTED WITH THE NEW SETTINGS
+    userDB = connect(usersFile)
+    try:
+        userDB.execute("CREATE TABLE IF NOT EXISTS settings(KEY TEXT PRIMARY KEY NOT NULL,VALUE);")
+        cipher = rekey.new if get_setting(userDB, "rekey_completed") == rekey.target else rekey.old
+        rows = userDB.execute("SELECT USERNAME, DATABASE_PATH, BACKUP_LOCATION FROM users ORDER BY ID;").fetchall()
+    finally:
+        userDB.close()
+
+    pool = None
+    if workers != 1:
+        workers = workers or multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(workers, initializer=_start_worker, initargs=(rekey.settings,))
+
+    results = []
+    try:
+        for row in rows:
+            user, databasePath, backupPath = cipher.decrypt_many(list(row))
+            databaseFile = user_files(user, databasePath, backupPath)[0]
+
+            # EACH WINDOW IS ENOUGH CHUNKS TO KEEP EVERY WORKER BUSY
+            results.append(rekey_file(databaseFile, "accounts", AccountColumns, rekey, pool, chunkSize,
+                                      chunkSize * (workers or 1)))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if any(result["error"] for result in results):
+        results.append({"file": usersFile, "seconds": 0.0, "rows": 0,
+                        "error": "not re-encrypted because an account database failed"})
+    else:
+        results.append(rekey_file(usersFile, "users", UserColumns, rekey, None, chunkSize))
+    return results
+
+
+def print_report(results, seconds):
+    """prints how each file went
+        @param results (dict[]) - results from rekey_all
+        @param seconds (float) - time taken by the whole run
+    """
+
+    for result in results:
+        if result["error"]:
+            print("FAILED   %s: %s" % (result["file"], result["error"]))
+        elif result["rows"] is None:
+            print("skipped  %s: already re-encrypted" % result["file"])
+        else:
+            print("ok       %s: %d rows in %.2fs" % (result["file"], result["rows"], result["seconds"]))
+
+    failed = len([result for result in results if result["error"]])
+    print("%d of %d databases re-encrypted in %.2fs" % (len(results) - failed, len(results), seconds))
+
+
+def main(argv=None):
+    """command line entry point
+        @param argv (string[]) - command line arguments, sys.argv if None
+        @return (int) - exit status, 1 if any database failed
+    """
+
+    parser = argparse.ArgumentParser(description="Re-encrypt every database with new encryption settings.")
+    parser.add_argument("--shift", type=int, required=True, help="the new EncryptShift")
+    parser.add_argument("--characters", default=EncryptChars, help="the new EncryptChars")
+    parser.add_argument("--old-shift", type=int, default=EncryptShift, help="the EncryptShift the data has now")
+    parser.add_argument("--old-characters", default=EncryptChars, help="the EncryptChars the data has now")
+    parser.add_argument("--users", default=UsersFile, help="file path of the users database")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="rows committed at a time")
+    args = parser.parse_args(argv)
+
+    rekey = Rekey(args.old_characters, args.old_shift, args.characters, args.shift)
+
+    start = time.time()
+    results = rekey_all(args.users, rekey, args.workers, args.chunk_size)
+    print_report(results, time.time() - start)
+
+    if any(result["error"] for result in results):
+        return 1
+    print("put the new EncryptChars and EncryptShift in config.py before using the program again")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
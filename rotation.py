@@ -0,0 +1,158 @@
+"""rotates the passwords of many accounts at once, for example after a breach.
+    accounts are picked by search term, search tag and/or age, new passwords are generated with
+    passwords.randPassGen from the operating system's random number generator, and they are all written in one
+    transaction, so either every selected account gets a new password or none do
+"""
+
+import csv
+import random
+import string
+import time
+
+from database import open_csv
+from passwords import randPassGen
+
+# COLUMNS OF THE ROTATION REPORT, THE NEW PASSWORDS ARE NOT IN IT, THEY ARE ONLY IN THE DATABASE
+ReportHeader = ["NAME", "USERNAME", "WEBSITE", "PREVIOUS DATE MODIFIED"]
+
+
+class PasswordPolicy:
+    """what a generated password has to look like"""
+
+    def __init__(self, length=16, characters=string.ascii_letters + string.digits + "!#$%&*+-=?@^_",
+                 required=(string.ascii_lowercase, string.ascii_uppercase, string.digits)):
+        """creates a policy
+            @param length (int) - length of every password
+            @param characters (string) - characters a password can have in it
+            @param required (string[]) - character classes that every password has at least one character of
+        """
+
+        required = [klass for klass in required if klass]
+        if length < len(required):
+            raise ValueError("a password of length %d cannot have a character of all %d required classes"
+                             % (length, len(required)))
+        for klass in required:
+            if not set(klass) & set(characters):
+                raise ValueError("none of the characters '%s' can be used" % klass)
+
+        self.length = length
+        self.characters = characters
+        self.required = [set(klass) for klass in required]
+
+    def generate(self, rng):
+        """generates a password that follows the policy.
+            passwords missing a required class are thrown away and drawn again, so every allowed password is
+            as likely as every other
+            @param rng (random.Random) - source of randomness
+            @return (string) - the password
+        """
+
+        while True:
+            password = randPassGen(self.length, self.characters, rng)
+
+            # "same" AND "keep" MEAN DO NOT CHANGE TO update_accounts
+            if password.lower() in ("same", "keep"):
+                continue
+            if all(klass.intersection(password) for klass in self.required):
+                return password
+
+
+def select_accounts(database, term=None, tag=None, olderThan=None, chunkSize=1000):
+    """finds the accounts to rotate, an account has to match every selector that is given
+        @param database (AccountDatabase) - the database to look in
+        @param term (string) - decrypted search term, the same as searching from the menu ("all" for every account)
+        @param tag (string) - decrypted search tag the account has to have, ignoring case
+        @param olderThan (int) - days since the account was last modified, accounts without a date count as old
+        @param chunkSize (int) - number of accounts read and decrypted at a time
+        @return (generator) - dict of the decrypted NAME, USERNAME, WEBSITE and DATE_MODIFIED of each account
+    """
+
+    if term is None and tag is None and olderThan is None:
+        raise ValueError("give a search term, a tag or an age, the term 'all' selects every account")
+
+    names = None
+    if term is not None:
+        names = set(database.iter_matches(database.encode(term)))
+    if tag is not None:
+        tag = tag.lower()
+
+    # THE AGE IS A RANGE OF THE DATE_MODIFIED_TS INDEX, THE SAME AS AccountDatabase.stale_accounts
+    where = ""
+    parameters = ()
+    if olderThan is not None:
+        where = " WHERE DATE_MODIFIED_TS < ?"
+        parameters = (time.time() - olderThan * 86400,)
+
+    # ITS OWN CURSOR SO THE DATABASE CAN STILL BE USED WHILE THE ACCOUNTS ARE BEING READ
+    cursor = database.dataBase.cursor()
+    try:
+        cursor.execute("SELECT NAME, USERNAME, WEBSITE, DATE_MODIFIED, SEARCH_TAGS FROM accounts%s;" % where,
+                       parameters)
+        while True:
+            rows = cursor.fetchmany(chunkSize)
+            if not rows:
+                break
+
+            for name, username, website, dateModified, tags in database.decode_rows(rows):
+                if names is not None and name not in names:
+                    continue
+                if tag is not None and tag not in (tags or "").lower().replace(",", " ").split():
+                    continue
+                yield {"NAME": name, "USERNAME": username, "WEBSITE": website, "DATE_MODIFIED": dateModified}
+    finally:
+        cursor.close()
+
+
+def rotate(database, accounts, policy=None, rng=None, dryRun=False, batchSize=1000):
+    """gives every account a new password, all in a single transaction
+        @param database (AccountDatabase) - the database the accounts are in
+        @param accounts (dict iterable) - accounts from select_accounts
+        @param policy (PasswordPolicy) - what the new passwords look like, PasswordPolicy() if None
+        @param rng (random.Random) - source of randomness, random.SystemRandom() if None
+        @param dryRun (bool) - if True, nothing is changed
+        @param batchSize (int) - number of accounts encrypted and written at a time
+        @return (dict[]) - the rotated accounts, for write_report
+    """
+
+    if policy is None:
+        policy = PasswordPolicy()
+    if rng is None:
+        rng = random.SystemRandom()
+
+    accounts = list(accounts)
+    if not dryRun:
+        database.update_accounts(dict((account["NAME"], {"PASSWORD": policy.generate(rng)})
+                                      for account in accounts), batchSize)
+    return accounts
+
+
+def write_report(path, accounts):
+    """writes which accounts were rotated, so the new passwords can be set on the websites
+        @param path (string) - file path of the csv report
+        @param accounts (dict[]) - accounts returned by rotate
+    """
+
+    with open_csv(path, "w") as f:
+        writer = csv.writer(f)
+        writer.writerow(ReportHeader)
+        writer.writerows([account["NAME"], account["USERNAME"], account["WEBSITE"], account["DATE_MODIFIED"]]
+                         for account in accounts)
+
+
+def rotate_passwords(database, term=None, tag=None, olderThan=None, policy=None, dryRun=False, reportFile=None):
+    """selects accounts, rotates their passwords and reports what was done
+        @param database (AccountDatabase) - the database to rotate passwords in
+        @param term (string) - see select_accounts
+        @param tag (string) - see select_accounts
+        @param olderThan (int) - see select_accounts
+        @param policy (PasswordPolicy) - what the new passwords look like, PasswordPolicy() if None
+        @param dryRun (bool) - if True, only report what would be rotated
+        @param reportFile (string) - file path of a csv report of the rotated accounts, None for no report
+        @return (dict) - number of accounts "selected" and "rotated", and the "seconds" taken
+    """
+
+    start = time.time()
+    accounts = rotate(database, select_accounts(database, term, tag, olderThan), policy, dryRun=dryRun)
+    if reportFile is not None:
+        write_report(reportFile, accounts)
+    return {"rotated": 0 if dryRun else len(accounts), "selected": len(accounts), "seconds": time.time() - start}
@@ -0,0 +1,198 @@
+"""backs up an account database in a background thread while it is being used.
+    each backup is a copy of the database file, still encrypted, made with the sqlite online backup API through the
+    thread's own read-only connection. the copy is read in a single read transaction, so it is consistent, and in WAL
+    mode it does not block the program from writing in the meantime.
+    the newest backup is always BASE.1.db, the one before it BASE.2.db, and so on up to the number kept
+"""
+
+import os
+import threading
+import time
+
+from connection import connect
+
+# PYTHON 2 HAS NO os.replace, os.rename ONLY REPLACES AN EXISTING FILE OUTSIDE WINDOWS
+try:
+    _replace = os.replace
+except AttributeError:
+    def _replace(source, target):
+        if os.name == "nt" and os.path.exists(target):
+            os.remove(target)
+        os.rename(source, target)
+
+
+class BackupScheduler:
+    """backs up a database every so many seconds, or sooner once enough accounts have been changed"""
+
+    def __init__(self, databaseFile, backupBase, interval=3600, writes=100, keep=5):
+        """sets up the scheduler, start() starts it
+            @param databaseFile (string) - file path of the database to back up
+            @param backupBase (string) - file path of the backups without the ".N.db" ending
+            @param interval (float) - seconds between backups, 0 for no timed backups
+            @param writes (int) - accounts changed that start a backup straight away, 0 to only use the interval
+            @param keep (int) - number of backups kept, the oldest is deleted when there are more
+        """
+
+        if keep < 1:
+            raise ValueError("at least one backup has to be kept")
+
+        self.databaseFile = databaseFile
+        self.backupBase = backupBase
+        self.interval = interval
+        self.writes = writes
+        self.keep = keep
+
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.pendingWrites = 0  # ACCOUNTS CHANGED SINCE THE LAST BACKUP STARTED
+        self.backupPending = True  # SET BY stop
+
+        # OUTCOME OF THE LAST BACKUP, READ WITH status()
+        self.runs = 0
+        self.lastStatus = None
+        self.lastStarted = None
+        self.lastDuration = None
+        self.lastFile = None
+
+    def backup_file(self, number):
+        """@param number (int) - 1 for the newest backup, 2 for the one before it, ...
+            @return (string) - file path of the backup
+        """
+
+        return "%s.%d.db" % (self.backupBase, number)
+
+    def start(self):
+        """starts the background thread"""
+
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._run, name="backup scheduler")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def record_writes(self, count):
+        """counts accounts that were changed, for AccountDatabase.writeListeners
+            @param count (int) - number of accounts changed
+        """
+
+        with self.lock:
+            self.pendingWrites += count
+            due = self.writes and self.pendingWrites >= self.writes
+        if due:
+            self.wake.set()
+
+    def run_now(self):
+        """starts a backup in the background without waiting for the interval"""
+
+        self.wake.set()
+
+    def stop(self, backupPending=True, timeout=None):
+        """stops the background thread
+            @param backupPending (bool) - if True and accounts were changed since the last backup, one more backup
+                is made first
+            @param timeout (float) - most seconds to wait for the thread, None to wait until it is done
+        """
+
+        if self.thread is None:
+            return
+        self.backupPending = backupPending
+        self.stopping.set()
+        self.wake.set()
+        self.thread.join(timeout)
+        self.thread = None
+
+    def status(self):
+        """@return (dict) - number of "runs", and the "status" ("ok" or the error, None before the first backup),
+            "started" time, "seconds" taken and "file" of the last backup
+        """
+
+        with self.lock:
+            return {"runs": self.runs, "status": self.lastStatus, "started": self.lastStarted,
+                    "seconds": self.lastDuration, "file": self.lastFile}
+
+    def _run(self):
+        """body of the background thread, waits for the interval or a wake up and backs up"""
+
+        source = None
+        dataVersion = None
+        try:
+            while True:
+                woken = self.wake.wait(self.interval or None)
+                self.wake.clear()
+                stopping = self.stopping.is_set()
+                if stopping and not (self.backupPending and self.pendingWrites):
+                    break
+
+                try:
+                    if source is None:
+                        source = self._open()
+
+                    # A TIMED BACKUP IS SKIPPED IF NOTHING HAS BEEN WRITTEN, BY THIS PROGRAM OR ANY OTHER
+                    version = source.execute("PRAGMA data_version;").fetchone()[0]
+                    if woken or version != dataVersion or self.pendingWrites:
+                        self._backup(source)
+                        dataVersion = version
+                except Exception as error:
+                    with self.lock:
+                        self.lastStatus = "%s: %s" % (type(error).__name__, error)
+                    if source is not None:
+                        source.close()
+                        source = None
+
+                if stopping:
+                    break
+        finally:
+            if source is not None:
+                source.close()
+
+    def _open(self):
+        """opens the thread's read-only connection to the database
+            @return (sqlite3.Connection) - the connection
+        """
+
+        path = os.path.abspath(self.databaseFile).replace("?", "%3f").replace("#", "%23")
+        # journal_mode IS LEFT AS IT IS, A READ-ONLY CONNECTION CANNOT CHANGE IT
+        try:
+            return connect("file:%s?mode=ro" % path, {"journal_mode": None}, uri=True)
+        except TypeError:
+            # PYTHON 2 CANNOT OPEN A URI. THE CONNECTION IS NOT MADE query_only, WHICH WOULD ALSO STOP VACUUM INTO,
+            # BUT IT ONLY EVER READS THE DATABASE
+            return connect(self.databaseFile, {"journal_mode": None})
+
+    def _backup(self, source):
+        """copies the database and rotates the backups
+            @param source (sqlite3.Connection) - the read-only connection to the database
+        """
+
+        with self.lock:
+            self.pendingWrites = 0
+            self.lastStarted = time.time()
+
+        start = time.time()
+        temporary = self.backupBase + ".partial.db"
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+        if hasattr(source, "backup"):
+            target = connect(temporary, {"journal_mode": "DELETE"})
+            try:
+                # ONE STEP, SO THE WHOLE COPY IS READ IN ONE READ TRANSACTION
+                source.backup(target)
+            finally:
+                target.close()
+        else:
+            # PYTHON 2 HAS NO BACKUP API, VACUUM INTO ALSO COPIES THE DATABASE IN ONE READ TRANSACTION
+            source.execute("VACUUM INTO ?;", (temporary,))
+
+        for number in range(self.keep, 1, -1):
+            if os.path.exists(self.backup_file(number - 1)):
+                _replace(self.backup_file(number - 1), self.backup_file(number))
+        _replace(temporary, self.backup_file(1))
+
+        with self.lock:
+            self.runs += 1
+            self.lastStatus = "ok"
+            self.lastDuration = time.time() - start
+            self.lastFile = self.backup_file(1)
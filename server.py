@@ -0,0 +1,338 @@
+"""asyncio server that gives many users remote access to their account databases at once
+    clients send one JSON request per line and get one JSON response per line back.
+    the first request of a connection must log in:
+        {"command": "login", "username": "...", "password": "..."}
+    after that:
+        {"command": "search", "term": "...", "after": null, "limit": 20}
+            (results are most used first, pass the "next" of a page as "after" to get the page after it)
+        {"command": "display", "name": "..."}
+        {"command": "insert", "account": {"NAME": "...", "PASSWORD": "...", ...}}
+        {"command": "modify", "name": "...", "changes": {"PASSWORD": "...", ...}}
+        {"command": "remove", "name": "..."}
+        {"command": "backup", "incremental": false}
+        {"command": "logout"}
+    every response is {"ok": true, "result": ...} or {"ok": false, "error": "..."}
+    usage: python server.py [--host 127.0.0.1] [--port 8765] [--socket path] [--threads N] [--connections N]
+           [--max-connections N]
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from config import EncryptChars, EncryptShift, UsersFile
+from database import AccountDatabase
+from users import UserDirectory
+
+# LONGEST REQUEST LINE A CLIENT CAN SEND, IN BYTES
+MaxRequestSize = 1048576
+
+# FAILED LOGINS BEFORE THE CONNECTION IS CLOSED, THE SAME AS THE TERMINAL
+MaxLoginTries = 3
+
+# CONNECTIONS THAT CAN BE WAITING TO BE ACCEPTED, SO A BURST OF CLIENTS IS NOT TURNED AWAY
+Backlog = 1024
+
+
+class VaultPool:
+    """bounded pool of open account databases. each user has at most connectionsPerUser of them open, and all users
+        together at most maxConnections. when the pool is full, the database that has been idle the longest is
+        closed to make room. a database is only ever used by one thread at a time, but not always the same thread
+    """
+
+    def __init__(self, connectionsPerUser=4, maxConnections=64):
+        """creates an empty pool
+            @param connectionsPerUser (int) - most databases open at once for one user
+            @param maxConnections (int) - most databases open at once for all users together
+        """
+
+        if maxConnections < 1 or connectionsPerUser < 1:
+            raise ValueError("the pool needs room for at least one database")
+
+        self.connectionsPerUser = connectionsPerUser
+        self.maxConnections = maxConnections
+        self.idle = collections.OrderedDict()  # database -> user, LEAST RECENTLY RELEASED FIRST
+        self.inUse = {}  # database -> user
+        self.opened = {}  # user -> number of databases open or being opened for the user
+        self.total = 0  # databases open or being opened for all users
+        self.waiters = []  # FUTURES OF acquire CALLS WAITING FOR A DATABASE TO BE RELEASED OR CLOSED
+        self.closed = False
+
+    async def acquire(self, loop, executor, user, databaseFile, backupFile):
+        """takes a database for the user out of the pool. if the user has none idle, one is opened as long as
+            the user and the pool are under their limits, closing the least recently used idle database of
+            another user if the pool is full. otherwise waits until one is released
+            @param loop (asyncio loop) - the running event loop
+            @param executor (Executor) - where databases are opened and closed
+            @param user (string) - the name of the user
+            @param databaseFile (string) - file path of the user's database
+            @param backupFile (string) - file path of the user's backup
+            @return (AccountDatabase) - the database, give it back with release
+        """
+
+        while True:
+            if self.closed:
+                raise RuntimeError("the pool is closed")
+
+            # THE USER'S MOST RECENTLY RELEASED DATABASE, ITS PAGES ARE THE MOST LIKELY TO STILL BE CACHED
+            for database in reversed(self.idle):
+                if self.idle[database] == user:
+                    del self.idle[database]
+                    self.inUse[database] = user
+                    return database
+
+            if self.opened.get(user, 0) < self.connectionsPerUser:
+                evicted = None
+                if self.total >= self.maxConnections and self.idle:
+                    evicted, owner = self.idle.popitem(last=False)
+                    self._forget(owner)
+
+                if self.total < self.maxConnections:
+                    self.opened[user] = self.opened.get(user, 0) + 1
+                    self.total += 1
+                    try:
+                        if evicted is not None:
+                            await loop.run_in_executor(executor, evicted.close)
+                        # EACH CONNECTION WOULD HAVE ITS OWN SEARCH CACHE THAT THE OTHERS' WRITES DO NOT INVALIDATE
+                        database = await loop.run_in_executor(executor, lambda: AccountDatabase(
+                            user, databaseFile, backupFile, EncryptChars, EncryptShift, searchCacheSize=0,
+                            checkSameThread=False))
+                    except BaseException:
+                        self._forget(user)
+                        raise
+                    self.inUse[database] = user
+                    if self.closed:
+                        self.release(user, database)
+                        raise RuntimeError("the pool is closed")
+                    return database
+
+            waiter = loop.create_future()
+            self.waiters.append(waiter)
+            await waiter
+
+    def release(self, user, database):
+        """gives a database back to the pool
+            @param user (string) - the name of the user
+            @param database (AccountDatabase) - the database from acquire
+        """
+
+        if self.inUse.pop(database, None) is None:
+            return  # CLOSED BY close() WHILE IT WAS BEING USED
+        if self.closed:
+            database.close()
+            self._forget(user)
+            return
+        self.idle[database] = user
+        self._wake()
+
+    def _forget(self, user):
+        """counts a database of the user as closed and wakes anything waiting for room
+            @param user (string) - the name of the user
+        """
+
+        self.opened[user] -= 1
+        if not self.opened[user]:
+            del self.opened[user]
+        self.total -= 1
+        self._wake()
+
+    def _wake(self):
+        """wakes every acquire call that is waiting, so each one checks the pool again"""
+
+        waiters = self.waiters
+        self.waiters = []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def close(self):
+        """closes every database, the ones still being used as well, so uses kept in memory are written.
+            call it once nothing is running on the databases any more, like after the executor is shut down
+        """
+
+        self.closed = True
+        for databases in (self.idle, self.inUse):
+            while databases:
+                database, user = databases.popitem()
+                database.close()
+                self._forget(user)
+
+
+class VaultServer:
+    """serves the account databases of every user in the users database"""
+
+    def __init__(self, usersFile=UsersFile, threads=16, connectionsPerUser=4, maxConnections=64):
+        """sets up the server without starting it
+            @param usersFile (string) - file path of the users database
+            @param threads (int) - number of threads that run the blocking sqlite work
+            @param connectionsPerUser (int) - most databases open at once for one user
+            @param maxConnections (int) - most databases open at once for all users together
+        """
+
+        self.users = UserDirectory(usersFile, checkSameThread=False)
+        for line in self.users.duplicate_report():
+            sys.stderr.write(line + "\n")
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.pool = VaultPool(connectionsPerUser, maxConnections)
+
+    def authenticate(self, username, password):
+        """checks a username and password against the users database, runs in the thread pool
+            @param username (string) - the name of the user
+            @param password (string) - the password the client sent
+            @return (tuple) - (user, database file, backup file), None if the login is wrong
+        """
+
+        record = self.users.authenticate(username, password)
+        if record is None:
+            return None
+        return (record.name,) + self.users.files(record)
+
+    def run_command(self, database, request):
+        """runs one request against a user's database, runs in the thread pool
+            @param database (AccountDatabase) - the user's database
+            @param request (dict) - the request from the client
+            @return - the result to send back
+        """
+
+        command = request.get("command")
+
+        if command == "search":
+            page, nextKey = database.find_page(database.encode(request["term"]), request.get("after"),
+                                               int(request.get("limit", 20)))
+            return {"names": list(page), "next": nextKey}
+
+        elif command == "display":
+            return database.get_account(database.encode(request["name"]))
+
+        elif command == "insert":
+            return database.add_accounts([request["account"]])
+
+        elif command == "modify":
+            return database.update_accounts({request["name"]: request["changes"]})
+
+        elif command == "remove":
+            return database.delete_account(database.encode(request["name"]))
+
+        elif command == "backup":
+            return database.backup(incremental=bool(request.get("incremental", False)))
+
+        raise ValueError("unknown command '%s'" % command)
+
+    async def handle_client(self, reader, writer):
+        """serves one client connection until it logs out or disconnects
+            @param reader (asyncio.StreamReader) - requests from the client
+            @param writer (asyncio.StreamWriter) - responses to the client
+        """
+
+        loop = asyncio.get_event_loop()
+        login = None
+        failedLogins = 0
+        loggedOut = False
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                try:
+                    request = json.loads(line.decode("utf-8"))
+                    command = request.get("command")
+
+                    if command == "logout":
+                        response = {"ok": True, "result": None}
+                        loggedOut = True
+
+                    elif command == "login":
+                        login = await loop.run_in_executor(self.executor, self.authenticate,
+                                                           request["username"], request["password"])
+                        if login is None:
+                            failedLogins += 1
+                            response = {"ok": False, "error": "wrong username or password"}
+                        else:
+                            response = {"ok": True, "result": login[0]}
+
+                    elif login is None:
+                        response = {"ok": False, "error": "log in first"}
+
+                    else:
+                        database = await self.pool.acquire(loop, self.executor, *login)
+                        try:
+                            result = await loop.run_in_executor(self.executor, self.run_command, database, request)
+                        finally:
+                            self.pool.release(login[0], database)
+                        response = {"ok": True, "result": result}
+
+                except Exception as error:
+                    response = {"ok": False, "error": "%s: %s" % (type(error).__name__, error)}
+
+                writer.write((json.dumps(response) + "\n").encode("utf-8"))
+                await writer.drain()
+
+                if loggedOut or failedLogins >= MaxLoginTries:
+                    break
+
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765, socketPath=None):
+        """listens for clients until the task is cancelled
+            @param host (string) - address to listen on, only used without socketPath
+            @param port (int) - port to listen on, only used without socketPath
+            @param socketPath (string) - file path of a unix socket to listen on instead of tcp
+        """
+
+        if socketPath is not None:
+            server = await asyncio.start_unix_server(self.handle_client, path=socketPath, limit=MaxRequestSize,
+                                                     backlog=Backlog)
+            os.chmod(socketPath, 0o600)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port, limit=MaxRequestSize,
+                                                backlog=Backlog)
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            # THE DATABASES ARE CLOSED ONCE NO THREAD IS USING THEM ANY MORE
+            self.executor.shutdown(wait=True)
+            self.pool.close()
+            self.users.close()
+
+
+def main(argv=None):
+    """command line entry point
+        @param argv (string[]) - command line arguments, sys.argv if None
+    """
+
+    parser = argparse.ArgumentParser(description="Serve every user's accounts over a local socket.")
+    parser.add_argument("--users", default=UsersFile, help="file path of the users database")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on")
+    parser.add_argument("--socket", default=None, help="listen on this unix socket instead of tcp")
+    parser.add_argument("--threads", type=int, default=16, help="threads that run database work")
+    parser.add_argument("--connections", type=int, default=4, help="most open databases per user")
+    parser.add_argument("--max-connections", type=int, default=64, help="most open databases for all users")
+    args = parser.parse_args(argv)
+
+    # OPT-IN PROFILING, SEE instrumentation.py
+    if os.environ.get("ACCOUNT_MANAGER_PROFILE"):
+        import instrumentation
+        instrumentation.enable_from_environment()
+
+    server = VaultServer(args.users, args.threads, args.connections, args.max_connections)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
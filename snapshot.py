@@ -0,0 +1,381 @@
+"""binary snapshots of an account database. unlike a .csv backup, the accounts stay encrypted.
+    usage: python snapshot.py write FILE --database DB [--compression zlib|lzma|none]
+           python snapshot.py restore FILE --database NEW_DB
+
+    a snapshot is a fixed size header followed by a compressed stream of records. the header holds
+        magic            8 bytes     b"AMSNAPSH"
+        version          2 bytes     SnapshotVersion, the columns of a record depend on it
+        compression      1 byte      index into Compressions
+        (unused)         1 byte
+        row count        8 bytes
+        cipher check    32 bytes     sha256 of the encryption settings, so a restore cannot mix them up
+        fingerprint key 32 bytes     key of the PASSWORD_FINGERPRINT column, so fingerprints stay valid
+    all numbers are big endian. every record is its length (4 bytes), the length of each value of SnapshotColumns
+    (4 bytes each, NullLength for NULL) and then the values, utf-8 text or decimal integers, exactly as they are
+    stored in the database.
+"""
+
+import argparse
+import binascii
+import hashlib
+import mmap
+import numbers
+import struct
+import sys
+import time
+import zlib
+
+# LZMA COMPRESSES BETTER BUT SLOWER, AND PYTHON 2 DOES NOT HAVE IT
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+# ERRORS RAISED FOR A DAMAGED COMPRESSED STREAM
+_compressionErrors = (zlib.error,) if lzma is None else (zlib.error, lzma.LZMAError)
+
+from config import EncryptChars, EncryptShift
+
+SnapshotMagic = b"AMSNAPSH"
+SnapshotVersion = 1
+
+# COLUMNS OF A RECORD, ID AND CHANGE_ID ARE GIVEN NEW VALUES WHEN THE SNAPSHOT IS RESTORED
+SnapshotColumns = ["NAME", "DESCRIPTION", "EMAIL", "USERNAME", "PASSWORD", "ACCESS_CODE", "WEBSITE", "ADDRESS",
+                   "PHONE_NUMBER", "MISCELLANEOUS_INFO", "PENDING_TASKS", "SEARCH_TAGS", "DATE_MODIFIED",
+                   "SEARCH_COUNT", "DATE_MODIFIED_TS", "PASSWORD_FINGERPRINT"]
+IntegerColumns = ["SEARCH_COUNT", "DATE_MODIFIED_TS"]
+
+Compressions = ["none", "zlib", "lzma"]
+NullLength = 0xFFFFFFFF
+
+_header = struct.Struct(">8sHBxQ32s32s")
+_length = struct.Struct(">I")
+_lengths = struct.Struct(">%dI" % len(SnapshotColumns))
+
+
+def cipher_check(database):
+    """identifies the encryption settings of a database without giving them away
+        @param database (AccountDatabase) - the database
+        @return (bytes) - sha256 of the settings
+    """
+
+    settings = (database.encryptChars, database.encryptShift, database.reservedSymbols)
+    return hashlib.sha256(repr(settings).encode("utf-8")).digest()
+
+
+def _compressor(compression):
+    """@return - object with compress() and flush() for the compression, None for "none"
+        @raise ValueError - if the compression is unknown or lzma is not available
+    """
+
+    if compression == "zlib":
+        return zlib.compressobj(6)
+    if compression == "lzma":
+        if lzma is None:
+            raise ValueError("lzma compression is not available in this version of python")
+        return lzma.LZMACompressor(preset=1)
+    if compression == "none":
+        return None
+    raise ValueError("compression must be one of %s, not '%s'" % (", ".join(Compressions), compression))
+
+
+def _decompressor(compression):
+    """@return - object with decompress() for the compression, None for "none"
+        @raise ValueError - if lzma is needed but not available
+    """
+
+    if compression == "zlib":
+        return zlib.decompressobj()
+    if compression == "lzma":
+        if lzma is None:
+            raise ValueError("the snapshot is compressed with lzma, which is not available in this version of python")
+        return lzma.LZMADecompressor()
+    return None
+
+
+def _finished(decompressor):
+    """@param decompressor - object from _decompressor that every compressed byte was given to, or None
+        @return (bool) - True if the compressed stream ended, False if it was cut short
+    """
+
+    if decompressor is None:
+        return True
+    if hasattr(decompressor, "eof"):
+        return decompressor.eof
+
+    # PYTHON 2'S zlib HAS NO eof. A BYTE GIVEN TO A STREAM THAT HAS ENDED IS LEFT IN unused_data
+    try:
+        decompressor.decompress(b"\0")
+    except zlib.error:
+        return False
+    return decompressor.unused_data.endswith(b"\0")
+
+
+def pack_record(row):
+    """packs one row into a length prefixed record
+        @param row (tuple) - values of SnapshotColumns
+        @return (bytes) - the record
+    """
+
+    values = []
+    lengths = []
+    for value in row:
+        if value is None:
+            lengths.append(NullLength)
+            continue
+        if isinstance(value, numbers.Integral):
+            value = str(value)
+        value = value.encode("utf-8")
+        values.append(value)
+        lengths.append(len(value))
+
+    body = _lengths.pack(*lengths) + b"".join(values)
+    return _length.pack(len(body)) + body
+
+
+def write_snapshot(database, path, compression="zlib", chunkSize=10000, bufferSize=1 << 20):
+    """writes every account of a database to a snapshot, still encrypted.
+        rows are read in chunks with fetchmany and compressed as they are written, so the whole database is never
+        held in memory. the accounts are read inside one transaction, so the snapshot is consistent
+        @param database (AccountDatabase) - the database to snapshot
+        @param path (string) - file path of the snapshot
+        @param compression (string) - "zlib", "lzma" or "none"
+        @param chunkSize (int) - number of rows read and packed at a time
+        @param bufferSize (int) - bytes of the file buffer
+        @return (dict) - number of "rows", "bytes" written and "seconds" taken
+    """
+
+    start = time.time()
+    compressor = _compressor(compression)
+    fingerprintKey = binascii.unhexlify(database.get_setting("fingerprint_key"))
+
+    # ANY USES KEPT IN MEMORY ARE WRITTEN FIRST SO THE SNAPSHOT HAS THEM
+    database.flush_search_counts()
+    database.dataBase.commit()
+    cursor = database.dataBase.cursor()
+    count = 0
+    try:
+        with open(path, "wb", bufferSize) as snapshot:
+            # THE ROW COUNT IS FILLED IN ONCE IT IS KNOWN
+            snapshot.write(_header.pack(SnapshotMagic, SnapshotVersion, Compressions.index(compression), 0,
+                                        cipher_check(database), fingerprintKey))
+
+            cursor.execute("BEGIN;")
+            cursor.execute("SELECT %s FROM accounts ORDER BY ID;" % ", ".join(SnapshotColumns))
+            rows = cursor.fetchmany(chunkSize)
+            while rows:
+                data = b"".join([pack_record(row) for row in rows])
+                snapshot.write(data if compressor is None else compressor.compress(data))
+                count += len(rows)
+                rows = cursor.fetchmany(chunkSize)
+            if compressor is not None:
+                snapshot.write(compressor.flush())
+
+            snapshot.seek(0)
+            snapshot.write(_header.pack(SnapshotMagic, SnapshotVersion, Compressions.index(compression), count,
+                                        cipher_check(database), fingerprintKey))
+            snapshot.seek(0, 2)
+            size = snapshot.tell()
+    finally:
+        database.dataBase.rollback()
+        cursor.close()
+
+    return {"rows": count, "bytes": size, "seconds": time.time() - start}
+
+
+class SnapshotReader:
+    """reads a snapshot through a memory map, decompressing and unpacking it a piece at a time"""
+
+    def __init__(self, path, readSize=1 << 20):
+        """opens a snapshot and reads its header
+            @param path (string) - file path of the snapshot
+            @param readSize (int) - bytes of the file decompressed at a time
+            @raise ValueError - if the file is not a snapshot this version can read
+        """
+
+        self.path = path
+        self.readSize = readSize
+        self.file = open(path, "rb")
+        self.map = None
+        try:
+            header = self.file.read(_header.size)
+            if len(header) < _header.size or header[:len(SnapshotMagic)] != SnapshotMagic:
+                raise ValueError("'%s' is not an account snapshot" % path)
+
+            (magic, self.version, compression, self.rowCount, self.cipherCheck,
+             self.fingerprintKey) = _header.unpack(header)
+            if self.version != SnapshotVersion:
+                raise ValueError("'%s' is a version %d snapshot, this program reads version %d" %
+                                 (path, self.version, SnapshotVersion))
+            if compression >= len(Compressions):
+                raise ValueError("'%s' uses an unknown compression" % path)
+            self.compression = Compressions[compression]
+
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self.close()
+            raise
+
+    def __iter__(self):
+        """unpacks the records in the order they were written
+            @return (generator) - a tuple of the values of SnapshotColumns for each account
+            @raise ValueError - if the snapshot is cut short or damaged
+        """
+
+        decompressor = _decompressor(self.compression)
+        integers = [SnapshotColumns.index(column) for column in IntegerColumns]
+        count = 0
+        pending = b""  # THE START OF A RECORD THAT CONTINUES IN THE NEXT PIECE
+
+        for offset in range(_header.size, len(self.map), self.readSize):
+            data = self.map[offset:offset + self.readSize]
+            if decompressor is not None:
+                try:
+                    data = decompressor.decompress(data)
+                except _compressionErrors as error:
+                    raise ValueError("'%s' is damaged: %s" % (self.path, error))
+            data = pending + data if pending else data
+
+            position = 0
+            end = len(data)
+            while end - position >= _length.size:
+                length = _length.unpack_from(data, position)[0]
+                if end - position - _length.size < length:
+                    break
+
+                lengths = _lengths.unpack_from(data, position + _length.size)
+                position += _length.size + _lengths.size
+                row = []
+                for length in lengths:
+                    if length == NullLength:
+                        row.append(None)
+                    else:
+                        row.append(data[position:position + length].decode("utf-8"))
+                        position += length
+                for index in integers:
+                    if row[index] is not None:
+                        row[index] = int(row[index])
+                yield tuple(row)
+                count += 1
+
+            pending = data[position:]
+
+        if pending or count != self.rowCount or not _finished(decompressor):
+            raise ValueError("'%s' is cut short or damaged, it has %d of its %d accounts" %
+                             (self.path, count, self.rowCount))
+
+    def close(self):
+        """closes the memory map and the file"""
+
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+
+def restore_snapshot(database, path, batchSize=10000):
+    """loads a snapshot into an empty database in a single transaction, so either every account is restored or
+        none of them are. the database has to use the encryption settings the snapshot was written with
+        @param database (AccountDatabase) - the database to restore into, it must not have any accounts
+        @param path (string) - file path of the snapshot
+        @param batchSize (int) - number of rows written with each executemany
+        @return (dict) - number of "rows" restored and "seconds" taken
+        @raise ValueError - if the database has accounts, the encryption settings differ or the snapshot is damaged
+    """
+
+    start = time.time()
+    reader = SnapshotReader(path)
+    try:
+        if reader.cipherCheck != cipher_check(database):
+            raise ValueError("'%s' was written with different encryption settings" % path)
+        if database.db.execute("SELECT 1 FROM accounts LIMIT 1;").fetchone() is not None:
+            raise ValueError("a snapshot can only be restored into a database without accounts")
+
+        insertSql = "INSERT INTO accounts (%s) VALUES (%s);" % (", ".join(SnapshotColumns),
+                                                                ",".join("?" * len(SnapshotColumns)))
+        count = 0
+        database.dataBase.commit()
+        database.db.execute("BEGIN;")
+        try:
+            # THE FINGERPRINTS IN THE SNAPSHOT WERE MADE WITH ITS KEY
+            database.set_setting("fingerprint_key", binascii.hexlify(reader.fingerprintKey).decode("ascii"))
+            database.load_fingerprint_key()
+
+            # THE INDEXES AND TRIGGERS ARE DROPPED WHILE THE ROWS ARE LOADED AND BUILT ONCE AT THE END,
+            # WHICH IS SEVERAL TIMES FASTER THAN KEEPING THEM UP TO DATE A ROW AT A TIME
+            objects = database.db.execute("SELECT type, name, sql FROM sqlite_master WHERE tbl_name = 'accounts' "
+                                          "AND type IN ('index', 'trigger') AND sql IS NOT NULL;").fetchall()
+            for objectType, name, sql in objects:
+                database.db.execute("DROP %s %s;" % (objectType.upper(), name))
+
+            batch = []
+            for row in reader:
+                batch.append(row)
+                if len(batch) >= batchSize:
+                    database.db.executemany(insertSql, batch)
+                    count += len(batch)
+                    batch = []
+            database.db.executemany(insertSql, batch)
+            count += len(batch)
+
+            # EACH ACCOUNT TAKES THE NEXT VALUE OF THE CHANGE COUNTER, THE SAME AS THE INSERT TRIGGER WOULD GIVE IT.
+            # THE TABLE WAS EMPTY, SO THE IDS START AT 1
+            counter = database.get_setting("change_counter", 0)
+            database.db.execute("UPDATE accounts SET CHANGE_ID = ID + ?;", (counter,))
+            database.set_setting("change_counter", counter + database.db.execute(
+                "SELECT IFNULL(MAX(ID), 0) FROM accounts;").fetchone()[0])
+
+            for objectType, name, sql in objects:
+                database.db.execute(sql)
+            if database.searchIndex:
+                database.db.execute("INSERT INTO accounts_search (accounts_search) VALUES ('rebuild');")
+        except BaseException:
+            database.dataBase.rollback()
+            database.load_fingerprint_key()
+            raise
+    finally:
+        reader.close()
+
+    database.dataBase.commit()
+    database.searchCache.clear()
+    if database.nameIndex is not None:
+        database.load_name_index()
+    database.notify_writes(count)
+    return {"rows": count, "seconds": time.time() - start}
+
+
+def main(argv=None):
+    """writes or restores a snapshot from the command line
+        @param argv (string[]) - command line arguments, sys.argv if None
+        @return (int) - exit status
+    """
+
+    from database import AccountDatabase
+
+    parser = argparse.ArgumentParser(description="Write or restore an encrypted binary snapshot of an account "
+                                                 "database.")
+    parser.add_argument("action", choices=["write", "restore"])
+    parser.add_argument("file", help="file path of the snapshot")
+    parser.add_argument("--database", required=True, help="file path of the account database")
+    parser.add_argument("--compression", choices=Compressions, default="zlib",
+                        help="how the snapshot is compressed when it is written")
+    args = parser.parse_args(argv)
+
+    database = AccountDatabase("snapshot", args.database, None, EncryptChars, EncryptShift)
+    try:
+        if args.action == "write":
+            result = write_snapshot(database, args.file, args.compression)
+            print("%(rows)d accounts written (%(bytes)d bytes) in %(seconds).2f seconds" % result)
+        else:
+            result = restore_snapshot(database, args.file)
+            print("%(rows)d accounts restored in %(seconds).2f seconds" % result)
+    except (IOError, OSError, ValueError) as error:
+        print(error)
+        return 1
+    finally:
+        database.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
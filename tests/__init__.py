@@ -0,0 +1 @@
+"""tests of the account manager, run with python -m pytest or python -m unittest discover tests"""
@@ -0,0 +1,136 @@
+"""round trips of AccountDatabase.backup and import_csv under each conflict policy"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from config import EncryptChars, EncryptShift
+from database import AccountDatabase, open_csv
+
+
+class ImportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.databases = []
+
+        # THE BACKUP THAT IS IMPORTED, THREE ACCOUNTS
+        source = self.open_database("source")
+        source.add_accounts([
+            {"NAME": "bank", "PASSWORD": "backup bank", "EMAIL": "me@bank.com", "PENDING_TASKS": "call"},
+            {"NAME": "mail", "PASSWORD": "backup mail", "SEARCH_TAGS": "email"},
+            {"NAME": "shop", "PASSWORD": "backup shop", "DESCRIPTION": "a \"quoted\", comma"},
+        ])
+        source.backup()
+        self.backupFile = source.backupFile
+
+    def tearDown(self):
+        for database in self.databases:
+            database.close()
+        shutil.rmtree(self.folder)
+
+    def open_database(self, name):
+        """@return (AccountDatabase) - a new database in the test folder, closed by tearDown"""
+
+        database = AccountDatabase(name, os.path.join(self.folder, name + ".db"),
+                                   os.path.join(self.folder, name + ".csv"), EncryptChars, EncryptShift)
+        self.databases.append(database)
+        return database
+
+    def target(self):
+        """@return (AccountDatabase) - a database that already has a "bank" account of its own"""
+
+        database = self.open_database("target")
+        database.add_accounts([{"NAME": "bank", "PASSWORD": "existing bank"}])
+        return database
+
+    def accounts(self, database):
+        """@return (dict) - decrypted information of every account, keyed by name"""
+
+        rows = database.decode_rows(database.db.execute(
+            "SELECT %s FROM accounts;" % ", ".join(database.backupColumns)).fetchall())
+        return dict((row[0], dict(zip(database.backupColumns, row))) for row in rows)
+
+    def test_round_trip_into_empty_database(self):
+        database = self.open_database("empty")
+        counts = database.import_csv(self.backupFile)
+
+        self.assertEqual(counts, {"inserted": 3, "updated": 0, "renamed": 0, "skipped": 0})
+        self.assertEqual(self.accounts(database), self.accounts(self.databases[0]))
+
+        # THE IMPORTED ACCOUNTS CAN BE FOUND, THEIR FINGERPRINTS AND TIMESTAMPS WERE WRITTEN AS WELL
+        self.assertEqual(database.find_page(database.encode("email"))[0], ("mail",))
+        self.assertEqual(database.db.execute("SELECT COUNT(*) FROM accounts WHERE PASSWORD_FINGERPRINT IS NULL "
+                                             "OR DATE_MODIFIED_TS = 0;").fetchone()[0], 0)
+
+    def test_skip_keeps_existing_account(self):
+        database = self.target()
+        counts = database.import_csv(self.backupFile, conflict="skip")
+
+        self.assertEqual(counts, {"inserted": 2, "updated": 0, "renamed": 0, "skipped": 1})
+        accounts = self.accounts(database)
+        self.assertEqual(sorted(accounts), ["bank", "mail", "shop"])
+        self.assertEqual(accounts["bank"]["PASSWORD"], "existing bank")
+
+    def test_overwrite_replaces_existing_account(self):
+        database = self.target()
+        counts = database.import_csv(self.backupFile, conflict="overwrite")
+
+        self.assertEqual(counts, {"inserted": 2, "updated": 1, "renamed": 0, "skipped": 0})
+        accounts = self.accounts(database)
+        self.assertEqual(sorted(accounts), ["bank", "mail", "shop"])
+        self.assertEqual(accounts["bank"], self.accounts(self.databases[0])["bank"])
+
+        # THE FINGERPRINT FOLLOWS THE NEW PASSWORD
+        self.assertEqual(database.db.execute("SELECT PASSWORD_FINGERPRINT FROM accounts WHERE NAME = ?;",
+                                             (database.encode("bank"),)).fetchone()[0],
+                         database.password_fingerprint("backup bank"))
+
+    def test_rename_imports_a_copy(self):
+        database = self.target()
+        database.add_accounts([{"NAME": "bank (2)", "PASSWORD": "taken"}])
+        counts = database.import_csv(self.backupFile, conflict="rename")
+
+        self.assertEqual(counts, {"inserted": 2, "updated": 0, "renamed": 1, "skipped": 0})
+        accounts = self.accounts(database)
+        self.assertEqual(sorted(accounts), ["bank", "bank (2)", "bank (3)", "mail", "shop"])
+        self.assertEqual(accounts["bank"]["PASSWORD"], "existing bank")
+        self.assertEqual(accounts["bank (3)"]["PASSWORD"], "backup bank")
+
+        # IMPORTING AGAIN RENAMES EVERY ROW, NONE OF THE NEW NAMES ARE TAKEN
+        counts = database.import_csv(self.backupFile, conflict="rename")
+        self.assertEqual(counts, {"inserted": 0, "updated": 0, "renamed": 3, "skipped": 0})
+        self.assertIn("bank (4)", self.accounts(database))
+        self.assertIn("shop (2)", self.accounts(database))
+
+    def test_incremental_rows_overwrite_in_order(self):
+        source = self.databases[0]
+        source.update_accounts({"bank": {"PASSWORD": "second"}})
+        source.backup(incremental=True)
+        source.update_accounts({"bank": {"PASSWORD": "third"}})
+        source.backup(incremental=True)
+
+        database = self.open_database("restore")
+        counts = database.import_csv(self.backupFile, conflict="overwrite")
+
+        # THE FULL BACKUP INSERTS bank, THE TWO APPENDED ROWS UPDATE IT, THE LATEST ONE WINS
+        self.assertEqual(counts, {"inserted": 3, "updated": 2, "renamed": 0, "skipped": 0})
+        self.assertEqual(self.accounts(database)["bank"]["PASSWORD"], "third")
+
+    def test_bad_file_imports_nothing(self):
+        database = self.target()
+
+        # A ROW WITH A MISSING COLUMN AFTER SOME GOOD ONES ROLLS BACK THE WHOLE IMPORT
+        with open_csv(self.backupFile, "a") as csvfile:
+            csvfile.write("broken,row\r\n")
+        with self.assertRaises(ValueError):
+            database.import_csv(self.backupFile, batchSize=1)
+        self.assertEqual(sorted(self.accounts(database)), ["bank"])
+
+        with self.assertRaises(ValueError):
+            database.import_csv(self.backupFile, conflict="merge")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""profiling: turning it on from the environment and using a database while it records"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import connection
+import instrumentation
+from config import EncryptChars, EncryptShift
+from database import AccountDatabase
+
+
+class InstrumentationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.environment = os.environ.get("ACCOUNT_MANAGER_PROFILE")
+        instrumentation.profiler.reset()
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.profiler.reset()
+        if self.environment is None:
+            os.environ.pop("ACCOUNT_MANAGER_PROFILE", None)
+        else:
+            os.environ["ACCOUNT_MANAGER_PROFILE"] = self.environment
+        shutil.rmtree(self.folder)
+
+    def test_enable_from_environment(self):
+        # THE EXIT HOOK CANNOT BE TAKEN BACK, SO THE REPORT IT WRITES IS THROWN AWAY
+        os.environ["ACCOUNT_MANAGER_PROFILE"] = os.devnull
+        instrumentation.enable_from_environment()
+        self.assertIs(connection.connectionFactory, instrumentation.InstrumentedConnection)
+
+        database = AccountDatabase("accounts", os.path.join(self.folder, "accounts.db"), None,
+                                   EncryptChars, EncryptShift)
+        try:
+            database.add_accounts([{"NAME": "mail", "PASSWORD": "secret"}])
+            names, following = database.find_page(database.encode("mail"))
+            self.assertEqual(list(names), ["mail"])
+        finally:
+            database.close()
+
+        report = instrumentation.report()
+        self.assertIn("AccountDatabase.add_accounts", report)
+        self.assertIn("Cipher.", report)
+
+    def test_disable(self):
+        original = AccountDatabase.__dict__["add_accounts"]
+        instrumentation.enable(reportOnExit=False)
+        self.assertIsNot(AccountDatabase.__dict__["add_accounts"], original)
+        instrumentation.disable()
+        self.assertIs(AccountDatabase.__dict__["add_accounts"], original)
+        self.assertIsNone(connection.connectionFactory)
+
+
+if __name__ == "__main__":
+    unittest.main()
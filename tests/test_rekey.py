@@ -0,0 +1,228 @@
+"""re-encryption with rekey.py: interrupted runs that are resumed, and changes made while a table is copied"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import rekey
+from config import EncryptChars, EncryptShift, user_files
+from connection import connect
+from database import AccountDatabase
+from encryption import get_cipher
+
+NewShift = EncryptShift + 7
+
+
+class Interrupted(Exception):
+    pass
+
+
+class InterruptedRekey(rekey.Rekey):
+    """a rekey that stops the run after re-encrypting a number of chunks, like the program being killed"""
+
+    def __init__(self, chunks):
+        rekey.Rekey.__init__(self, EncryptChars, EncryptShift, EncryptChars, NewShift)
+        self.chunks = chunks
+
+    def rows(self, rows, columns):
+        if self.chunks == 0:
+            raise Interrupted()
+        self.chunks -= 1
+        return rekey.Rekey.rows(self, rows, columns)
+
+
+class RekeyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.rekey = rekey.Rekey(EncryptChars, EncryptShift, EncryptChars, NewShift)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def open_database(self, name="user", shift=EncryptShift):
+        """@return (AccountDatabase) - the user's database, encrypted with shift"""
+
+        return AccountDatabase(name, os.path.join(self.folder, name + ".db"), os.path.join(self.folder, name + ".csv"),
+                               EncryptChars, shift)
+
+    def make_accounts(self, count, name="user"):
+        """creates a database with count accounts and closes it
+            @return (string) - file path of the database
+        """
+
+        database = self.open_database(name)
+        database.add_accounts({"NAME": "account %03d" % number, "PASSWORD": "password %d" % number,
+                               "SEARCH_TAGS": "tag%d" % (number % 3)} for number in range(count))
+        path = database.dbFile
+        database.close()
+        return path
+
+    def read_accounts(self, shift=NewShift, name="user"):
+        """@return (dict) - name -> password of every account, decrypted with shift"""
+
+        database = self.open_database(name, shift)
+        try:
+            rows = database.decode_rows(database.db.execute("SELECT NAME, PASSWORD FROM accounts;").fetchall())
+        finally:
+            database.close()
+        return dict(rows)
+
+    def rekey_database(self, path, rekeyer, chunkSize=10):
+        """runs rekey_table on the accounts of a database file
+            @return (int) - rows re-encrypted, None if it was already done
+        """
+
+        database = connect(path, isolation_level=None)
+        try:
+            return rekey.rekey_table(database, "accounts", rekey.AccountColumns, rekeyer, None, chunkSize)
+        finally:
+            database.close()
+
+    def test_rekey_table(self):
+        path = self.make_accounts(25)
+        before = self.read_accounts(EncryptShift)
+
+        self.assertEqual(self.rekey_database(path, self.rekey), 25)
+        self.assertEqual(self.read_accounts(), before)
+
+        # THE SAME SETTINGS AGAIN DO NOTHING
+        self.assertIsNone(self.rekey_database(path, self.rekey))
+        self.assertEqual(self.read_accounts(), before)
+
+    def test_search_index_and_triggers_survive_the_swap(self):
+        path = self.make_accounts(25)
+        self.rekey_database(path, self.rekey)
+
+        database = self.open_database(shift=NewShift)
+        try:
+            self.assertEqual(len(list(database.iter_matches(database.encode("tag1")))), 8)
+            self.assertEqual(list(database.iter_matches(database.encode("account 007"))), ["account 007"])
+
+            # THE CHANGE_ID TRIGGER STILL NUMBERS WRITES, SO INCREMENTAL BACKUPS KEEP WORKING
+            counter = database.get_setting("change_counter")
+            database.update_accounts({"account 001": {"PASSWORD": "changed"}})
+            self.assertEqual(database.get_setting("change_counter"), counter + 1)
+            self.assertEqual(database.db.execute("SELECT CHANGE_ID FROM accounts WHERE NAME = ?;",
+                                                 (database.encode("account 001"),)).fetchone()[0], counter + 1)
+        finally:
+            database.close()
+
+    def test_interrupted_rekey_resumes_with_changes_made_in_between(self):
+        path = self.make_accounts(50)
+
+        # STOPS AFTER TWO CHUNKS, THE FIRST 20 ROWS ARE IN THE SHADOW TABLE AND CHECKPOINTED
+        with self.assertRaises(Interrupted):
+            self.rekey_database(path, InterruptedRekey(2))
+        database = sqlite3.connect(path)
+        self.assertEqual(database.execute("SELECT COUNT(*) FROM accounts_rekey;").fetchone()[0], 20)
+        self.assertEqual(rekey.get_setting(database, "rekey_checkpoint"), 20)
+        database.close()
+
+        # THE PROGRAM KEEPS USING THE DATABASE WITH THE OLD SETTINGS: ROWS ALREADY COPIED ARE CHANGED AND
+        # DELETED, ONE NOT COPIED YET IS CHANGED, AND ONE IS ADDED
+        database = self.open_database()
+        database.update_accounts({"account 003": {"PASSWORD": "changed after copy"},
+                                  "account 040": {"PASSWORD": "changed before copy"},
+                                  "account 005": {"NAME": "renamed 005"}})
+        database.delete_account(database.encode("account 010"))
+        database.add_accounts([{"NAME": "added", "PASSWORD": "new account"}])
+        database.close()
+        expected = self.read_accounts(EncryptShift)
+
+        # THE SECOND RUN ONLY COPIES THE ROWS AFTER THE CHECKPOINT, THE SWAP CATCHES UP THE REST
+        self.assertEqual(self.rekey_database(path, self.rekey), 31)
+        self.assertEqual(self.read_accounts(), expected)
+        self.assertEqual(expected["account 003"], "changed after copy")
+        self.assertNotIn("account 010", expected)
+
+        database = sqlite3.connect(path)
+        self.assertIsNone(rekey.get_setting(database, "rekey_checkpoint"))
+        self.assertIsNone(database.execute("SELECT name FROM sqlite_master WHERE name = 'accounts_rekey';").fetchone())
+        database.close()
+
+    def test_uses_counted_during_the_copy_are_kept(self):
+        path = self.make_accounts(30)
+
+        with self.assertRaises(Interrupted):
+            self.rekey_database(path, InterruptedRekey(2))
+
+        # A ROW ALREADY IN THE SHADOW TABLE AND ONE NOT COPIED YET ARE USED
+        database = self.open_database()
+        database.count_use(database.encode("account 004"))
+        database.count_use(database.encode("account 004"))
+        database.count_use(database.encode("account 025"))
+        database.close()
+
+        self.rekey_database(path, self.rekey)
+        database = self.open_database(shift=NewShift)
+        try:
+            counts = dict(database.decode_rows(database.db.execute(
+                "SELECT NAME, SEARCH_COUNT FROM accounts WHERE SEARCH_COUNT > 0;").fetchall(), [0]))
+        finally:
+            database.close()
+        self.assertEqual(counts, {"account 004": 2, "account 025": 1})
+
+    def test_shadow_of_other_settings_is_thrown_away(self):
+        path = self.make_accounts(30)
+        before = self.read_accounts(EncryptShift)
+
+        with self.assertRaises(Interrupted):
+            self.rekey_database(path, InterruptedRekey(1))
+
+        # A RUN WITH A DIFFERENT NEW SHIFT STARTS OVER INSTEAD OF MIXING ROWS OF BOTH
+        other = rekey.Rekey(EncryptChars, EncryptShift, EncryptChars, NewShift + 1)
+        self.assertEqual(self.rekey_database(path, other), 30)
+        self.assertEqual(self.read_accounts(NewShift + 1), before)
+
+    def test_rekey_all_with_worker_processes(self):
+        usersFile = os.path.join(self.folder, "users.db")
+        users = connect(usersFile)
+        users.execute("CREATE TABLE users (ID INTEGER PRIMARY KEY UNIQUE NOT NULL, USERNAME TEXT, PASSWORD TEXT, "
+                      "DATABASE_PATH TEXT, BACKUP_LOCATION TEXT);")
+        cipher = get_cipher(EncryptChars, EncryptShift, "")
+        for name in ("amy", "bob"):
+            self.make_accounts(40, name)
+            users.execute("INSERT INTO users (USERNAME, PASSWORD, DATABASE_PATH, BACKUP_LOCATION) VALUES (?,?,?,?);",
+                          cipher.encrypt_many([name, "secret", self.folder, self.folder]))
+        users.commit()
+        users.close()
+        before = self.read_accounts(EncryptShift, "bob")
+
+        results = rekey.rekey_all(usersFile, self.rekey, workers=2, chunkSize=7)
+        self.assertEqual([result["error"] for result in results], [None, None, None])
+        self.assertEqual([result["rows"] for result in results], [40, 40, 2])
+        self.assertEqual(self.read_accounts(NewShift, "bob"), before)
+
+        # users.db IS NOW ENCRYPTED WITH THE NEW SETTINGS, AND A SECOND RUN STILL FINDS THE DATABASES
+        users = connect(usersFile)
+        row = users.execute("SELECT USERNAME, DATABASE_PATH, BACKUP_LOCATION FROM users ORDER BY ID;").fetchone()
+        users.close()
+        self.assertEqual(user_files(*get_cipher(EncryptChars, NewShift, "").decrypt_many(list(row)))[0],
+                         os.path.join(self.folder, "amy.db"))
+        results = rekey.rekey_all(usersFile, self.rekey, workers=1)
+        self.assertEqual([result["rows"] for result in results], [None, None, None])
+
+    def test_missing_database_leaves_users_alone(self):
+        usersFile = os.path.join(self.folder, "users.db")
+        users = connect(usersFile)
+        users.execute("CREATE TABLE users (ID INTEGER PRIMARY KEY UNIQUE NOT NULL, USERNAME TEXT, PASSWORD TEXT, "
+                      "DATABASE_PATH TEXT, BACKUP_LOCATION TEXT);")
+        users.execute("INSERT INTO users (USERNAME, PASSWORD, DATABASE_PATH, BACKUP_LOCATION) VALUES (?,?,?,?);",
+                      get_cipher(EncryptChars, EncryptShift, "").encrypt_many(["ghost", "secret", self.folder,
+                                                                               self.folder]))
+        users.commit()
+        users.close()
+
+        results = rekey.rekey_all(usersFile, self.rekey, workers=1)
+        self.assertTrue(results[0]["error"])
+        self.assertTrue(results[1]["error"])
+        users = sqlite3.connect(usersFile)
+        self.assertIsNone(rekey.get_setting(users, "rekey_completed"))
+        users.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
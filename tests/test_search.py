@@ -0,0 +1,134 @@
+"""keyset pages of search results (find_page and iter_matches) while SEARCH_COUNT changes"""
+
+import itertools
+import os
+import shutil
+import tempfile
+import unittest
+
+from config import EncryptChars, EncryptShift
+from database import AccountDatabase
+
+
+class SearchPagingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.database = AccountDatabase("user", os.path.join(self.folder, "user.db"),
+                                        os.path.join(self.folder, "user.csv"), EncryptChars, EncryptShift,
+                                        searchCountFlushSize=1000)
+
+        # 40 ACCOUNTS, HALF OF THEM TAGGED "even", WITH MIXED CASE SO ORDER IGNORES CASE
+        self.names = ["%s%02d" % ("Site" if number % 4 == 0 else "site", number) for number in range(40)]
+        self.database.add_accounts({"NAME": name, "SEARCH_TAGS": "even" if number % 2 == 0 else "odd"}
+                                   for number, name in enumerate(self.names))
+
+    def tearDown(self):
+        self.database.close()
+        shutil.rmtree(self.folder)
+
+    def use(self, name, times):
+        """counts uses of an account and writes them, like picking it from the search results"""
+
+        for _ in range(times):
+            self.database.count_use(self.database.encode(name))
+        self.database.flush_search_counts()
+
+    def counts(self):
+        """@return (dict) - decrypted name -> SEARCH_COUNT of every account"""
+
+        return dict(self.database.decode_rows(self.database.db.execute(
+            "SELECT NAME, SEARCH_COUNT FROM accounts;").fetchall(), [0]))
+
+    def check_pages(self, pages, names):
+        """checks that pages of results hold every name once, most used first across all of the pages,
+            and that each page is sorted most used first and then without regard to case
+            @param pages (tuple[]) - the pages of results
+            @param names (string[]) - the names that should be found
+        """
+
+        counts = self.counts()
+        found = [name for page in pages for name in page]
+        self.assertEqual(sorted(found), sorted(names))
+        self.assertEqual([counts[name] for name in found], sorted((counts[name] for name in names), reverse=True))
+        for page in pages:
+            self.assertEqual(list(page), sorted(page, key=lambda name: (-counts[name], name.lower())))
+
+    def pages(self, term, limit):
+        """@return (tuple[]) - every page of a search, read with find_page and the next page keys"""
+
+        pages = []
+        page, nextKey = self.database.find_page(self.database.encode(term), limit=limit)
+        pages.append(page)
+        while nextKey is not None:
+            # A NEXT PAGE KEY THAT DOES NOT MOVE FORWARD WOULD PAGE FOREVER
+            self.assertLessEqual(len(pages), len(self.names), "more pages than accounts")
+            page, nextKey = self.database.find_page(self.database.encode(term), nextKey, limit)
+            pages.append(page)
+        return pages
+
+    def matches(self, term, pageSize):
+        """@return (string[]) - iter_matches of a search, stopped one name after every account was found"""
+
+        return list(itertools.islice(self.database.iter_matches(self.database.encode(term), pageSize),
+                                     len(self.names) + 1))
+
+    def test_pages_cover_every_match_once(self):
+        pages = self.pages("all", 7)
+
+        self.assertEqual([len(page) for page in pages], [7, 7, 7, 7, 7, 5])
+        self.check_pages(pages, self.names)
+
+    def test_iter_matches_after_counts_change(self):
+        before = self.matches("all", 6)
+        self.assertEqual(sorted(before), sorted(self.names))
+
+        # SOME ACCOUNTS ARE USED, SEVERAL OF THEM THE SAME NUMBER OF TIMES, SO PAGES BREAK INSIDE EQUAL COUNTS
+        for name, times in [("site33", 5), ("Site12", 3), ("site07", 3), ("site21", 3), ("site02", 1),
+                            ("Site36", 1), ("site39", 1)]:
+            self.use(name, times)
+
+        after = self.matches("all", 6)
+        self.check_pages([after[start:start + 6] for start in range(0, len(after), 6)], self.names)
+        self.assertEqual(after[:4], ["site33", "site07", "Site12", "site21"])
+
+    def test_page_sizes_that_split_ties(self):
+        for name in self.names[::3]:
+            self.use(name, 2)
+
+        for limit in (1, 2, 5, 13, 40, 100):
+            self.check_pages(self.pages("all", limit), self.names)
+
+    def test_term_matches_page_in_order(self):
+        self.use("site05", 4)
+        self.use("site06", 2)
+        self.use("Site08", 2)
+        even = [name for number, name in enumerate(self.names) if number % 2 == 0]
+
+        # A LONG TERM GOES THROUGH THE FULL TEXT INDEX, A SHORT ONE THROUGH LIKE. site05 IS NOT TAGGED "even"
+        for term in ("even", "ev"):
+            self.check_pages(self.pages(term, 3), even)
+            self.assertEqual(self.matches(term, 3)[:2],
+                             ["site06", "Site08"], term)
+
+    def test_cached_pages_follow_written_counts(self):
+        first, nextKey = self.database.find_page(self.database.encode("all"), limit=5)
+        self.assertNotIn("site38", first)
+
+        # A USE THAT IS WRITTEN MOVES THE ACCOUNT TO THE FRONT, THE CACHED FIRST PAGE IS NOT SHOWN AGAIN
+        self.use("site38", 1)
+        first, nextKey = self.database.find_page(self.database.encode("all"), limit=5)
+        self.assertEqual(first[0], "site38")
+
+        # A RENAMED ACCOUNT KEEPS ITS USES, ONES NOT WRITTEN YET AS WELL
+        self.database.count_use(self.database.encode("site38"))
+        self.database.update_accounts({"site38": {"NAME": "renamed38"}})
+        self.database.flush_search_counts()
+        first, nextKey = self.database.find_page(self.database.encode("all"), limit=5)
+        self.assertEqual(first[0], "renamed38")
+        self.assertEqual(self.database.db.execute("SELECT SEARCH_COUNT FROM accounts WHERE NAME = ?;",
+                                                  (self.database.encode("renamed38"),)).fetchone()[0], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
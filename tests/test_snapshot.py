@@ -0,0 +1,94 @@
+"""binary snapshots: writing and restoring them, and snapshots that are cut short or damaged"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import snapshot
+from config import EncryptChars, EncryptShift
+from database import AccountDatabase
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.databases = []
+        self.source = self.open_database("source")
+        self.source.add_accounts({"NAME": "account %03d" % number, "PASSWORD": "password %d" % (number % 7),
+                                  "PENDING_TASKS": "renew" if number % 5 == 0 else "",
+                                  "DESCRIPTION": u"caf\u00e9 %d" % number} for number in range(300))
+        self.source.count_use(self.source.encode("account 042"))
+        self.source.db.execute("UPDATE accounts SET DESCRIPTION = NULL WHERE NAME = ?;",
+                               (self.source.encode("account 001"),))
+        self.source.dataBase.commit()
+
+    def tearDown(self):
+        for database in self.databases:
+            database.close()
+        shutil.rmtree(self.folder)
+
+    def open_database(self, name):
+        """@return (AccountDatabase) - a new database in the test folder, closed by tearDown"""
+
+        database = AccountDatabase(name, os.path.join(self.folder, name + ".db"), None, EncryptChars, EncryptShift)
+        self.databases.append(database)
+        return database
+
+    def rows(self, database):
+        """@return (tuple[]) - every account as it is stored, the snapshot columns only"""
+
+        return database.db.execute("SELECT %s FROM accounts ORDER BY ID;" %
+                                   ", ".join(snapshot.SnapshotColumns)).fetchall()
+
+    def write(self, compression):
+        """@return (string) - file path of a snapshot of the source database"""
+
+        path = os.path.join(self.folder, "accounts." + compression)
+        self.assertEqual(snapshot.write_snapshot(self.source, path, compression, chunkSize=64)["rows"], 300)
+        return path
+
+    def test_round_trip(self):
+        compressions = ["none", "zlib"] + (["lzma"] if snapshot.lzma is not None else [])
+        for compression in compressions:
+            path = self.write(compression)
+            database = self.open_database("restored_" + compression)
+            self.assertEqual(snapshot.restore_snapshot(database, path)["rows"], 300)
+
+            # THE ACCOUNTS, THEIR USES AND FINGERPRINTS ARE THE SAME, AND THE INDEXES ARE BACK
+            self.assertEqual(self.rows(database), self.rows(self.source))
+            self.assertEqual(database.reused_passwords(), self.source.reused_passwords())
+            self.assertEqual(list(database.iter_tasks()), list(self.source.iter_tasks()))
+            self.assertEqual(database.find_page(database.encode("account 04"), limit=3)[0][0], "account 042")
+
+    def test_restore_needs_empty_database(self):
+        path = self.write("zlib")
+        with self.assertRaises(ValueError):
+            snapshot.restore_snapshot(self.source, path)
+
+    def test_cut_short_snapshot_restores_nothing(self):
+        for compression, cut in [("zlib", 3), ("zlib", 500), ("none", 10)]:
+            path = self.write(compression)
+            with open(path, "rb") as original:
+                data = original.read()
+            with open(path, "wb") as damaged:
+                damaged.write(data[:-cut])
+
+            database = self.open_database("cut_%s_%d" % (compression, cut))
+            with self.assertRaises(ValueError):
+                snapshot.restore_snapshot(database, path)
+            self.assertEqual(self.rows(database), [])
+
+    def test_damaged_snapshot(self):
+        path = self.write("zlib")
+        with open(path, "r+b") as damaged:
+            damaged.seek(snapshot._header.size + 40)
+            damaged.write(b"\xff" * 16)
+
+        with self.assertRaises(ValueError):
+            snapshot.restore_snapshot(self.open_database("damaged"), path)
+
+
+if __name__ == "__main__":
+    unittest.main()
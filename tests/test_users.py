@@ -0,0 +1,108 @@
+"""the users database: removing the duplicate users of an old users database, also when it is opened twice at once"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+from config import EncryptChars, EncryptShift
+from encryption import get_cipher
+from users import UserDirectory
+
+# USERS OF A DATABASE CREATED BEFORE USERNAMES WERE UNIQUE, IN THE ORDER THEY REGISTERED
+OldUsers = [("bob", "first", "/one", "/one"), ("bob", "second", "/two", "/two"), ("amy", "secret", "/amy", "/amy"),
+            ("bob", "third", "/three", "/three")]
+
+
+class UserDirectoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.usersFile = os.path.join(self.folder, "users.db")
+
+        # IN WAL MODE LIKE A DATABASE THE PROGRAM HAS OPENED BEFORE, SWITCHING NEEDS THE DATABASE TO ITSELF
+        users = sqlite3.connect(self.usersFile)
+        users.execute("PRAGMA journal_mode = WAL;")
+        users.execute("CREATE TABLE users (ID INTEGER PRIMARY KEY UNIQUE NOT NULL, USERNAME TEXT, PASSWORD TEXT, "
+                      "DATABASE_PATH TEXT, BACKUP_LOCATION TEXT);")
+        cipher = get_cipher(EncryptChars, EncryptShift, "")
+        users.executemany("INSERT INTO users (USERNAME, PASSWORD, DATABASE_PATH, BACKUP_LOCATION) VALUES (?,?,?,?);",
+                          [cipher.encrypt_many(list(row)) for row in OldUsers])
+        users.commit()
+        users.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_duplicates_are_removed_once(self):
+        directory = UserDirectory(self.usersFile)
+        try:
+            self.assertEqual([record.password for record in directory.duplicatesRemoved], ["second", "third"])
+            self.assertEqual(len(directory.duplicate_report()), 2)
+            self.assertEqual([record.name for record in directory.users()], ["bob", "amy"])
+            self.assertEqual(directory.authenticate("bob", "first").databasePath, "/one")
+        finally:
+            directory.close()
+
+        directory = UserDirectory(self.usersFile)
+        try:
+            self.assertEqual(directory.duplicatesRemoved, [])
+        finally:
+            directory.close()
+
+    def test_database_migrated_while_waiting_for_the_lock(self):
+        # ANOTHER PROGRAM HOLDS THE WRITE LOCK, THE DIRECTORY SEES NO INDEX YET AND WAITS FOR IT
+        other = sqlite3.connect(self.usersFile, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE;")
+        results = []
+
+        def open_directory():
+            try:
+                directory = UserDirectory(self.usersFile)
+                results.append(directory.duplicatesRemoved)
+                directory.close()
+            except Exception as error:
+                results.append(error)
+
+        thread = threading.Thread(target=open_directory)
+        thread.start()
+        time.sleep(0.3)
+
+        # THE OTHER PROGRAM MIGRATES THE DATABASE FIRST
+        other.execute("DELETE FROM users WHERE ID NOT IN (SELECT MIN(ID) FROM users GROUP BY USERNAME);")
+        other.execute("CREATE UNIQUE INDEX users_username ON users (USERNAME);")
+        other.execute("COMMIT;")
+        other.close()
+        thread.join()
+
+        self.assertEqual(results, [[]])
+
+    def test_opened_by_several_threads_at_once(self):
+        start = threading.Event()
+        results = []
+
+        def open_directory():
+            start.wait()
+            try:
+                directory = UserDirectory(self.usersFile)
+                results.append(directory.duplicatesRemoved)
+                directory.close()
+            except Exception as error:
+                results.append(error)
+
+        threads = [threading.Thread(target=open_directory) for number in range(6)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        # EXACTLY ONE OF THEM REMOVED THE DUPLICATES
+        self.assertEqual(sorted(len(result) for result in results), [0, 0, 0, 0, 0, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+"""the users database: who can log in, their passwords and where their files are kept"""
+
+import hmac
+import sqlite3
+import threading
+from collections import namedtuple
+
+from cache import SearchCache
+from config import EncryptChars, EncryptShift, UsersFile, user_files
+from connection import connect
+from encryption import get_cipher
+
+# A DECRYPTED ROW OF THE USERS TABLE
+User = namedtuple("User", ["name", "password", "databasePath", "backupPath"])
+
+
+class UserDirectory:
+    """owns the users database. usernames are unique and looked up through an index,
+        and users that have been looked up are kept decrypted in memory
+    """
+
+    def __init__(self, usersFile=UsersFile, cacheSize=1024, checkSameThread=True):
+        """opens the users database, creating it or bringing it up to date if needed
+            @param usersFile (string) - file path of the users database
+            @param cacheSize (int) - number of users kept in memory, 0 to turn it off
+            @param checkSameThread (bool) - if False, the directory can be shared by several threads
+        """
+
+        self.usersFile = usersFile
+        self.cipher = get_cipher(EncryptChars, EncryptShift, "")
+        self.cache = SearchCache(cacheSize)  # A PLAIN LEAST RECENTLY USED CACHE, KEYED BY USERNAME HERE
+        self.lock = threading.Lock()
+
+        self.userDB = connect(usersFile, check_same_thread=checkSameThread)
+        self.userDB.execute("CREATE TABLE IF NOT EXISTS users"
+                            "(ID INTEGER PRIMARY KEY UNIQUE NOT NULL,"
+                            "USERNAME TEXT,"
+                            "PASSWORD TEXT,"
+                            "DATABASE_PATH TEXT,"
+                            "BACKUP_LOCATION TEXT"
+                            ")")
+        self.duplicatesRemoved = self.migrate()
+        self.userDB.commit()
+
+    def migrate(self):
+        """adds the unique index on USERNAME to a users database created before it existed.
+            logging in always found the first user registered with a name, so later users with the same name
+            could never log in; they are removed before the index is created. the files they pointed to are left
+            where they are, duplicate_report lists them.
+            the removal and the index are one IMMEDIATE transaction, so when several programs open an old users
+            database at once, one migrates it and the others find the index once they get the lock
+            @return (User[]) - the duplicate users removed, in the order they registered
+        """
+
+        indexSql = "SELECT name FROM sqlite_master WHERE type = 'index' AND name = 'users_username';"
+        if self.userDB.execute(indexSql).fetchone() is not None:
+            return []
+
+        # THE TRANSACTION IS RUN BY HAND, PYTHON 2'S sqlite3 WOULD COMMIT THE DELETE BEFORE THE CREATE INDEX
+        isolationLevel = self.userDB.isolation_level
+        self.userDB.isolation_level = None
+        try:
+            self.userDB.execute("BEGIN IMMEDIATE;")
+            try:
+                removed = []
+                if self.userDB.execute(indexSql).fetchone() is None:
+                    duplicates = "FROM users WHERE ID NOT IN (SELECT MIN(ID) FROM users GROUP BY USERNAME)"
+                    removed = [User(*self.cipher.decrypt_many(list(row))) for row in self.userDB.execute(
+                        "SELECT USERNAME, PASSWORD, DATABASE_PATH, BACKUP_LOCATION %s ORDER BY ID;" % duplicates)]
+                    self.userDB.execute("DELETE %s;" % duplicates)
+                    self.userDB.execute("CREATE UNIQUE INDEX IF NOT EXISTS users_username ON users (USERNAME);")
+                self.userDB.execute("COMMIT;")
+            except BaseException:
+                self.userDB.execute("ROLLBACK;")
+                raise
+        finally:
+            self.userDB.isolation_level = isolationLevel
+        return removed
+
+    def duplicate_report(self):
+        """describes the duplicate users removed when the users database was opened, to be shown at startup
+            @return (string[]) - one line for each user removed, with the files it pointed to
+        """
+
+        return ["Removed duplicate user '%s' from '%s', its database '%s' and backup '%s' were kept." %
+                ((record.name, self.usersFile) + self.files(record)) for record in self.duplicatesRemoved]
+
+    def get(self, user):
+        """looks up a user
+            @param user (string) - the name of the user, in any case
+            @return (User) - the decrypted user, None if there is no such user
+        """
+
+        user = user.lower()
+        with self.lock:
+            record = self.cache.get(user)
+            if record is not None:
+                return record
+
+            row = self.userDB.execute("SELECT USERNAME, PASSWORD, DATABASE_PATH, BACKUP_LOCATION FROM users "
+                                      "WHERE USERNAME = ?;", (self.cipher.encrypt_many([user])[0],)).fetchone()
+            if row is None:
+                return None
+
+            record = User(*self.cipher.decrypt_many(list(row)))
+            self.cache.put(user, record)
+            return record
+
+    def authenticate(self, user, password):
+        """checks a username and password
+            @param user (string) - the name of the user, in any case
+            @param password (string) - the password to check
+            @return (User) - the user, None if there is no such user or the password is wrong
+        """
+
+        record = self.get(user)
+        if record is None or not hmac.compare_digest(record.password.encode("utf-8"), password.encode("utf-8")):
+            return None
+        return record
+
+    def files(self, record):
+        """returns the database file and backup file of a user
+            @param record (User) - the user
+            @return (string, string) - file path of the database, file path of the backup
+        """
+
+        return user_files(record.name, record.databasePath, record.backupPath)
+
+    def add(self, user, password, databasePath, backupPath):
+        """registers a user
+            @param user (string) - the name of the user, stored in lower case
+            @param password (string) - the user's password
+            @param databasePath (string) - folder that holds the user's database
+            @param backupPath (string) - folder that holds the user's backup
+        """
+
+        self.add_many([(user, password, databasePath, backupPath)])
+
+    def add_many(self, users):
+        """registers many users in a single transaction, if any of them cannot be registered none of them are
+            @param users (tuple iterable) - (user, password, database folder, backup folder) of each user
+            @return (int) - number of users registered
+            @raise ValueError - if a username is already taken
+        """
+
+        rows = [(user.lower(), password, databasePath, backupPath)
+                for user, password, databasePath, backupPath in users]
+        if not rows:
+            return 0
+
+        with self.lock:
+            try:
+                self.userDB.executemany("INSERT INTO users (USERNAME, PASSWORD, DATABASE_PATH, BACKUP_LOCATION) "
+                                        "VALUES (?,?,?,?);", [tuple(self.cipher.encrypt_many(list(row)))
+                                                              for row in rows])
+            except sqlite3.IntegrityError:
+                self.userDB.rollback()
+                raise ValueError("a username is already taken")
+            self.userDB.commit()
+        return len(rows)
+
+    def users(self):
+        """lists every user in the order they registered
+            @return (User[]) - the decrypted users
+        """
+
+        with self.lock:
+            rows = self.userDB.execute("SELECT USERNAME, PASSWORD, DATABASE_PATH, BACKUP_LOCATION FROM users "
+                                       "ORDER BY ID;").fetchall()
+        return [User(*self.cipher.decrypt_many(list(row))) for row in rows]
+
+    def close(self):
+        """closes the users database"""
+
+        self.userDB.close()